@@ -1,17 +1,34 @@
 import streamlit as st
 import tempfile
 import os
+import hashlib
+import uuid
 import pandas as pd
-from plot_pdf import (export_sensitivity_pdf,
-    export_curfc_pdf,
-    export_cu_enaks_konus_pdf,
-    export_enaks_deformation_pdf,
-    export_wc_pdf)
-from build_data import build_konus_series, build_enaks_series, build_wc_series, export_combined_table
+import archive
+from plot_pdf import export_enaks_curves_pdf
+from terrain import load_terrain
+from spatial import BoreholeIndex, select_series
+from sections import SECTION_VARIABLES
+from validation import validate
+from bundle import build_zip_bundle
+from curves import CURVE_LAYOUT, build_enaks_curves
+from depth_index import DepthIndex, project_window
+from shared_data import SHM_DIR
+from warmup import warmup_stats
+from workers import shared_pool, wait_all, PoolBusy
+from pagination import group_by_count, group_by_prefix, group_by_area, split_groups
+from pipeline import (SHEET_NAME, DEFAULT_RANGES, BUILDERS, parse_upload, merge_series, derived_stages,
+    frame_stage, table_stage, archive_stage, figure_stages, section_stages, render_figure, series_from,
+    shared_valid, release_shared, outputs_valid)
+from stages import Stage, run_stages
+from instrumentation import recording, profile
 
 # ✅ Always use repo logo
 logo_path = os.path.join(os.path.dirname(__file__), "geovitalogo.png")
 
+# Start the shared worker processes (and their warm-up) with the app, not on the first job
+shared_pool().start()
+
 st.title("Geovita – Konus & Enaks Report Generator")
 st.write("""
 Genererer plott av sensitivitet, omrørt skjærstyrke, direkte skjærstyrke fra konus og enaks, samt bruddtøyning fra enaksforsøkene. 
@@ -34,10 +51,128 @@ fig_curfc = st.sidebar.text_input("Omrørt skjærstyrke (konus)", "C3")
 fig_cuc   = st.sidebar.text_input("Direkte skjærstyrke (konus/enaks)", "C4")
 fig_ef    = st.sidebar.text_input("Bruddtøyning enaks", "C5")
 
-# placeholder for future plots
 fig_wc    = st.sidebar.text_input("Plott av vanninnhold", "C1")
-# fig_gamma = st.sidebar.text_input("Plott med tyngdetetthet", "C6")
-# fig_ip   = st.sidebar.text_input("Plastisitetsindeks", "C7")
+fig_gamma = st.sidebar.text_input("Plott med tyngdetetthet", "C6")
+fig_ip    = st.sidebar.text_input("Plastisitetsindeks", "C7")
+fig_il    = st.sidebar.text_input("Flyteindeks", "C8")
+fig_norm  = st.sidebar.text_input("Normalisert skjærstyrke (cu/σ'v)", "C9")
+fig_curves = st.sidebar.text_input("Enaks-kurver (spenning–tøyning)", "C10")
+fig_section = st.sidebar.text_input("Snitt gjennom borhull", "C11")
+
+st.sidebar.subheader("Enaks-kurver (rådata)")
+curves_on = st.sidebar.checkbox("Les inn hele spenning–tøyningskurvene", value=False,
+                                help="Plasseringen av rådataene i arbeidsboken settes under.")
+curve_layout = {
+    "sheet": st.sidebar.text_input("Ark med rådata", CURVE_LAYOUT["sheet"], disabled=not curves_on),
+    "layout": "pairs" if st.sidebar.radio("Oppsett", ["Én måling per rad", "Kolonnepar per forsøk"],
+                                          disabled=not curves_on) == "Kolonnepar per forsøk" else "long",
+    "first_row": st.sidebar.number_input("Første rad med data", value=CURVE_LAYOUT["first_row"], min_value=1,
+                                         disabled=not curves_on),
+}
+if curve_layout["layout"] == "long":
+    curve_layout.update({
+        "test_col": st.sidebar.text_input("Kolonne forsøk", CURVE_LAYOUT["test_col"], disabled=not curves_on),
+        "depth_col": st.sidebar.text_input("Kolonne dybde (valgfri)", "", disabled=not curves_on) or None,
+        "strain_col": st.sidebar.text_input("Kolonne tøyning (%)", CURVE_LAYOUT["strain_col"], disabled=not curves_on),
+        "stress_col": st.sidebar.text_input("Kolonne spenning (kPa)", CURVE_LAYOUT["stress_col"], disabled=not curves_on),
+    })
+else:
+    curve_layout.update({
+        "first_col": st.sidebar.text_input("Første kolonne", CURVE_LAYOUT["first_col"], disabled=not curves_on),
+        "header_row": st.sidebar.number_input("Rad med forsøksnavn/dybde", value=CURVE_LAYOUT["header_row"],
+                                              min_value=1, disabled=not curves_on),
+    })
+
+st.sidebar.subheader("Effektivspenning")
+gw_depth = st.sidebar.number_input("Grunnvannstand (m under terreng)", value=0.0, step=0.5)
+
+st.sidebar.subheader("Designlinjer (C2–C5)")
+show_design = st.sidebar.checkbox("Vis persentiler og robust tilpasning", value=False)
+design_fractile = st.sidebar.selectbox("Karakteristisk fraktil", [0.05, 0.10, 0.50], index=0,
+                                       help="Faktoren k er fra Student-t med n−2 frihetsgrader (står i designarket)")
+design_kind = st.sidebar.selectbox("Fraktil av", ["mean", "prediction"], index=0,
+                                   help="mean: fraktil av middelverdien, prediction: fraktil av enkeltverdier")
+design_bin = st.sidebar.number_input("Intervall for persentiler (m)", value=1.0, min_value=0.1, step=0.5)
+
+st.sidebar.subheader("Utvalg av borhull")
+st.sidebar.caption("Krever kolonnene X og Y i terrengtabellen.")
+select_mode = st.sidebar.selectbox("Utvalg", ["Alle", "Radius", "Nærmeste", "Polygon", "Profil (pel)"])
+select_center = ""
+if select_mode in ("Radius", "Nærmeste"):
+    select_center = st.sidebar.text_input("Senter (borhull eller x,y)", "")
+if select_mode == "Radius":
+    select_radius = st.sidebar.number_input("Radius (m)", value=200.0, min_value=0.0, step=50.0)
+if select_mode == "Nærmeste":
+    select_k = st.sidebar.number_input("Antall borhull", value=10, min_value=1, step=1)
+if select_mode in ("Polygon", "Profil (pel)"):
+    select_coords = st.sidebar.text_area("Koordinater, én 'x,y' per linje", "")
+if select_mode == "Profil (pel)":
+    select_from = st.sidebar.number_input("Fra pel (m)", value=0.0, step=100.0)
+    select_to = st.sidebar.number_input("Til pel (m)", value=1000.0, step=100.0)
+    select_width = st.sidebar.number_input("Halv korridorbredde (m)", value=50.0, min_value=0.0, step=10.0)
+select_scope = st.sidebar.radio("Bruk utvalget på", ["Innlesing og figurer", "Kun figurer"])
+
+def parse_coords(text):
+    pts = []
+    for line in text.splitlines():
+        if line.strip():
+            x, y = line.replace(";", ",").split(",")[:2]
+            pts.append((float(x), float(y)))
+    return pts
+
+def select_boreholes(index):
+    """Borehole names picked in the sidebar, or None for all."""
+    if select_mode == "Alle":
+        return None
+    if select_mode in ("Radius", "Nærmeste"):
+        if select_center in index:
+            cx, cy = index.coords(select_center)
+        else:
+            cx, cy = parse_coords(select_center)[0]
+        if select_mode == "Radius":
+            return set(index.radius(cx, cy, select_radius))
+        return set(index.nearest(cx, cy, select_k))
+    pts = parse_coords(select_coords)
+    if select_mode == "Polygon":
+        return set(index.polygon(pts))
+    names, _, _ = index.corridor(pts, select_from, select_to, select_width)
+    return set(names)
+
+st.sidebar.subheader("Uttrekk i intervall")
+window_on = st.sidebar.checkbox("Vis verdier i et dybde-/koteintervall", value=False)
+window_axis = st.sidebar.selectbox("Akse", ["Kote", "Dybde"], disabled=not window_on)
+window_from = st.sidebar.number_input("Fra (m)", value=2.0, step=1.0, disabled=not window_on)
+window_to = st.sidebar.number_input("Til (m)", value=-8.0, step=1.0, disabled=not window_on)
+
+st.sidebar.subheader("Snitt (C11)")
+section_on = st.sidebar.checkbox("Tegn snitt gjennom borhull", value=False)
+section_text = st.sidebar.text_area("Borhull langs snittet, ett snitt per linje (f.eks. 'BH1, BH2, BH3')", "",
+                                    disabled=not section_on,
+                                    help="Tomt med utvalget 'Profil (pel)': borhullene i korridoren, etter pel.")
+section_variables = st.sidebar.multiselect("Parametere i snittet", list(SECTION_VARIABLES),
+                                           default=[next(iter(SECTION_VARIABLES))], disabled=not section_on)
+section_axis = st.sidebar.selectbox("Vertikal akse", ["Kote", "Dybde"], disabled=not section_on)
+section_step = st.sidebar.number_input("Vertikal oppløsning (m)", value=0.25, min_value=0.05, step=0.05,
+                                       disabled=not section_on)
+section_gap = st.sidebar.number_input("Største hull mellom prøver som interpoleres (m)", value=3.0,
+                                      min_value=0.0, step=0.5, disabled=not section_on)
+
+st.sidebar.subheader("Sideinndeling")
+page_mode = st.sidebar.selectbox("Del figurene i sider", ["Ingen", "Antall per side", "Prefiks", "Område"],
+                                 help="Område krever en kolonne 'Område' i terrengtabellen.")
+page_size = st.sidebar.number_input("Maks borhull per side", value=12, min_value=1, step=1)
+
+st.sidebar.subheader("Arkiv")
+archive_on = st.sidebar.checkbox("Legg prosjektet i arkivet (Parquet)", value=False, disabled=archive.pa is None,
+                                 help="Krever pyarrow. Arkivmappe settes med GRUNN_ARCHIVE.")
+if archive.pa is None:
+    st.sidebar.caption("Arkivet er ikke tilgjengelig: pyarrow er ikke installert.")
+archive_name = st.sidebar.text_input("Prosjekt i arkivet", rapport_nr, disabled=not archive_on)
+
+st.sidebar.subheader("Diagnostikk")
+run_profile = st.sidebar.checkbox("Profiler kjøringen (cProfile)", value=False)
+use_cache = st.sidebar.checkbox("Gjenbruk like figurer (buffer)", value=True,
+                                help="Figurer med samme data, tittelfelt og innstillinger hentes fra bufferen i stedet for å tegnes på nytt.")
 
 
 title_info_common = {
@@ -48,166 +183,486 @@ title_info_common = {
     "godkj": godkj,
 }
 
+# Input ranges
+sheet_name = SHEET_NAME
+ranges = DEFAULT_RANGES
+
+st.session_state.setdefault("user_id", uuid.uuid4().hex)
+# Stage results are kept per session, so a new run only redoes what changed. The working
+# directories live as long as the session (TemporaryDirectory cleans up when collected).
+st.session_state.setdefault("stage_memo", {})
+if "workdir" not in st.session_state:
+    st.session_state["workdir"] = tempfile.TemporaryDirectory(prefix="grunn_")
+    st.session_state["shm_dir"] = tempfile.TemporaryDirectory(prefix="grunn_", dir=SHM_DIR)
+# Uploaded workbooks are parsed in the background as soon as they arrive:
+# {(dataset, file name, sha256): {"path", "terrain", "state", "job", "series", "events", "error"}}
+# with state waiting (no terrain table yet, or the pool was full) | parsing | done | failed
+st.session_state.setdefault("uploads", {})
+st.session_state.setdefault("terrain", None)
+# Anomaly table for the parsed uploads: {"key": the uploads it was computed for, "df"}
+st.session_state.setdefault("validation", None)
+
+def upload_submit(fn, *args, **kwargs):
+    return shared_pool().submit(st.session_state["user_id"], fn, *args, **kwargs)
+
+def sync_uploads():
+    """
+    file_uploader callback (and run on every rerun): start a background parse for each
+    uploaded workbook not yet parsed against the current terrain table, forget removed ones.
+    """
+    workdir = st.session_state["workdir"].name
+    terrain_file = st.session_state.get("upload_terrain")
+    dem_path = (st.session_state.get("dem_path") or "").strip()
+    if terrain_file is None:
+        st.session_state["terrain"] = None
+    else:
+        data = terrain_file.getvalue()
+        dem_stat = os.stat(dem_path) if dem_path and os.path.exists(dem_path) else None
+        digest = hashlib.sha256(data + repr((dem_path, dem_stat and (dem_stat.st_mtime_ns, dem_stat.st_size),
+                                             st.session_state.get("dem_overwrite"))).encode()).hexdigest()
+        if (st.session_state["terrain"] or {}).get("digest") != digest:
+            path = os.path.join(workdir, "terrain.xlsx")
+            with open(path, "wb") as f:
+                f.write(data)
+            with recording() as rec:
+                try:
+                    df = load_terrain(path, dem_path if dem_stat else None, st.session_state.get("dem_overwrite", False))
+                    error = None
+                except (ValueError, ImportError, KeyError, OSError) as e:
+                    df, error = load_terrain(path), f"Terrengmodellen kunne ikke leses: {e}"
+            if dem_path and not dem_stat:
+                error = f"Fant ikke terrengmodellen {dem_path}"
+            st.session_state["terrain"] = {"digest": digest, "path": path, "df": df, "error": error,
+                                           "lookup": dict(zip(df["BH"], df["Z"])),
+                                           "events": rec.events_frame().to_dict(orient="records")}
+    terrain = st.session_state["terrain"]
+    terrain_digest = terrain["digest"] if terrain else None
+
+    wanted = {}
+    for name in BUILDERS:
+        for uf in st.session_state.get(f"upload_{name}") or []:
+            data = uf.getvalue()
+            wanted[(name, uf.name, hashlib.sha256(data).hexdigest())] = data
+
+    uploads = st.session_state["uploads"]
+    for key in list(uploads):
+        if key not in wanted or uploads[key]["terrain"] != terrain_digest:
+            release_shared(uploads.pop(key)["series"] or {})
+    for key, data in wanted.items():
+        entry = uploads.get(key)
+        if entry is None:
+            name, filename, digest = key
+            folder = os.path.join(workdir, "uploads", name, digest[:16])
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, filename)
+            with open(path, "wb") as f:
+                f.write(data)
+            entry = uploads[key] = {"path": path, "terrain": terrain_digest, "state": "waiting", "job": None,
+                                    "series": None, "events": [], "error": None}
+        if entry["state"] == "waiting" and terrain is not None:
+            try:
+                entry["job"] = parse_upload(key[0], entry["path"], sheet_name, ranges, terrain["lookup"],
+                                            st.session_state["shm_dir"].name, upload_submit)
+                entry.update(state="parsing", error=None)
+            except PoolBusy as e:
+                entry["error"] = f"Serveren er opptatt: {e}"
+
+def collect_uploads():
+    """Pick up finished background parses with their per-file warnings and errors."""
+    for entry in st.session_state["uploads"].values():
+        if entry["state"] != "parsing" or not entry["job"].done():
+            continue
+        with recording() as rec:
+            try:
+                entry["series"] = entry["job"].result()
+                entry["state"] = "done"
+            except Exception as e:
+                entry.update(state="failed", error=f"{type(e).__name__}: {e}")
+        entry["events"] = rec.events_frame().to_dict(orient="records")
+        entry["job"] = None
+
+def upload_result(entry, terrain_lookup, shm_dir, submit):
+    """
+    A file's parsed series for a run (called from stage threads: reads, never updates).
+    Stage threads have no Streamlit session, so everything else is passed in.
+    """
+    if entry["state"] == "done":
+        return entry["series"]
+    if entry["state"] == "parsing":
+        try:
+            return entry["job"].result()
+        except Exception:
+            return {}
+    if entry["state"] == "waiting":
+        name = os.path.basename(os.path.dirname(os.path.dirname(entry["path"])))
+        return parse_upload(name, entry["path"], sheet_name, ranges, terrain_lookup, shm_dir, submit).result()
+    return {}
+
+def upload_anomalies():
+    """validation.validate() over all parsed uploads, recomputed only when they change."""
+    done = {key: entry for key, entry in st.session_state["uploads"].items() if entry["state"] == "done"}
+    key = sorted(done)
+    cached = st.session_state["validation"]
+    if cached is None or cached["key"] != key:
+        datasets, files = {}, {}
+        for (name, filename, _), entry in done.items():
+            for bh in entry["series"]:
+                datasets.setdefault(name, {})[bh] = entry["series"][bh]
+                files.setdefault(name, {})[bh] = filename
+        cached = st.session_state["validation"] = {"key": key, "df": validate(datasets, files)}
+    return cached["df"]
+
+def upload_status(anomalies=None):
+    """Datasett | Fil | Status | Borhull | Avvik | Melding for every uploaded workbook."""
+    counts = {}
+    if anomalies is not None and not anomalies.empty:
+        counts = anomalies.groupby(["Datasett", "Fil", "Alvorlighet"]).size().to_dict()
+    rows = []
+    for (name, filename, _), entry in st.session_state["uploads"].items():
+        messages = [e["message"] for e in entry["events"] if e["level"] in ("warning", "error")]
+        if entry["error"]:
+            messages.append(entry["error"])
+        n = len(entry["series"] or {})
+        if entry["state"] == "waiting":
+            status = "⏳ Venter på terrengfil" if st.session_state["terrain"] is None else "⏳ Venter på ledig plass"
+        elif entry["state"] == "parsing":
+            position = entry["job"].position()
+            status = f"⏳ Plass {position} i køen" if position else "⏳ Leses inn"
+        elif entry["state"] == "failed" or any(e["level"] == "error" for e in entry["events"]):
+            status = "❌ Feil"
+        elif messages or not n:
+            status = "⚠️ Advarsel"
+            if not messages:
+                messages.append("Ingen borhull lest fra filen")
+        else:
+            status = "✅ OK"
+        errors, warnings = counts.get((name, filename, "feil"), 0), counts.get((name, filename, "advarsel"), 0)
+        found = ", ".join(text for n, text in ((errors, f"{errors} feil"),
+                                               (warnings, f"{warnings} {'advarsel' if warnings == 1 else 'advarsler'}"))
+                          if n)
+        rows.append({"Datasett": name, "Fil": filename, "Status": status, "Borhull": n,
+                     "Avvik": found, "Melding": "; ".join(messages)})
+    return pd.DataFrame(rows, columns=["Datasett", "Fil", "Status", "Borhull", "Avvik", "Melding"])
+
 # Upload files
 terrain_file = st.file_uploader("Upload terrain level file", 
                                 type=["xlsx"],
+                                key="upload_terrain", on_change=sync_uploads,
                                help="Excel file with columns 'BH' and 'Z'. 👉 "
                                 "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/terrain_example.xlsx)")
+dem_path = st.text_input("Terrain model on the server (optional)", key="dem_path", on_change=sync_uploads,
+                         help="Path to an ESRI ASCII grid (.asc) or GeoTIFF (.tif). Z is sampled at the X/Y of each "
+                              "borehole in the terrain table, which may then leave Z empty.")
+dem_overwrite = st.checkbox("Use the terrain model for all boreholes, also those with Z in the table",
+                            key="dem_overwrite", on_change=sync_uploads, disabled=not dem_path)
 konus_files = st.file_uploader("Upload Konus Excel files", 
                                type=["xlsx","xlsm"], 
+                               key="upload_konus", on_change=sync_uploads,
                                accept_multiple_files=True,
                               help ="Rådata etter NGI-labens standard. 👉 "
          "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_konus.xlsm)" )
 enaks_files = st.file_uploader("Upload Enaks Excel files", 
                                type=["xlsx","xlsm"], 
+                               key="upload_enaks", on_change=sync_uploads,
                                accept_multiple_files=True,
                               help = "Rådata etter NGI-labens standard. 👉 "
          "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_Enaks.xlsm)")
 wc_files = st.file_uploader("Upload Water content Excel files", 
                                type=["xlsx","xlsm"], 
+                               key="upload_wc", on_change=sync_uploads,
                                accept_multiple_files=True,
                               help = "Rådata etter NGI-labens standard. 👉 "
          "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_water content.xlsm)")
-# gamma_files = st.file_uploader("Upload unit weight Excel files", 
-#                                type=["xlsx","xlsm"], 
-#                                accept_multiple_files=True,
-#                               help = "Rådata etter NGI-labens standard. 👉 "
-#          "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_unit weight.xlsm)")
-# ip_files = st.file_uploader("Upload atterberg limit Excel files", 
-#                                type=["xlsx","xlsm"], 
-#                                accept_multiple_files=True,
-#                               help = "Rådata etter NGI-labens standard. 👉 "
-#          "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_atterberg.xlsm)")
+gamma_files = st.file_uploader("Upload unit weight Excel files", 
+                               type=["xlsx","xlsm"], 
+                               key="upload_gamma", on_change=sync_uploads,
+                               accept_multiple_files=True,
+                              help = "Rådata etter NGI-labens standard. 👉 "
+         "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_unit weight.xlsm)")
+ip_files = st.file_uploader("Upload atterberg limit Excel files", 
+                               type=["xlsx","xlsm"], 
+                               key="upload_atterberg", on_change=sync_uploads,
+                               accept_multiple_files=True,
+                              help = "Rådata etter NGI-labens standard. 👉 "
+         "[Download example](https://raw.githubusercontent.com/USERNAME/REPO/main/examples/06-376_atterberg.xlsm)")
 
-# Input ranges
-sheet_name = "Sheet 001"
-ranges = {
-    "konus_undist": 'L6:L30',
-    "konus_remould": 'M6:M30',
-    "depth": 'F6:F30',
-    "enaks_strength": 'G6:G30',
-    "enaks_deform": 'H6:H30',
-    "wc_depth": 'G12:G41',
-    "wc": 'H12:H41'
-}
+sync_uploads()
+uploads_pending = any(e["state"] == "parsing" for e in st.session_state["uploads"].values())
+
+# Polls while files are being parsed; one full rerun when the last one is done
+@st.fragment(run_every=1.0 if uploads_pending else None)
+def show_upload_status():
+    collect_uploads()
+    terrain = st.session_state["terrain"]
+    if terrain:
+        if terrain["error"]:
+            st.error(terrain["error"])
+        for e in terrain["events"]:
+            if e["level"] == "warning":
+                st.warning(e["message"])
+        if "Z-kilde" in terrain["df"]:
+            n = int((terrain["df"]["Z-kilde"] == "terrengmodell").sum())
+            st.caption(f"Terrengnivå fra terrengmodellen for {n} av {len(terrain['df'])} borhull")
+    if st.session_state["uploads"]:
+        anomalies = upload_anomalies()
+        st.dataframe(upload_status(anomalies), hide_index=True)
+        if not anomalies.empty:
+            errors = int((anomalies["Alvorlighet"] == "feil").sum())
+            with st.expander(f"Avvik i dataene: {errors} feil, {len(anomalies) - errors} advarsler",
+                             expanded=errors > 0):
+                st.dataframe(anomalies, hide_index=True)
+    if uploads_pending and not any(e["state"] == "parsing" for e in st.session_state["uploads"].values()):
+        st.rerun()
+
+show_upload_status()
+
+include_png = st.checkbox("Include PNG previews in ZIP download", value=False)
+
+figure_numbers = {"sensitivity": fig_st, "curfc": fig_curfc, "cu": fig_cuc, "ef": fig_ef, "wc": fig_wc,
+                  "gamma": fig_gamma, "ip": fig_ip, "il": fig_il, "norm": fig_norm}
+
+# Shown in this order: stage key, subheader, preview caption, download label
+FIGURE_VIEWS = [
+    ("sensitivity", None, "Preview C2 – Sensitivity", "Download C2 – Sensitivity PDF"),
+    ("curfc", "C3 – Remoulded Shear Strength", "Preview C3 – Remoulded", "Download C3 – Remoulded Strength PDF"),
+    ("cu", "C4 – Konus + Enaks", "Preview C4 – Konus + Enaks", "Download C4 – Konus + Enaks PDF"),
+    ("ef", "C5 – Enaks Deformation", "Preview C5 – Enaks Deformation", "Download C5 – Enaks Deformation PDF"),
+    ("curves", "C10 – Enaks stress–strain curves", "Preview C10 – Enaks curves", "Download C10 – Enaks curves PDF"),
+    ("wc", "C1 – Water content", "Preview C1 – Water content", "Download C1 – Watercontent PDF"),
+    ("gamma", "C6 – Unit weight", "Preview C6 – Unit weight", "Download C6 – Unit weight PDF"),
+    ("ip", "C7 – Plasticity index", "Preview C7 – Plasticity index", "Download C7 – Plasticity index PDF"),
+    ("il", "C8 – Liquidity index", "Preview C8 – Liquidity index", "Download C8 – Liquidity index PDF"),
+    ("norm", "C9 – Normalised shear strength", "Preview C9 – cu/σ'v", "Download C9 – Normalised strength PDF"),
+]
 
 if st.button("Generate Reports"):
     if not terrain_file:
         st.error("Please upload at least the terrain file")
+    elif (busy := shared_pool().admission_error()):
+        st.error(f"Serveren er opptatt: {busy}")
     else:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Save terrain
-            terrain_path = os.path.join(tmpdir, "terrain.xlsx")
-            with open(terrain_path, "wb") as f: f.write(terrain_file.getbuffer())
-            terrain_df = pd.read_excel(terrain_path, usecols="A:B")
-            terrain_df.columns = ["BH", "Z"]
-            terrain_lookup = dict(zip(terrain_df["BH"], terrain_df["Z"]))
-
-             # --- Initialize series dicts ---
-            konus_series, enaks_series, wc_series = {}, {}, {}
-
-            # Save Konus files
-            if konus_files:
-                konus_dir = os.path.join(tmpdir, "konus"); os.makedirs(konus_dir, exist_ok=True)
-                for uf in konus_files:
-                    with open(os.path.join(konus_dir, uf.name), "wb") as f: f.write(uf.getbuffer())
-                konus_series = build_konus_series(konus_dir, sheet_name, ranges, terrain_lookup)
-
-            # Save Enaks files
-            if enaks_files:
-                enaks_dir = os.path.join(tmpdir, "enaks"); os.makedirs(enaks_dir, exist_ok=True)
-                for uf in enaks_files:
-                    with open(os.path.join(enaks_dir, uf.name), "wb") as f: f.write(uf.getbuffer())
-                enaks_series = build_enaks_series(enaks_dir, sheet_name, ranges, terrain_lookup)
-
-            # Save WC files
-            if wc_files:
-                wc_dir = os.path.join(tmpdir, "wc"); os.makedirs(wc_dir, exist_ok=True)
-                for uf in wc_files:
-                    with open(os.path.join(wc_dir, uf.name), "wb") as f: f.write(uf.getbuffer())
-                wc_series = build_wc_series(wc_dir, sheet_name, ranges, terrain_lookup)
-            
-            #Export series to excel
-            export_combined_table(konus_series, enaks_series, wc_series, os.path.join(tmpdir, "grunnundersokelser.xlsx"))
+        tmpdir = st.session_state["workdir"].name
+        shm_dir = st.session_state["shm_dir"].name
+        with recording() as timings, profile(enabled=run_profile) as prof:
+            # Terrain table and uploads were saved (and the uploads parsed) by sync_uploads
+            collect_uploads()
+            terrain_df = st.session_state["terrain"]["df"]
+            terrain_lookup = st.session_state["terrain"]["lookup"]
+
+            # Spatial selection (needs X/Y in the terrain table)
+            selected = None
+            if select_mode != "Alle":
+                bh_index = BoreholeIndex.from_terrain(terrain_df)
+                if not len(bh_index):
+                    st.warning("Terrengtabellen mangler X/Y – alle borhull brukes.")
+                else:
+                    try:
+                        selected = select_boreholes(bh_index)
+                        st.info(f"Utvalg: {len(selected)} av {len(bh_index)} borhull")
+                    except (ValueError, IndexError) as e:
+                        st.error(f"Ugyldig utvalg: {e}")
+            ingest_filter = selected if select_scope == "Innlesing og figurer" else None
+            figure_filter = selected if ingest_filter is None else None
+            area_of = dict(zip(terrain_df["BH"], terrain_df["Område"])) if "Område" in terrain_df else {}
+
+            pool = shared_pool()
+            queue_status = st.empty()
+            user = st.session_state["user_id"]
+
+            # Called from stage threads: a full pool raises PoolBusy there and fails the stage
+            def pool_submit(fn, *args, **kwargs):
+                return pool.submit(user, fn, *args, **kwargs)
+
+            def show_running(names):
+                stats = pool.stats()
+                queue_status.info(f"Pågår: {', '.join(names)} ({stats['running']} jobber kjører, "
+                                  f"{stats['queued']} i kø)")
+
+            def page_groups(series_args):
+                """Borehole groups per page for the sidebar's page mode."""
+                bhs = sorted(set().union(*series_args))
+                if page_mode == "Antall per side":
+                    return group_by_count(bhs, page_size)
+                if page_mode == "Prefiks":
+                    return split_groups(group_by_prefix(bhs), page_size)
+                if page_mode == "Område":
+                    return split_groups(group_by_area(bhs, area_of), page_size)
+                return None
+
+            def select(series):
+                return series if figure_filter is None else select_series(series, figure_filter)
+
+            def show_previews(previews, caption):
+                if len(previews) == 1:
+                    st.image(previews[0], caption=caption, use_column_width=True)
+                else:
+                    st.image(previews, caption=[f"{caption} ({i}/{len(previews)})" for i in range(1, len(previews) + 1)],
+                             use_column_width=True)
+
+            # Downloads are read or built only when their button is clicked. Streamlit still holds
+            # the whole payload in memory while it is served, so memory here grows with the report
+            # size (known limitation); the HTTP API streams the same bundle from disk.
+            def download_file(label, path, mime):
+                def read():
+                    with open(path, "rb") as f:
+                        return f.read()
+                st.download_button(label, read, file_name=os.path.basename(path), mime=mime)
+
+            report_files = []
+
+            # One parse stage per dataset, merging the files parsed in the background on upload
+            parsed, stages = [], []
+            for name in BUILDERS:
+                entries = [(key[1:], entry) for key, entry in st.session_state["uploads"].items() if key[0] == name]
+                if not entries:
+                    continue
+                stages.append(Stage(
+                    f"parse:{name}",
+                    lambda entries=entries: merge_series([upload_result(e, terrain_lookup, shm_dir, pool_submit)
+                                                          for _, e in entries], shm_dir, ingest_filter),
+                    params=(sorted(k for k, _ in entries), sheet_name, ranges, terrain_lookup, ingest_filter),
+                    valid=shared_valid, release=release_shared))
+                parsed.append(name)
+            stages += derived_stages(parsed, shm_dir, gw_depth)
+            series_stages = [s.name for s in stages]
+
+            design = {"bin_size": design_bin, "fractile": design_fractile, "kind": design_kind} if show_design else None
+            stages.append(frame_stage(series_stages, design))
+            stages.append(table_stage(os.path.join(tmpdir, "grunnundersokelser.xlsx")))
+            if archive_on and archive_name.strip():
+                stages.append(archive_stage(archive_name.strip()))
+            page_key = (page_mode, page_size, area_of)
+            stages += figure_stages(series_stages, tmpdir, title_info_common, figure_numbers, design=show_design,
+                                    select=select, groups=page_groups, cache=use_cache, submit=pool_submit,
+                                    logo_path=logo_path, key_extra=(figure_filter, page_key))
+
+            # C11 – Cross-sections, all cut from one resampled grid per dataset
+            if section_on:
+                lines = [[bh.strip() for bh in line.replace(";", ",").split(",") if bh.strip()]
+                         for line in section_text.splitlines() if line.strip()]
+                coords = ({bh: (x, y) for bh, x, y in zip(terrain_df["BH"], terrain_df["X"], terrain_df["Y"])
+                           if pd.notna(x) and pd.notna(y)} if {"X", "Y"} <= set(terrain_df.columns) else None)
+                stations = None
+                if not lines and select_mode == "Profil (pel)" and coords:
+                    try:
+                        names, chainage, _ = BoreholeIndex.from_terrain(terrain_df).corridor(
+                            parse_coords(select_coords), select_from, select_to, select_width)
+                        lines, stations = [list(names)], dict(zip(names, chainage))
+                    except (ValueError, IndexError):
+                        pass
+                if not lines:
+                    st.warning("Ingen borhull oppgitt for snitt.")
+                stages += section_stages(series_stages, tmpdir, {**title_info_common, "figur_nr": fig_section},
+                                         lines, section_variables, coords=coords, stations=stations,
+                                         axis=section_axis, step=section_step, max_gap=section_gap,
+                                         cache=use_cache, submit=pool_submit, logo_path=logo_path)
+
+            # C10 – Enaks stress–strain curves (optional raw data)
+            if curves_on and "enaks" in parsed:
+                enaks_entries = sorted((key[1:], entry) for key, entry in st.session_state["uploads"].items()
+                                       if key[0] == "enaks")
+
+                def read_curves():
+                    jobs = [pool_submit(build_enaks_curves, os.path.dirname(e["path"]), terrain_lookup, curve_layout,
+                                        ingest_filter) for _, e in enaks_entries]
+                    return {bh: data for job in jobs for bh, data in job.result().items()}
+                stages.append(Stage("curves_data", read_curves,
+                                    params=([k for k, _ in enaks_entries], terrain_lookup, curve_layout, ingest_filter)))
+                out_c10_pdf = os.path.join(tmpdir, "C10_enaks_curves.pdf")
+                out_c10_png = os.path.join(tmpdir, "C10_enaks_curves.png")
+                c10_title = {**title_info_common, "figur_nr": fig_curves}
+
+                def render_curves(curves):
+                    curves = select(curves)
+                    if not curves:
+                        return []
+                    return render_figure(export_enaks_curves_pdf, (curves,), out_c10_pdf, out_c10_png,
+                                         groups=page_groups((curves,)), cache=use_cache, submit=pool_submit,
+                                         logo_path=logo_path, title_info=c10_title)
+                stages.append(Stage("curves", render_curves, ["curves_data"],
+                                    params=(out_c10_pdf, c10_title, figure_filter, page_key, use_cache),
+                                    valid=outputs_valid))
+
+            run = run_stages(stages, memo=st.session_state["stage_memo"], on_wait=show_running)
+            queue_status.empty()
+            busy = [e for e in run.errors.values() if isinstance(e, PoolBusy)]
+            if busy:
+                st.error(f"Serveren er opptatt: {busy[0]}")
+                st.stop()
+            for name, error in run.errors.items():
+                st.error(f"❌ {name}: {type(error).__name__}: {error}")
+
             st.subheader("Data Table")
-            df = pd.read_excel(os.path.join(tmpdir, "grunnundersokelser.xlsx"))
-            st.dataframe(df)
-
-            with open(os.path.join(tmpdir, "grunnundersokelser.xlsx"), "rb") as f:
-                st.download_button("Download Excel", f, file_name="grunnundersokelser.xlsx")
-
-            # --- Generate figures with preview + download ---
-            # C2 – Sensitivity
-            if konus_series:
-                out_c2_pdf = os.path.join(tmpdir, "C2_sensitivity.pdf")
-                out_c2_png = os.path.join(tmpdir, "C2_sensitivity.png")
-                export_sensitivity_pdf(
-                    konus_series,
-                    outfile_pdf=out_c2_pdf,
-                    outfile_png=out_c2_png,
-                    logo_path=logo_path,
-                    title_info={**title_info_common, "figur_nr": fig_st},
-                )
-                st.image(out_c2_png, caption="Preview C2 – Sensitivity", use_column_width=True)
-                with open(out_c2_pdf, "rb") as f:
-                    st.download_button("Download C2 – Sensitivity PDF", f, file_name="C2_sensitivity.pdf")
-    
-                # C3 – Remoulded shear strength
-                out_c3_pdf = os.path.join(tmpdir, "C3_curfc.pdf")
-                out_c3_png = os.path.join(tmpdir, "C3_curfc.png")
-                export_curfc_pdf(
-                    konus_series,
-                    outfile_pdf=out_c3_pdf,
-                    outfile_png=out_c3_png,
-                    logo_path=logo_path,
-                    title_info={**title_info_common, "figur_nr": fig_curfc},
-                )
-                st.subheader("C3 – Remoulded Shear Strength")
-                st.image(out_c3_png, caption="Preview C3 – Remoulded", use_column_width=True)
-                with open(out_c3_pdf, "rb") as f:
-                    st.download_button("Download C3 – Remoulded Strength PDF", f, file_name="C3_curfc.pdf")
-    
-                # C4 – Konus (undisturbed) + Enaks
-                out_c4_pdf = os.path.join(tmpdir, "C4_cu_enaks_konus.pdf")
-                out_c4_png = os.path.join(tmpdir, "C4_cu_enaks_konus.png")
-                export_cu_enaks_konus_pdf(konus_series, 
-                                          enaks_series, 
-                                          outfile_pdf=out_c4_pdf, 
-                                          outfile_png=out_c4_png,
-                                          logo_path=logo_path, 
-                                          title_info={**title_info_common,"figur_nr":fig_cuc}
-                )
-                st.subheader("C4 – Konus + Enaks")
-                st.image(out_c4_png, caption="Preview C4 – Konus + Enaks", use_column_width=True)
-                with open(out_c4_pdf, "rb") as f:
-                    st.download_button("Download C4 – Konus + Enaks PDF", f, file_name="C4_cu_enaks_konus.pdf")
-
-            # C5 – Enaks deformation
-            if enaks_series:
-                out_c5_pdf = os.path.join(tmpdir, "C5_enaks_deformation.pdf")
-                out_c5_png = os.path.join(tmpdir, "C5_enaks_deformation.png")
-                export_enaks_deformation_pdf(enaks_series, 
-                                             outfile_pdf=out_c5_pdf, 
-                                             outfile_png=out_c5_png,
-                                             logo_path=logo_path, 
-                                             title_info={**title_info_common,"figur_nr":fig_ef}
-                )
-                st.subheader("C5 – Enaks Deformation")
-                st.image(out_c5_png, caption="Preview C5 – Enaks Deformation", use_column_width=True)
-                with open(out_c5_pdf, "rb") as f:
-                    st.download_button("Download C5 – Enaks Deformation PDF", f, file_name="C5_enaks_deformation.pdf")
-
-            # C1 – water content
-            if wc_series:
-                out_c1_pdf = os.path.join(tmpdir, "C1_water content.pdf")
-                out_c1_png = os.path.join(tmpdir, "C1_water content.png")
-                export_wc_pdf(wc_series,
-                              outfile_pdf=out_c1_pdf,
-                              outfile_png=out_c1_png,
-                              logo_path=logo_path, 
-                              title_info={**title_info_common,"figur_nr":fig_wc}
-                )
-                st.subheader("C1 – Water content")
-                st.image(out_c1_png, caption="Preview C1 – Water content", use_column_width=True)
-                with open(out_c1_pdf, "rb") as f:
-                    st.download_button("Download C1 – Watercontent PDF", f, file_name="C1_water content.pdf")
+            if run.ok("table"):
+                df = pd.read_excel(run.results["table"])
+                st.dataframe(df)
+                download_file("Download Excel", run.results["table"],
+                              "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                report_files.append(run.results["table"])
+
+            if run.get("archive"):
+                archived = ", ".join(f"{test} {n} rader" for test, n in run.results["archive"].items())
+                st.info(f"Arkivert som «{archive_name.strip()}»: {archived}")
+
+            if window_on:
+                indexes = {label: DepthIndex(series) for label, series in [
+                    (label, select(series_from(run.results, name))) for label, name in [
+                        ("Konus", "konus"), ("Enaks", "enaks"), ("Vanninnhold", "wc"),
+                        ("Tyngdetetthet", "gamma"), ("Atterberg", "atterberg")]] if series}
+                st.subheader(f"Verdier mellom {window_axis.lower()} {window_from:g} og {window_to:g} m")
+                st.dataframe(project_window(indexes, window_from, window_to, axis=window_axis))
+
+            # --- Figures with preview + download ---
+            for key, subheader, caption, label in FIGURE_VIEWS:
+                if key == "curves" and run.ok("curves") and not run.get("curves"):
+                    st.warning(f"Fant ingen kurver i arket '{curve_layout['sheet']}'.")
+                outputs = run.get(key)
+                if not outputs:
+                    continue
+                if subheader:
+                    st.subheader(subheader)
+                show_previews(outputs[1:], caption)
+                download_file(label, outputs[0], "application/pdf")
+                report_files += outputs
+
+            section_names = [s.name for s in stages if s.name.startswith("section:") and run.get(s.name)]
+            if section_names:
+                st.subheader("C11 – Cross-sections")
+            for name in section_names:
+                _, n, key = name.split(":", 2)
+                outputs = run.results[name]
+                show_previews(outputs[1:], f"Preview C11 – Section {n} ({key})")
+                download_file(f"Download C11 – Section {n} ({key}) PDF", outputs[0], "application/pdf")
+                report_files += outputs
+
+            # --- Everything in one archive ---
+            st.subheader("Download all")
+            bundle_files = list(report_files)
+
+            def zip_download():
+                with build_zip_bundle(bundle_files, include_png=include_png) as bundle:
+                    return bundle.read()
+            st.download_button("Download all (ZIP)", zip_download,
+                               file_name="grunnundersokelser.zip", mime="application/zip")
+
+        # --- Where did the time go? ---
+        with st.expander("Tidsbruk per steg"):
+            path = run.critical_path()
+            if path:
+                st.caption("Kritisk vei: " + " → ".join(path))
+            st.dataframe(run.table())
+            st.dataframe(timings.report())
+            events = timings.events_frame()
+            if not events.empty:
+                st.dataframe(events)
+            if prof.get("text"):
+                st.code(prof["text"])
+            try:
+                warm = wait_all([pool_submit(warmup_stats)])[0]
+            except PoolBusy:
+                warm = None
+            if warm:
+                startup = f"{warm['startup_s']:.2f} s" if warm["startup_s"] is not None else "ukjent"
+                st.caption(f"Oppvarming av arbeiderprosess {warm['pid']}: oppstart {startup}, "
+                           f"oppvarming {warm['warmup_s']:.2f} s")
+                st.dataframe(pd.DataFrame(list(warm["steps"].items()), columns=["Steg", "Tid (s)"]))
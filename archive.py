@@ -0,0 +1,234 @@
+"""
+Archive of delivered projects as one partitioned Parquet dataset (needs `pyarrow`).
+
+Each project's combined table (build_data.combined_frame(), or a delivered
+grunnundersokelser.xlsx read once) is split by test type and written to
+
+    <archive>/test=<konus|enaks|wc|gamma|atterberg>/prosjekt=<project>/part-0.parquet
+
+in row groups of about ROW_GROUP_ROWS rows with min/max statistics. The rows of a file are
+tiled before writing: about sqrt(n) depth bands (depth quantiles) times sqrt(n) blocks of
+boreholes (in name order), one row group per tile, so each row group covers few boreholes
+and a narrow depth (and so elevation) range. Archiving a project again replaces all its
+partitions, also those of test types the new data no longer has. Project names are used
+as directory names and must not contain path separators or "..".
+
+read_archive() turns project, borehole, depth and elevation filters into one pyarrow
+expression: project partitions that do not match are never opened, and within a file
+only the row groups whose statistics overlap the filter are read. scan_plan() shows how
+many files and row groups a query touches.
+
+    python archive.py add 10234 grunnundersokelser.xlsx
+    python archive.py query konus --boreholes BH1 BH2 --depth 2 10
+"""
+import argparse
+import logging
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span, log_event
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only for the archive
+    pa = ds = pq = None
+
+ARCHIVE_DIR = os.environ.get("GRUNN_ARCHIVE", os.path.join(os.path.expanduser("~"), "grunn_arkiv"))
+ROW_GROUP_ROWS = 1024
+
+# Test type: value columns of the combined table
+TEST_COLUMNS = {
+    "konus": ["Omrørt skjærstyrke", "Uforstyrret skjærstyrke konus", "Sensitivitet"],
+    "enaks": ["Skjærstyrke enaks", "Bruddtøyning"],
+    "wc": ["Vanninnhold (%)"],
+    "gamma": ["Tyngdetetthet (kN/m³)"],
+    "atterberg": ["Plastisitetsgrense wP (%)", "Flytegrense wL (%)", "Plastisitetsindeks Ip (%)", "Flyteindeks IL"],
+}
+KEY_COLUMNS = ["Borhull", "Dybde", "Kote"]
+
+def _require():
+    if pa is None:
+        raise ImportError("The Parquet archive needs the 'pyarrow' package")
+
+def _schema(test):
+    return pa.schema([("Borhull", pa.string()), ("Dybde", pa.float64()), ("Kote", pa.float64())]
+                     + [(c, pa.float64()) for c in TEST_COLUMNS[test]])
+
+def _dataset(test, archive_dir):
+    path = os.path.join(archive_dir, f"test={test}")
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, schema=_schema(test).append(pa.field("prosjekt", pa.string())),
+                      format="parquet", partitioning="hive")
+
+def _project_name(project):
+    """`project` as a partition directory name; ValueError if it could leave the archive."""
+    name = str(project).strip()
+    if (not name or name in (".", "..") or ".." in name or "=" in name
+            or any(sep and sep in name for sep in ("/", "\\", os.sep, os.altsep))):
+        raise ValueError(f"Invalid project name for the archive: {project!r}")
+    return name
+
+def _tiles(rows):
+    """
+    Row-group number per row (rows sorted by borehole): about sqrt(n) depth bands times
+    sqrt(n) borehole blocks for n = rows / ROW_GROUP_ROWS.
+    """
+    k = math.ceil(math.sqrt(max(1, math.ceil(len(rows) / ROW_GROUP_ROWS))))
+    depth = rows["Dybde"].to_numpy(dtype=float)
+    finite = depth[np.isfinite(depth)]
+    edges = np.unique(np.quantile(finite, np.linspace(0, 1, k + 1)[1:-1])) if k > 1 and len(finite) else []
+    band = np.searchsorted(edges, depth, side="right")
+    counts = rows.groupby("Borhull", sort=True).size()
+    block = ((counts.cumsum() - counts) * k // len(rows)).to_dict()
+    return rows["Borhull"].map(block).to_numpy(dtype=np.int64) * k + band
+
+def archive_project(project, table, archive_dir=ARCHIVE_DIR):
+    """
+    Write one project's data to the archive, replacing what it had there. `table` is a
+    combined frame or the path of an exported table (.xlsx, first sheet).
+    Returns {test type: rows written}.
+    """
+    _require()
+    project = _project_name(project)
+    if not isinstance(table, pd.DataFrame):
+        with span("archive.read_table", file=os.path.basename(table)):
+            table = pd.read_excel(table, sheet_name=0)
+    for test in TEST_COLUMNS:
+        shutil.rmtree(os.path.join(archive_dir, f"test={test}", f"prosjekt={project}"), ignore_errors=True)
+    written = {}
+    for test, columns in TEST_COLUMNS.items():
+        present = [c for c in columns if c in table]
+        if not present:
+            continue
+        rows = table[KEY_COLUMNS + present].dropna(subset=present, how="all")
+        rows = rows.reindex(columns=KEY_COLUMNS + columns)
+        rows["Borhull"] = rows["Borhull"].astype(str)
+        if rows.empty:
+            continue
+        rows = rows.sort_values(["Borhull", "Dybde"], ignore_index=True)
+        rows["_tile"] = _tiles(rows)
+        rows = rows.sort_values(["_tile", "Borhull", "Dybde"], kind="stable", ignore_index=True)
+        bounds = np.flatnonzero(np.diff(rows.pop("_tile").to_numpy(), prepend=-1, append=-1))
+        folder = os.path.join(archive_dir, f"test={test}", f"prosjekt={project}")
+        os.makedirs(folder, exist_ok=True)
+        with span("archive.write", file=f"{project}/{test}") as counts:
+            data = pa.Table.from_pandas(rows, schema=_schema(test), preserve_index=False)
+            with pq.ParquetWriter(os.path.join(folder, "part-0.parquet"), data.schema) as writer:
+                for start, stop in zip(bounds[:-1], bounds[1:]):  # one row group per tile
+                    writer.write_table(data.slice(start, stop - start), row_group_size=ROW_GROUP_ROWS)
+            counts["rows"] = len(rows)
+        written[test] = len(rows)
+    log_event(f"✅ Archived project {project}: " + ", ".join(f"{t} {n}" for t, n in written.items()))
+    return written
+
+def archive_filter(projects=None, boreholes=None, depth=None, elevation=None):
+    """pyarrow expression for the given filters (None = no filter); depth/elevation are (min, max)."""
+    _require()
+    conditions = []
+    if projects is not None:
+        conditions.append(ds.field("prosjekt").isin([str(p) for p in projects]))
+    if boreholes is not None:
+        conditions.append(ds.field("Borhull").isin([str(b) for b in boreholes]))
+    for name, bounds in (("Dybde", depth), ("Kote", elevation)):
+        if bounds is None:
+            continue
+        lo, hi = bounds
+        if lo is not None:
+            conditions.append(ds.field(name) >= float(lo))
+        if hi is not None:
+            conditions.append(ds.field(name) <= float(hi))
+    expr = None
+    for c in conditions:
+        expr = c if expr is None else expr & c
+    return expr
+
+def read_archive(test, projects=None, boreholes=None, depth=None, elevation=None, columns=None,
+                 archive_dir=ARCHIVE_DIR):
+    """
+    Archived rows of one test type matching the filters, as a frame with a "prosjekt"
+    column. `columns` limits the value columns read (the key columns are always included).
+    """
+    _require()
+    dataset = _dataset(test, archive_dir)
+    names = KEY_COLUMNS + (list(columns) if columns is not None else TEST_COLUMNS[test]) + ["prosjekt"]
+    if dataset is None:
+        return pd.DataFrame(columns=names)
+    with span("archive.read", file=test) as counts:
+        table = dataset.to_table(columns=names, filter=archive_filter(projects, boreholes, depth, elevation))
+        counts["rows"] = table.num_rows
+    return table.to_pandas()
+
+def scan_plan(test, projects=None, boreholes=None, depth=None, elevation=None, archive_dir=ARCHIVE_DIR):
+    """Files and row groups in the archive vs. those a query with these filters reads."""
+    _require()
+    dataset = _dataset(test, archive_dir)
+    plan = {"files": 0, "files_read": 0, "row_groups": 0, "row_groups_read": 0}
+    if dataset is None:
+        return plan
+    expr = archive_filter(projects, boreholes, depth, elevation)
+    matching = {f.path for f in dataset.get_fragments(filter=expr)}  # partition pruning
+    for fragment in dataset.get_fragments():
+        plan["files"] += 1
+        plan["row_groups"] += fragment.metadata.num_row_groups
+        if fragment.path not in matching:
+            continue
+        groups = len(fragment.split_by_row_group(filter=expr, schema=dataset.schema))  # statistics
+        plan["files_read"] += groups > 0
+        plan["row_groups_read"] += groups
+    return plan
+
+def archived_projects(archive_dir=ARCHIVE_DIR):
+    """Project names in the archive, over all test types."""
+    projects = set()
+    for test in TEST_COLUMNS:
+        path = os.path.join(archive_dir, f"test={test}")
+        if os.path.isdir(path):
+            projects.update(d.split("=", 1)[1] for d in os.listdir(path) if d.startswith("prosjekt="))
+    return sorted(projects)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet archive of delivered projects")
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="archive a project's grunnundersokelser.xlsx")
+    add.add_argument("project")
+    add.add_argument("table")
+    query = sub.add_parser("query", help="rows of one test type, filtered")
+    query.add_argument("test", choices=list(TEST_COLUMNS))
+    query.add_argument("--projects", nargs="+")
+    query.add_argument("--boreholes", nargs="+")
+    query.add_argument("--depth", nargs=2, type=float, metavar=("MIN", "MAX"))
+    query.add_argument("--elevation", nargs=2, type=float, metavar=("MIN", "MAX"))
+    query.add_argument("--out", help="write the result to .csv/.xlsx/.parquet instead of printing it")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "add":
+        archive_project(args.project, args.table, args.archive)
+        return
+    filters = dict(projects=args.projects, boreholes=args.boreholes, depth=args.depth, elevation=args.elevation)
+    df = read_archive(args.test, archive_dir=args.archive, **filters)
+    plan = scan_plan(args.test, archive_dir=args.archive, **filters)
+    print(f"{len(df)} rows from {plan['files_read']}/{plan['files']} files, "
+          f"{plan['row_groups_read']}/{plan['row_groups']} row groups")
+    if args.out:
+        ext = os.path.splitext(args.out)[1].lower()
+        if ext == ".xlsx":
+            df.to_excel(args.out, index=False)
+        elif ext == ".parquet":
+            df.to_parquet(args.out, index=False)
+        else:
+            df.to_csv(args.out, index=False)
+    else:
+        with pd.option_context("display.max_rows", 50):
+            print(df)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark ingest, merge and rendering on synthetic projects.
+
+Usage:
+    python benchmarks/run_benchmarks.py --boreholes 20 --samples 25 --out results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baselines/main.json
+
+Every stage is timed separately (best and mean of --repeat runs) and run once more under
+tracemalloc to record peak Python memory. Results are written as JSON; with --baseline the
+run is compared stage by stage and slower/larger stages beyond --tolerance are flagged.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import matplotlib
+matplotlib.use("Agg")
+
+from synthetic_data import generate_project
+from build_data import build_konus_series, build_enaks_series, build_wc_series, export_combined_table
+from plot_pdf import (export_sensitivity_pdf,
+    export_curfc_pdf,
+    export_cu_enaks_konus_pdf,
+    export_enaks_deformation_pdf,
+    export_wc_pdf)
+
+def _measure(fn, repeat):
+    """Time `fn` `repeat` times, then once more under tracemalloc for peak memory."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_s": min(times),
+        "mean_s": sum(times) / len(times),
+        "runs": len(times),
+        "peak_mem_bytes": peak,
+    }
+
+def run(n_boreholes, n_samples, repeat=3, png=False, seed=0, workdir=None):
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        t0 = time.perf_counter()
+        project = generate_project(os.path.join(tmpdir, "data"), n_boreholes, n_samples, seed=seed)
+        generate_s = time.perf_counter() - t0
+
+        folders, ranges = project["folders"], project["ranges"]
+        sheet, terrain = project["sheet_name"], project["terrain_lookup"]
+        out = os.path.join(tmpdir, "out")
+        os.makedirs(out)
+
+        series = {}
+        def ingest(kind, builder):
+            def _fn():
+                series[kind] = builder(folders[kind], sheet, ranges, terrain)
+            return _fn
+
+        def png_path(name):
+            return os.path.join(out, name + ".png") if png else None
+
+        stages = {}
+        stages["build_konus_series"] = _measure(ingest("konus", build_konus_series), repeat)
+        stages["build_enaks_series"] = _measure(ingest("enaks", build_enaks_series), repeat)
+        stages["build_wc_series"] = _measure(ingest("wc", build_wc_series), repeat)
+
+        konus, enaks, wc = series["konus"], series["enaks"], series["wc"]
+        stages["export_combined_table"] = _measure(
+            lambda: export_combined_table(konus, enaks, wc, os.path.join(out, "grunnundersokelser.xlsx")),
+            repeat)
+        stages["export_sensitivity_pdf"] = _measure(
+            lambda: export_sensitivity_pdf(konus, os.path.join(out, "C2.pdf"), png_path("C2")), repeat)
+        stages["export_curfc_pdf"] = _measure(
+            lambda: export_curfc_pdf(konus, os.path.join(out, "C3.pdf"), png_path("C3")), repeat)
+        stages["export_cu_enaks_konus_pdf"] = _measure(
+            lambda: export_cu_enaks_konus_pdf(konus, enaks, os.path.join(out, "C4.pdf"), png_path("C4")),
+            repeat)
+        stages["export_enaks_deformation_pdf"] = _measure(
+            lambda: export_enaks_deformation_pdf(enaks, os.path.join(out, "C5.pdf"), png_path("C5")), repeat)
+        stages["export_wc_pdf"] = _measure(
+            lambda: export_wc_pdf(wc, os.path.join(out, "C1.pdf"), png_path("C1")), repeat)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "matplotlib": matplotlib.__version__,
+            "boreholes": n_boreholes,
+            "samples": n_samples,
+            "repeat": repeat,
+            "png": png,
+            "generate_s": generate_s,
+        },
+        "stages": stages,
+    }
+
+def compare(result, baseline, tolerance=0.25):
+    """
+    Compare stage timings and peak memory against a stored baseline.
+    Returns a list of regressions: (stage, metric, baseline, current, ratio).
+    """
+    regressions = []
+    for stage, cur in result["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        for metric in ("best_s", "peak_mem_bytes"):
+            b, c = base.get(metric), cur.get(metric)
+            if not b or c is None:
+                continue
+            ratio = c / b
+            if ratio > 1.0 + tolerance:
+                regressions.append((stage, metric, b, c, ratio))
+    return regressions
+
+def _print_table(result):
+    print(f"{'stage':32s} {'best (s)':>10s} {'mean (s)':>10s} {'peak (MB)':>10s}")
+    for stage, r in result["stages"].items():
+        print(f"{stage:32s} {r['best_s']:10.3f} {r['mean_s']:10.3f} {r['peak_mem_bytes'] / 1e6:10.1f}")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--boreholes", type=int, default=10)
+    p.add_argument("--samples", type=int, default=14, help="samples per borehole and test type")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--png", action="store_true", help="also save 300 dpi PNG previews")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--baseline", help="JSON results to compare against")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown, 0.25 = 25 %%")
+    p.add_argument("--fail-on-regression", action="store_true")
+    args = p.parse_args(argv)
+
+    result = run(args.boreholes, args.samples, repeat=args.repeat, png=args.png, seed=args.seed)
+    _print_table(result)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        for stage, metric, b, c, ratio in regressions:
+            print(f"REGRESSION {stage} {metric}: {b:.4g} -> {c:.4g} ({ratio:.2f}x)")
+        if not regressions:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Generate synthetic lab workbooks in the NGI layout used by build_data.py.
+
+One konus, enaks and water content workbook is written per borehole (file name = borehole
+name, as the app expects) plus a terrain table with columns BH | Z.
+"""
+import os
+import numpy as np
+from openpyxl import Workbook
+
+SHEET_NAME = "Sheet 001"
+KONUS_FIRST_ROW = 6
+ENAKS_FIRST_ROW = 6
+WC_FIRST_ROW = 12
+
+def ranges_for(n_samples):
+    """Return the `ranges` dict matching workbooks written with `n_samples` rows."""
+    k_last = KONUS_FIRST_ROW + n_samples - 1
+    e_last = ENAKS_FIRST_ROW + n_samples - 1
+    w_last = WC_FIRST_ROW + n_samples - 1
+    return {
+        "konus_undist": f"L{KONUS_FIRST_ROW}:L{k_last}",
+        "konus_remould": f"M{KONUS_FIRST_ROW}:M{k_last}",
+        "depth": f"F{KONUS_FIRST_ROW}:F{k_last}",
+        "enaks_strength": f"G{ENAKS_FIRST_ROW}:G{e_last}",
+        "enaks_deform": f"H{ENAKS_FIRST_ROW}:H{e_last}",
+        "enaks_depth": f"F{ENAKS_FIRST_ROW}:F{e_last}",
+        "wc_depth": f"G{WC_FIRST_ROW}:G{w_last}",
+        "wc": f"H{WC_FIRST_ROW}:H{w_last}",
+    }
+
+def _borehole_names(n_boreholes):
+    return [f"BH-{i:04d}" for i in range(1, n_boreholes + 1)]
+
+def _depths(rng, n_samples):
+    # Sample pairs every ~2 m from a few metres below terrain, like a piston sampler log
+    start = rng.uniform(1.0, 5.0)
+    steps = rng.uniform(0.4, 2.2, size=n_samples)
+    return np.round(start + np.cumsum(steps) - steps[0], 2)
+
+def _header_rows(ws, title, first_row):
+    ws.append([title])
+    for _ in range(first_row - 2):
+        ws.append([])
+
+def _write_konus(path, bh, depths, rng):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    _header_rows(ws, "Fallcone Norwegian Output", KONUS_FIRST_ROW)
+    cu = np.round(8.0 + 1.6 * depths * rng.lognormal(0.0, 0.2, size=depths.size), 1)
+    st = rng.lognormal(2.0, 0.5, size=depths.size)
+    cur = np.round(cu / st, 2)
+    for i, d in enumerate(depths):
+        # B=Boring, C=Tube, F=Dybde, G..K lab readings, L=cufc, M=curfc, N/O NS 8015, P=St
+        ws.append([None, bh, str(i // 2 + 1), None, None, float(d),
+                   100, 5.0, 60, None, 6.0,
+                   float(cu[i]), float(cur[i]), None, None, float(np.round(cu[i] / cur[i], 1))])
+    wb.save(path)
+
+def _write_enaks(path, bh, depths, rng):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    _header_rows(ws, "UCS Oppsummering", ENAKS_FIRST_ROW)
+    cu = np.round(10.0 + 1.8 * depths * rng.lognormal(0.0, 0.15, size=depths.size))
+    eps = np.round(rng.uniform(1.5, 9.0, size=depths.size), 1)
+    for i, d in enumerate(depths):
+        # F=Dybde, G=cu, H=ε, I=qu, K=w, L=ɣ
+        ws.append([None, bh, i + 1, "A", None, float(d), float(cu[i]), float(eps[i]),
+                   float(2 * cu[i]), None, float(np.round(rng.uniform(18, 40), 1)),
+                   float(np.round(rng.uniform(18.5, 21.5), 1))])
+    wb.save(path)
+
+def _write_wc(path, bh, depths, rng):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    _header_rows(ws, "ISO water content Norwegian Output sheet", WC_FIRST_ROW)
+    wc = np.round(rng.normal(28.0, 6.0, size=depths.size).clip(8, 80), 1)
+    for i, d in enumerate(depths):
+        # B=Boring, D=Sylinder, G=Dybde, H=w
+        ws.append([None, bh, None, i // 2 + 1, None, None, float(d), float(wc[i])])
+    wb.save(path)
+
+def generate_project(outdir, n_boreholes=10, n_samples=14, seed=0, ext=".xlsm"):
+    """
+    Write a synthetic project below `outdir`:
+      outdir/terrain.xlsx, outdir/konus/<BH><ext>, outdir/enaks/<BH><ext>, outdir/wc/<BH><ext>
+    Returns dict with the folders, the terrain path and the matching `ranges`.
+    """
+    rng = np.random.default_rng(seed)
+    folders = {kind: os.path.join(outdir, kind) for kind in ("konus", "enaks", "wc")}
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+
+    bhs = _borehole_names(n_boreholes)
+    terrain = np.round(rng.uniform(5.0, 35.0, size=n_boreholes), 3)
+
+    for bh in bhs:
+        _write_konus(os.path.join(folders["konus"], bh + ext), bh, _depths(rng, n_samples), rng)
+        _write_enaks(os.path.join(folders["enaks"], bh + ext), bh, _depths(rng, n_samples), rng)
+        _write_wc(os.path.join(folders["wc"], bh + ext), bh, _depths(rng, n_samples), rng)
+
+    terrain_path = os.path.join(outdir, "terrain.xlsx")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["BH", "Z"])
+    for bh, z in zip(bhs, terrain):
+        ws.append([bh, float(z)])
+    wb.save(terrain_path)
+
+    return {
+        "folders": folders,
+        "terrain": terrain_path,
+        "terrain_lookup": dict(zip(bhs, terrain.tolist())),
+        "ranges": ranges_for(n_samples),
+        "sheet_name": SHEET_NAME,
+    }
@@ -2,6 +2,8 @@ import os, math
 import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries
+from instrumentation import span, start_span, end_span, log_event
 
 def _pick_range(ranges: dict, candidates, label: str) -> str:
     """
@@ -14,7 +16,46 @@ def _pick_range(ranges: dict, candidates, label: str) -> str:
             return v
     raise KeyError(f"Missing '{label}' in ranges (tried keys: {', '.join(candidates)})")
 
-def build_konus_series(folder, sheet_name, ranges, terrain_lookup):
+def _first_row(cell_range):
+    """Sheet row of the first cell in `cell_range` (e.g. 6 for 'F6:F30')."""
+    return range_boundaries(cell_range)[1]
+
+TERRAIN_XY_NAMES = {"X": ("X", "Ø", "ØST", "E", "EAST"), "Y": ("Y", "N", "NORD", "NORTH")}
+TERRAIN_AREA_NAMES = ("OMRÅDE", "OMRADE", "AREA")
+
+def read_terrain_table(path, require_z=True):
+    """
+    Read the terrain table: BH and Z in the first two columns, optionally X/Y coordinates
+    in columns with a matching header (X/Øst/E and Y/Nord/N) and an optional area column
+    (Område/Area) used for paginating figures. When Z comes from a terrain model
+    (terrain.terrain_from_dem), use `require_z=False`: rows without Z are kept, and the
+    table may also be just BH, X, Y.
+    Returns a DataFrame with columns BH | Z (| X | Y | Område), BH as str.
+    """
+    raw = pd.read_excel(path)
+    has_z = str(raw.columns[1]).strip().upper() not in TERRAIN_XY_NAMES["X"] if len(raw.columns) > 1 else False
+    if has_z:
+        df = raw.iloc[:, :2].copy()
+        df.columns = ["BH", "Z"]
+    else:
+        df = raw.iloc[:, :1].copy()
+        df.columns = ["BH"]
+        df["Z"] = np.nan
+    headers = {str(c).strip().upper(): c for c in raw.columns[2 if has_z else 1:]}
+    for target, aliases in TERRAIN_XY_NAMES.items():
+        for alias in aliases:
+            if alias in headers:
+                df[target] = pd.to_numeric(raw[headers[alias]], errors="coerce")
+                break
+    for alias in TERRAIN_AREA_NAMES:
+        if alias in headers:
+            df["Område"] = raw[headers[alias]].astype("string")
+            break
+    df = df.dropna(subset=["BH", "Z"] if require_z else ["BH"])
+    df["BH"] = df["BH"].astype(str)
+    return df.reset_index(drop=True)
+
+def build_konus_series(folder, sheet_name, ranges, terrain_lookup, boreholes=None):
     """
     Returns dict of borehole data:
     {
@@ -24,9 +65,12 @@ def build_konus_series(folder, sheet_name, ranges, terrain_lookup):
         "sensitivity": [...],
         "depths": [...],
         "elevs": [...],
+        "rows": [...],   # sheet row of each sample (the other builders keep it too)
         "Z": terrain_level
       }
     }
+    `boreholes` (optional set of names, e.g. from a spatial.BoreholeIndex query) limits
+    which files are read; the other builders take the same argument.
     """
 
     excel_extensions = (".xlsx", ".xls", ".xlsm")
@@ -36,41 +80,51 @@ def build_konus_series(folder, sheet_name, ranges, terrain_lookup):
         if not filename.endswith(excel_extensions) or filename.startswith("~$"):
             continue
         bh = os.path.splitext(filename)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
         Z = terrain_lookup.get(bh)
         if Z is None:
-            print(f"⚠️ No terrain level for {bh}, skipping")
+            log_event(f"⚠️ No terrain level for {bh}, skipping", level="warning", file=filename)
             continue
 
         path = os.path.join(folder, filename)
         try:
-            wb = load_workbook(path, data_only=True)
+            with span("konus.open", file=filename):
+                wb = load_workbook(path, data_only=True)
             if sheet_name not in wb.sheetnames:
-                print(f"⚠️ Sheet {sheet_name} not in {filename}, skipping")
+                log_event(f"⚠️ Sheet {sheet_name} not in {filename}, skipping", level="warning", file=filename)
                 continue
             ws = wb[sheet_name]
 
-            und_raw = [cell[0].value for cell in ws[ranges["konus_undist"]]]
-            rem_raw = [cell[0].value for cell in ws[ranges["konus_remould"]]]
-            dep_raw = [cell[0].value for cell in ws[ranges["depth"]]]
+            with span("konus.parse", file=filename) as counts:
+                und_raw = [cell[0].value for cell in ws[ranges["konus_undist"]]]
+                rem_raw = [cell[0].value for cell in ws[ranges["konus_remould"]]]
+                dep_raw = [cell[0].value for cell in ws[ranges["depth"]]]
+
+                first = _first_row(ranges["depth"])
+                depths, undist, remould, sens, rows = [], [], [], [], []
+                for i, (u, r, d) in enumerate(zip(und_raw, rem_raw, dep_raw)):
+                    if d is None:
+                        continue
+                    depths.append(d)
+                    rows.append(first + i)
 
-            depths, elevs, undist, remould, sens = [], [], [], [], []
-            for u, r, d in zip(und_raw, rem_raw, dep_raw):
-                if d is None:
-                    continue
-                depths.append(d)
-                elevs.append(Z - d)
+                    cu_val = float(u) if u is not None else np.nan
+                    cur_val = float(r) if r is not None else np.nan
 
-                cu_val = float(u) if u is not None else np.nan
-                cur_val = float(r) if r is not None else np.nan
+                    undist.append(cu_val if np.isfinite(cu_val) else np.nan)
+                    remould.append(cur_val if np.isfinite(cur_val) else np.nan)
 
-                undist.append(cu_val if np.isfinite(cu_val) else np.nan)
-                remould.append(cur_val if np.isfinite(cur_val) else np.nan)
+                    if np.isfinite(cu_val) and np.isfinite(cur_val) and cur_val != 0:
+                        s_val = cu_val / cur_val
+                        sens.append(s_val if s_val > 0 else np.nan)
+                    else:
+                        sens.append(np.nan)
+                counts["rows"] = len(depths)
 
-                if np.isfinite(cu_val) and np.isfinite(cur_val) and cur_val != 0:
-                    s_val = cu_val / cur_val
-                    sens.append(s_val if s_val > 0 else np.nan)
-                else:
-                    sens.append(np.nan)
+            with span("konus.terrain_join", file=filename) as counts:
+                elevs = [Z - d for d in depths]
+                counts["rows"] = len(elevs)
 
             konus_series[bh] = {
                 "undist": undist,
@@ -78,16 +132,17 @@ def build_konus_series(folder, sheet_name, ranges, terrain_lookup):
                 "sensitivity": sens,
                 "depths": depths,
                 "elevs": elevs,
+                "rows": rows,
                 "Z": Z,
             }
 
         except Exception as e:
-            print(f"❌ Error reading {filename}: {e}")
+            log_event(f"❌ Error reading {filename}: {e}", level="error", file=filename)
 
     return konus_series
 
 # --- ENAKS ---------------------------------------------------------------
-def build_enaks_series(folder, sheet_name, ranges, terrain_lookup):
+def build_enaks_series(folder, sheet_name, ranges, terrain_lookup, boreholes=None):
     """
     Build a dict per borehole with ENAKS strength (cu) and deformation at break ε_f.
 
@@ -101,7 +156,8 @@ def build_enaks_series(folder, sheet_name, ranges, terrain_lookup):
           "Z": <terrain level>,
           "depths": [..], "elevs": [..],
           "strength":[.. or None ..],
-          "deform":  [.. or None ..]
+          "deform":  [.. or None ..],
+          "rows": [..]
         }, ...
       }
     """
@@ -117,30 +173,40 @@ def build_enaks_series(folder, sheet_name, ranges, terrain_lookup):
             continue
         path = os.path.join(folder, fname)
         bh = os.path.splitext(fname)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
         Z = terrain_lookup.get(bh)
         if Z is None:
-            print(f"⚠️ Terrain level not found for {bh}, skipping Enaks.")
+            log_event(f"⚠️ Terrain level not found for {bh}, skipping Enaks.", level="warning", file=fname)
             continue
 
         try:
-            wb = load_workbook(path, data_only=True)
+            with span("enaks.open", file=fname):
+                wb = load_workbook(path, data_only=True)
             if sheet_name not in wb.sheetnames:
-                print(f"⚠️ Sheet '{sheet_name}' not in {fname}, skipping.")
+                log_event(f"⚠️ Sheet '{sheet_name}' not in {fname}, skipping.", level="warning", file=fname)
                 continue
             ws = wb[sheet_name]
 
-            str_raw = [c[0].value for c in ws[str_rng]]
-            def_raw = [c[0].value for c in ws[def_rng]]
-            dep_raw = [c[0].value for c in ws[dep_rng]]
-
-            depths, elevs, strength, deform = [], [], [], []
-            for cu, df, d in zip(str_raw, def_raw, dep_raw):
-                if d is None:
-                    continue
-                depths.append(d)
-                elevs.append(Z - d)
-                strength.append(float(cu) if cu is not None else None)
-                deform.append(float(df) if df is not None else None)
+            with span("enaks.parse", file=fname) as counts:
+                str_raw = [c[0].value for c in ws[str_rng]]
+                def_raw = [c[0].value for c in ws[def_rng]]
+                dep_raw = [c[0].value for c in ws[dep_rng]]
+
+                first = _first_row(dep_rng)
+                depths, strength, deform, rows = [], [], [], []
+                for i, (cu, df, d) in enumerate(zip(str_raw, def_raw, dep_raw)):
+                    if d is None:
+                        continue
+                    depths.append(d)
+                    rows.append(first + i)
+                    strength.append(float(cu) if cu is not None else None)
+                    deform.append(float(df) if df is not None else None)
+                counts["rows"] = len(depths)
+
+            with span("enaks.terrain_join", file=fname) as counts:
+                elevs = [Z - d for d in depths]
+                counts["rows"] = len(elevs)
 
             out[bh] = {
                 "Z": Z,
@@ -148,13 +214,14 @@ def build_enaks_series(folder, sheet_name, ranges, terrain_lookup):
                 "elevs": elevs,
                 "strength": strength,
                 "deform": deform,
+                "rows": rows,
             }
         except Exception as e:
-            print(f"❌ Error reading {fname}: {e}")
+            log_event(f"❌ Error reading {fname}: {e}", level="error", file=fname)
 
     return out
 
-def build_wc_series(folder, sheet_name, ranges, terrain_lookup):
+def build_wc_series(folder, sheet_name, ranges, terrain_lookup, boreholes=None):
     """
     Returns dict of borehole data:
     {
@@ -174,53 +241,215 @@ def build_wc_series(folder, sheet_name, ranges, terrain_lookup):
         if not filename.endswith(excel_extensions) or filename.startswith("~$"):
             continue
         bh = os.path.splitext(filename)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
         Z = terrain_lookup.get(bh)
         if Z is None:
-            print(f"⚠️ No terrain level for {bh}, skipping")
+            log_event(f"⚠️ No terrain level for {bh}, skipping", level="warning", file=filename)
             continue
 
         path = os.path.join(folder, filename)
         try:
-            wb = load_workbook(path, data_only=True)
+            with span("wc.open", file=filename):
+                wb = load_workbook(path, data_only=True)
             if sheet_name not in wb.sheetnames:
-                print(f"⚠️ Sheet {sheet_name} not in {filename}, skipping")
+                log_event(f"⚠️ Sheet {sheet_name} not in {filename}, skipping", level="warning", file=filename)
                 continue
             ws = wb[sheet_name]
 
-            wc_raw = [cell[0].value for cell in ws[ranges["wc"]]]
-            dep_raw = [cell[0].value for cell in ws[ranges["wc_depth"]]]
-
-            depths, elevs, wc = [], [], []
-            for v,d in zip(wc_raw, dep_raw):
-                if d is None:
-                    continue
-                depths.append(d)
-                elevs.append(Z - d)
-                wc.append(float(v) if v is not None else None)
-                
+            with span("wc.parse", file=filename) as counts:
+                wc_raw = [cell[0].value for cell in ws[ranges["wc"]]]
+                dep_raw = [cell[0].value for cell in ws[ranges["wc_depth"]]]
+
+                first = _first_row(ranges["wc_depth"])
+                depths, wc, rows = [], [], []
+                for i, (v, d) in enumerate(zip(wc_raw, dep_raw)):
+                    if d is None:
+                        continue
+                    depths.append(d)
+                    rows.append(first + i)
+                    wc.append(float(v) if v is not None else None)
+                counts["rows"] = len(depths)
+
+            with span("wc.terrain_join", file=filename) as counts:
+                elevs = [Z - d for d in depths]
+                counts["rows"] = len(elevs)
+
             wc_series[bh] = {
                 "Z": Z,
                 "depths": depths,
                 "elevs": elevs,
-                "water content": wc
+                "water content": wc,
+                "rows": rows,
             }
 
         except Exception as e:
-            print(f"❌ Error reading {filename}: {e}")
+            log_event(f"❌ Error reading {filename}: {e}", level="error", file=filename)
 
     return wc_series
 
-def export_combined_table(konus_series, enaks_series, wc_series, outfile_xlsx):
+def build_gamma_series(folder, sheet_name, ranges, terrain_lookup, boreholes=None):
     """
-    Export combined borehole data to Excel.
+    Unit weight (ɣ) per borehole, same one-borehole-per-file layout as water content.
+
+    Expected keys in `ranges`: 'gamma' (kN/m³) and 'gamma_depth' (m).
+    Returns dict of borehole data:
+    {
+      BH: {
+        "Z": <terrain level>,
+        "depths": [...],
+        "elevs": [...],
+        "unit weight": [...],
+      }
+    }
+    """
+
+    excel_extensions = (".xlsx", ".xls", ".xlsm")
+    gamma_series = {}
+
+    for filename in os.listdir(folder):
+        if not filename.endswith(excel_extensions) or filename.startswith("~$"):
+            continue
+        bh = os.path.splitext(filename)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
+        Z = terrain_lookup.get(bh)
+        if Z is None:
+            log_event(f"⚠️ No terrain level for {bh}, skipping", level="warning", file=filename)
+            continue
+
+        path = os.path.join(folder, filename)
+        try:
+            with span("gamma.open", file=filename):
+                wb = load_workbook(path, data_only=True)
+            if sheet_name not in wb.sheetnames:
+                log_event(f"⚠️ Sheet {sheet_name} not in {filename}, skipping", level="warning", file=filename)
+                continue
+            ws = wb[sheet_name]
+
+            with span("gamma.parse", file=filename) as counts:
+                g_raw = [cell[0].value for cell in ws[ranges["gamma"]]]
+                dep_raw = [cell[0].value for cell in ws[ranges["gamma_depth"]]]
+
+                first = _first_row(ranges["gamma_depth"])
+                depths, gamma, rows = [], [], []
+                for i, (v, d) in enumerate(zip(g_raw, dep_raw)):
+                    if d is None:
+                        continue
+                    depths.append(d)
+                    rows.append(first + i)
+                    gamma.append(float(v) if v is not None else None)
+                counts["rows"] = len(depths)
+
+            with span("gamma.terrain_join", file=filename) as counts:
+                elevs = [Z - d for d in depths]
+                counts["rows"] = len(elevs)
+
+            gamma_series[bh] = {
+                "Z": Z,
+                "depths": depths,
+                "elevs": elevs,
+                "unit weight": gamma,
+                "rows": rows,
+            }
+
+        except Exception as e:
+            log_event(f"❌ Error reading {filename}: {e}", level="error", file=filename)
+
+    return gamma_series
+
+def build_atterberg_series(folder, sheet_name, ranges, terrain_lookup, boreholes=None):
+    """
+    Plastic limit wP and liquid limit wL per borehole.
+    Ip and IL are derived for all boreholes at once in derived.soil_indices().
+
+    Expected keys in `ranges`: 'wp', 'wl' (%) and 'atterberg_depth' (m).
+    Returns dict of borehole data:
+    {
+      BH: {
+        "Z": <terrain level>,
+        "depths": [...],
+        "elevs": [...],
+        "wp": [...],
+        "wl": [...],
+      }
+    }
+    """
+
+    excel_extensions = (".xlsx", ".xls", ".xlsm")
+    atterberg_series = {}
+
+    for filename in os.listdir(folder):
+        if not filename.endswith(excel_extensions) or filename.startswith("~$"):
+            continue
+        bh = os.path.splitext(filename)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
+        Z = terrain_lookup.get(bh)
+        if Z is None:
+            log_event(f"⚠️ No terrain level for {bh}, skipping", level="warning", file=filename)
+            continue
+
+        path = os.path.join(folder, filename)
+        try:
+            with span("atterberg.open", file=filename):
+                wb = load_workbook(path, data_only=True)
+            if sheet_name not in wb.sheetnames:
+                log_event(f"⚠️ Sheet {sheet_name} not in {filename}, skipping", level="warning", file=filename)
+                continue
+            ws = wb[sheet_name]
+
+            with span("atterberg.parse", file=filename) as counts:
+                wp_raw = [cell[0].value for cell in ws[ranges["wp"]]]
+                wl_raw = [cell[0].value for cell in ws[ranges["wl"]]]
+                dep_raw = [cell[0].value for cell in ws[ranges["atterberg_depth"]]]
+
+                first = _first_row(ranges["atterberg_depth"])
+                depths, wp, wl, rows = [], [], [], []
+                for i, (p, l, d) in enumerate(zip(wp_raw, wl_raw, dep_raw)):
+                    if d is None:
+                        continue
+                    depths.append(d)
+                    rows.append(first + i)
+                    wp.append(float(p) if p is not None else None)
+                    wl.append(float(l) if l is not None else None)
+                counts["rows"] = len(depths)
+
+            with span("atterberg.terrain_join", file=filename) as counts:
+                elevs = [Z - d for d in depths]
+                counts["rows"] = len(elevs)
+
+            atterberg_series[bh] = {
+                "Z": Z,
+                "depths": depths,
+                "elevs": elevs,
+                "wp": wp,
+                "wl": wl,
+                "rows": rows,
+            }
+
+        except Exception as e:
+            log_event(f"❌ Error reading {filename}: {e}", level="error", file=filename)
+
+    return atterberg_series
+
+def combined_frame(konus_series, enaks_series, wc_series, gamma_series=None, atterberg_series=None):
+    """
+    Merge all series into one frame, one row per borehole and depth.
 
     Columns:
       Borhull | Dybde | Kote | Omrørt skjærstyrke | Uforstyrret skjærstyrke konus |
       Sensitivitet | Skjærstyrke enaks | Bruddtøyning | Vanninnhold (%)
+    plus, when given, Tyngdetetthet and the Atterberg columns (wP, wL, Ip, IL –
+    `atterberg_series` as returned by derived.indices_to_series()).
     """
+    gamma_series = gamma_series or {}
+    atterberg_series = atterberg_series or {}
+    merge_span = start_span("table.merge")
     all_frames = []
 
-    for bh in sorted(set(konus_series) | set(enaks_series) | set(wc_series)):
+    all_bhs = set(konus_series) | set(enaks_series) | set(wc_series) | set(gamma_series) | set(atterberg_series)
+    for bh in sorted(all_bhs):
         # --- Konus ---
         kdata = konus_series.get(bh, {})
         df_k = pd.DataFrame({
@@ -255,13 +484,56 @@ def export_combined_table(konus_series, enaks_series, wc_series, outfile_xlsx):
         df_merged = pd.merge(df_k, df_e, on=["Borhull","Dybde","Kote"], how="outer")
         df_merged = pd.merge(df_merged, df_w, on=["Borhull","Dybde","Kote"], how="outer")
 
+        # --- Unit weight / Atterberg (optional) ---
+        if bh in gamma_series:
+            gdata = gamma_series[bh]
+            df_g = pd.DataFrame({
+                "Borhull": bh,
+                "Dybde": gdata.get("depths", []),
+                "Kote": gdata.get("elevs", []),
+                "Tyngdetetthet (kN/m³)": gdata.get("unit weight", []),
+            })
+            df_merged = pd.merge(df_merged, df_g, on=["Borhull","Dybde","Kote"], how="outer")
+
+        if bh in atterberg_series:
+            adata = atterberg_series[bh]
+            n = len(adata.get("depths", []))
+            df_a = pd.DataFrame({
+                "Borhull": bh,
+                "Dybde": adata.get("depths", []),
+                "Kote": adata.get("elevs", []),
+                "Plastisitetsgrense wP (%)": adata.get("wp", []),
+                "Flytegrense wL (%)": adata.get("wl", []),
+                "Plastisitetsindeks Ip (%)": adata.get("plasticity index", [np.nan] * n),
+                "Flyteindeks IL": adata.get("liquidity index", [np.nan] * n),
+            })
+            df_merged = pd.merge(df_merged, df_a, on=["Borhull","Dybde","Kote"], how="outer")
+
         all_frames.append(df_merged)
 
     # Concatenate all boreholes
     df_all = pd.concat(all_frames, ignore_index=True)
     df_all.sort_values(by=["Borhull","Dybde"], inplace=True)
+    end_span(merge_span, rows=len(df_all))
+    return df_all
+
+def export_combined_table(konus_series, enaks_series, wc_series, outfile_xlsx,
+                          gamma_series=None, atterberg_series=None, extra_sheets=None, df_all=None):
+    """
+    Export combined borehole data (see combined_frame) to Excel.
+
+    `extra_sheets` is an optional {sheet name: DataFrame} written after the data sheet,
+    e.g. design line statistics. Pass `df_all` to reuse an already merged frame.
+    """
+    if df_all is None:
+        df_all = combined_frame(konus_series, enaks_series, wc_series, gamma_series, atterberg_series)
 
     # Export
-    df_all.to_excel(outfile_xlsx, index=False)
-    print(f"✅ Excel table exported: {outfile_xlsx}")
+    with span("table.write", file=os.path.basename(outfile_xlsx)) as counts:
+        with pd.ExcelWriter(outfile_xlsx) as writer:
+            df_all.to_excel(writer, index=False)
+            for sheet, frame in (extra_sheets or {}).items():
+                frame.to_excel(writer, sheet_name=sheet, index=False)
+        counts["rows"] = len(df_all)
+    log_event(f"✅ Excel table exported: {outfile_xlsx}")
     return outfile_xlsx
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+# Formats that are already compressed internally – deflating them again only costs CPU
+STORED_EXTENSIONS = (".pdf", ".png", ".xlsx", ".xlsm")
+CHUNK_SIZE = 1024 * 1024
+
+def build_zip_bundle(paths, include_png=True, spool_max_bytes=8 * 1024 * 1024):
+    """
+    Stream report outputs into one ZIP archive.
+
+    Files are copied chunk by chunk into a SpooledTemporaryFile, so the archive stays
+    in memory only while it is small and rolls over to disk beyond `spool_max_bytes`.
+    PDF/PNG/XLSX entries are stored as-is, anything else is deflated.
+    Returns the spooled file positioned at the start. Building is bounded; serving is up to
+    the caller: server.py streams it, while Streamlit's download_button keeps the bytes in
+    memory.
+    """
+    buf = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
+    seen = set()
+
+    with zipfile.ZipFile(buf, "w", allowZip64=True) as zf:
+        for path in paths:
+            if not path or not os.path.exists(path):
+                continue
+            ext = os.path.splitext(path)[1].lower()
+            if ext == ".png" and not include_png:
+                continue
+            arcname = os.path.basename(path)
+            if arcname in seen:
+                continue
+            seen.add(arcname)
+
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(zinfo, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    buf.seek(0)
+    return buf
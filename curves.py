@@ -0,0 +1,193 @@
+"""
+Full enaks stress–strain curves (optional).
+
+The summary sheet only gives cu and ε_f per test; the raw load–deformation readings sit
+elsewhere in the lab workbook. Where they sit differs between lab templates, so the layout
+is described by a dict (CURVE_LAYOUT) instead of fixed ranges:
+
+  layout "long":  one reading per row, with the test identifier in `test_col`, strain (%)
+                  in `strain_col`, stress (kPa) in `stress_col` and optionally the sample
+                  depth in `depth_col`. Readings of one test do not need to be contiguous.
+  layout "pairs": one (strain, stress) column pair per test, starting at `first_col`; the
+                  cell in `header_row` above the strain column holds the test label (a
+                  number is taken as the depth). A pair ends at its first empty row.
+
+The sheet is streamed with openpyxl read_only/iter_rows, so memory does not grow with the
+size of the sheet, and the readings are kept as float32 arrays per borehole:
+  {BH: {"Z", "labels", "depths", "elevs", "offsets", "strain", "stress"}}
+with test i in strain[offsets[i]:offsets[i+1]].
+"""
+import os
+from array import array
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+from instrumentation import span, log_event
+
+CURVE_LAYOUT = {
+    "sheet": "Rådata",
+    "layout": "long",
+    "first_row": 2,
+    "test_col": "A",
+    "depth_col": None,
+    "strain_col": "B",
+    "stress_col": "C",
+    "first_col": "A",
+    "header_row": 1,
+}
+
+def _col(letter):
+    return column_index_from_string(letter) if letter else None
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _read_long(ws, layout):
+    cols = [c for c in (layout["test_col"], layout.get("depth_col"), layout["strain_col"], layout["stress_col"]) if c]
+    idx = {c: _col(c) for c in cols}
+    lo, hi = min(idx.values()), max(idx.values())
+    t_i, s_i, q_i = idx[layout["test_col"]] - lo, idx[layout["strain_col"]] - lo, idx[layout["stress_col"]] - lo
+    d_i = idx[layout["depth_col"]] - lo if layout.get("depth_col") else None
+
+    tests = {}  # label -> [depth, strain array, stress array]
+    for row in ws.iter_rows(min_row=layout["first_row"], min_col=lo, max_col=hi, values_only=True):
+        test = row[t_i]
+        strain, stress = _number(row[s_i]), _number(row[q_i])
+        if test is None or strain is None or stress is None:
+            continue
+        entry = tests.get(test)
+        if entry is None:
+            depth = _number(row[d_i]) if d_i is not None else None
+            entry = tests[test] = [depth, array("f"), array("f")]
+        entry[1].append(strain)
+        entry[2].append(stress)
+    return [(str(t), e[0], e[1], e[2]) for t, e in tests.items()]
+
+def _read_pairs(ws, layout):
+    first = _col(layout["first_col"])
+    labels = None
+    tests, open_pairs = [], []
+    for r, row in enumerate(ws.iter_rows(min_row=layout["header_row"], min_col=first, values_only=True),
+                            start=layout["header_row"]):
+        if labels is None:
+            labels = [row[i] for i in range(0, len(row), 2)]
+            tests = [[lab, array("f"), array("f")] for lab in labels]
+            open_pairs = [lab is not None for lab in labels]
+            continue
+        if r < layout["first_row"]:
+            continue
+        if not any(open_pairs):
+            break
+        for p in range(len(tests)):
+            if not open_pairs[p]:
+                continue
+            strain = _number(row[2 * p]) if 2 * p < len(row) else None
+            stress = _number(row[2 * p + 1]) if 2 * p + 1 < len(row) else None
+            if strain is None or stress is None:
+                open_pairs[p] = False
+                continue
+            tests[p][1].append(strain)
+            tests[p][2].append(stress)
+    return [(str(lab), _number(lab), s, q) for lab, s, q in tests if lab is not None and len(s)]
+
+def build_enaks_curves(folder, terrain_lookup, layout=None, boreholes=None):
+    """
+    Stream the stress–strain readings of every enaks workbook in `folder` (one borehole
+    per file, as build_enaks_series). Files without the curve sheet are skipped quietly.
+    """
+    layout = {**CURVE_LAYOUT, **(layout or {})}
+    read = _read_pairs if layout["layout"] == "pairs" else _read_long
+    excel_ext = (".xlsx", ".xlsm")
+    out = {}
+
+    for fname in sorted(os.listdir(folder)):
+        if not fname.endswith(excel_ext) or fname.startswith("~$"):
+            continue
+        bh = os.path.splitext(fname)[0]
+        if boreholes is not None and bh not in boreholes:
+            continue
+        Z = terrain_lookup.get(bh)
+        if Z is None:
+            log_event(f"⚠️ Terrain level not found for {bh}, skipping curves.", level="warning", file=fname)
+            continue
+
+        try:
+            with span("enaks_curves.open", file=fname):
+                wb = load_workbook(os.path.join(folder, fname), read_only=True, data_only=True)
+            try:
+                if layout["sheet"] not in wb.sheetnames:
+                    continue
+                with span("enaks_curves.parse", file=fname) as counts:
+                    tests = read(wb[layout["sheet"]], layout)
+                    counts["rows"] = sum(len(s) for _, _, s, _ in tests)
+            finally:
+                wb.close()
+        except Exception as e:
+            log_event(f"❌ Error reading curves in {fname}: {e}", level="error", file=fname)
+            continue
+
+        if not tests:
+            continue
+        lengths = np.array([len(s) for _, _, s, _ in tests], dtype=np.int64)
+        depths = np.array([np.nan if d is None else d for _, d, _, _ in tests], dtype=float)
+        out[bh] = {
+            "Z": Z,
+            "labels": [label for label, _, _, _ in tests],
+            "depths": depths,
+            "elevs": Z - depths,
+            "offsets": np.concatenate([[0], np.cumsum(lengths)]),
+            "strain": np.concatenate([np.frombuffer(s, dtype=np.float32) for _, _, s, _ in tests]),
+            "stress": np.concatenate([np.frombuffer(q, dtype=np.float32) for _, _, _, q in tests]),
+        }
+    return out
+
+def decimate_minmax(y, offsets, buckets=200):
+    """
+    Shape-preserving decimation of many curves at once.
+
+    Every curve (rows offsets[i]:offsets[i+1]) is cut into up to `buckets` equal runs of
+    samples, and per run the first, last, lowest and highest sample are kept, so peaks
+    (the failure point) and the start/end of each curve survive exactly. Curves shorter
+    than 4·buckets are kept whole. Returns the kept row numbers in their original order.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n = int(offsets[-1]) if len(offsets) else 0
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    curve = np.repeat(np.arange(len(lengths)), lengths)
+    pos = np.arange(n) - offsets[curve]
+    nb = np.minimum(lengths, buckets)[curve]
+    bucket = curve * buckets + (pos * nb) // np.maximum(lengths[curve], 1)
+
+    y = np.asarray(y, dtype=float)
+    by_value = np.lexsort((y, bucket))  # within each bucket: lowest ... highest
+    starts = np.flatnonzero(np.r_[True, bucket[by_value][1:] != bucket[by_value][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    last = np.r_[first[1:], n] - 1
+
+    keep = np.zeros(n, dtype=bool)
+    keep[by_value[starts]] = True
+    keep[by_value[ends]] = True
+    keep[first] = True
+    keep[last] = True
+    keep |= (lengths < 4 * buckets)[curve]
+    return np.flatnonzero(keep)
+
+def decimate_curves(curves, buckets=200):
+    """Copy of a curves dict with every borehole's curves decimated (offsets rebuilt)."""
+    out = {}
+    for bh, data in curves.items():
+        rows = decimate_minmax(data["stress"], data["offsets"], buckets)
+        curve = np.searchsorted(data["offsets"], rows, side="right") - 1
+        counts = np.bincount(curve, minlength=len(data["labels"]))
+        out[bh] = {**data, "strain": data["strain"][rows], "stress": data["stress"][rows],
+                   "offsets": np.concatenate([[0], np.cumsum(counts)])}
+    return out
@@ -0,0 +1,170 @@
+"""
+Depth/elevation index over loaded series for fast range queries.
+
+DepthIndex flattens one series dict (e.g. konus) once, and keeps
+  - the samples grouped per borehole, sorted by depth (one contiguous slice per borehole)
+    and the matching per-borehole elevation order,
+  - a global view sorted by depth and one sorted by elevation,
+so window, nearest-sample and per-layer queries are binary searches (np.searchsorted)
+instead of scans over every borehole's lists.
+
+Query results are dicts of NumPy arrays with the columns
+  Borhull | Dybde | Kote | <value keys>
+which can go straight to matplotlib or pd.DataFrame(...).
+"""
+import numpy as np
+import pandas as pd
+
+from derived import series_to_frame
+
+def value_keys(series):
+    """Value keys present in a series dict (everything except Z, depths, elevs and the sheet rows)."""
+    if hasattr(series, "keys_"):  # shared_data.SharedSeries
+        return [k for k in series.keys_ if k not in ("depths", "elevs", "rows")]
+    keys = []
+    for data in series.values():
+        for k in data:
+            if k not in ("Z", "depths", "elevs", "rows") and k not in keys:
+                keys.append(k)
+    return keys
+
+class DepthIndex:
+    def __init__(self, series, keys=None):
+        self.keys = list(keys) if keys is not None else value_keys(series)
+        df = series_to_frame(series, self.keys)
+        df = df[np.isfinite(df["Dybde"].to_numpy(dtype=float))]
+        df = df.sort_values(["Borhull", "Dybde"], kind="stable", ignore_index=True)
+
+        self.names = np.array(sorted(df["Borhull"].unique()), dtype=object)
+        self._code = {bh: i for i, bh in enumerate(self.names)}
+        self.bh = df["Borhull"].map(self._code).to_numpy(dtype=np.int64)
+        self.depth = df["Dybde"].to_numpy(dtype=float)
+        self.elev = df["Kote"].to_numpy(dtype=float)
+        self.values = {k: df[k].to_numpy(dtype=float) for k in self.keys}
+
+        # Per-borehole slices [start, stop) of the depth-sorted rows
+        self.stops = np.searchsorted(self.bh, np.arange(len(self.names)), side="right")
+        self.starts = np.concatenate([[0], self.stops[:-1]]).astype(np.int64)
+        # Per-borehole elevation order (row numbers), same slices
+        self.elev_rows = np.lexsort((self.elev, self.bh))
+
+        # Global sorted views
+        self.by_depth = np.argsort(self.depth, kind="stable")
+        self.by_elev = np.argsort(self.elev, kind="stable")
+        self.sorted_depth = self.depth[self.by_depth]
+        self.sorted_elev = self.elev[self.by_elev]
+
+    def __len__(self):
+        return len(self.depth)
+
+    def rows(self, idx):
+        """Result dict for the given row numbers."""
+        idx = np.asarray(idx, dtype=np.int64)
+        out = {"Borhull": self.names[self.bh[idx]], "Dybde": self.depth[idx], "Kote": self.elev[idx]}
+        for k, v in self.values.items():
+            out[k] = v[idx]
+        return out
+
+    def _borehole_rows(self, boreholes, axis, lo, hi):
+        """Rows of the given boreholes with lo <= axis <= hi, searched per borehole."""
+        parts = []
+        for bh in boreholes:
+            i = self._code.get(bh)
+            if i is None:
+                continue
+            a, b = self.starts[i], self.stops[i]
+            rows = np.arange(a, b) if axis == "Dybde" else self.elev_rows[a:b]
+            vals = self.depth[rows] if axis == "Dybde" else self.elev[rows]
+            parts.append(rows[np.searchsorted(vals, lo, "left"):np.searchsorted(vals, hi, "right")])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def window(self, lo, hi, axis="Kote", boreholes=None, key=None):
+        """
+        All samples with lo <= depth/elevation <= hi (either bound may be None), sorted along
+        the axis. `boreholes` limits the search to those boreholes, `key` drops samples
+        where that value is missing.
+        """
+        lo = -np.inf if lo is None else float(lo)
+        hi = np.inf if hi is None else float(hi)
+        if lo > hi:  # e.g. kote +2 to -8
+            lo, hi = hi, lo
+        if boreholes is not None:
+            idx = self._borehole_rows(boreholes, axis, lo, hi)
+            vals = self.depth[idx] if axis == "Dybde" else self.elev[idx]
+            idx = idx[np.argsort(vals, kind="stable")]
+        else:
+            order, sorted_vals = (self.by_depth, self.sorted_depth) if axis == "Dybde" \
+                else (self.by_elev, self.sorted_elev)
+            idx = order[np.searchsorted(sorted_vals, lo, "left"):np.searchsorted(sorted_vals, hi, "right")]
+        if key is not None:
+            idx = idx[np.isfinite(self.values[key][idx])]
+        return self.rows(idx)
+
+    def nearest(self, bh, depths, max_distance=None):
+        """
+        The sample nearest in depth in borehole `bh` for each of `depths` (scalar or array).
+        Adds a "Avstand" column; rows farther than `max_distance` get NaN values.
+        """
+        depths = np.atleast_1d(np.asarray(depths, dtype=float))
+        i = self._code.get(bh)
+        if i is None or self.stops[i] == self.starts[i]:
+            out = {"Borhull": np.full(len(depths), bh, dtype=object), "Dybde": np.full(len(depths), np.nan),
+                   "Kote": np.full(len(depths), np.nan)}
+            out.update({k: np.full(len(depths), np.nan) for k in self.keys})
+            out["Avstand"] = np.full(len(depths), np.nan)
+            return out
+        a, b = self.starts[i], self.stops[i]
+        d = self.depth[a:b]
+        pos = np.clip(np.searchsorted(d, depths), 1, max(len(d) - 1, 1))
+        left = np.clip(pos - 1, 0, len(d) - 1)
+        right = np.clip(pos, 0, len(d) - 1)
+        pick = np.where(np.abs(d[left] - depths) <= np.abs(d[right] - depths), left, right)
+        out = self.rows(a + pick)
+        dist = np.abs(d[pick] - depths)
+        out["Avstand"] = dist
+        if max_distance is not None:
+            far = dist > max_distance
+            for k in ["Dybde", "Kote", *self.keys]:
+                out[k] = np.where(far, np.nan, out[k])
+        return out
+
+    def layers(self, edges, key, axis="Dybde"):
+        """
+        Values of `key` per layer between consecutive `edges` (any order; each layer is
+        [edge_i, edge_i+1) along the axis). Returns (layer table, list of value arrays):
+          fra | til | n | min | median | middel | maks
+        """
+        edges = np.sort(np.asarray(edges, dtype=float))
+        order, sorted_vals = (self.by_depth, self.sorted_depth) if axis == "Dybde" \
+            else (self.by_elev, self.sorted_elev)
+        cuts = np.searchsorted(sorted_vals, edges, "left")
+        values = self.values[key]
+        groups = []
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            v = values[order[a:b]]
+            groups.append(v[np.isfinite(v)])
+        n = np.array([len(g) for g in groups])
+
+        def stat(fn):
+            return np.array([fn(g) if len(g) else np.nan for g in groups])
+
+        table = pd.DataFrame({
+            "fra": edges[:-1], "til": edges[1:], "n": n,
+            "min": stat(np.min), "median": stat(np.median), "middel": stat(np.mean), "maks": stat(np.max),
+        })
+        return table, groups
+
+def project_window(indexes, lo, hi, axis="Kote", boreholes=None):
+    """
+    One long table of every dataset's samples inside the window:
+      Datasett | Borhull | Dybde | Kote | <all value keys>
+    `indexes` is {dataset name: DepthIndex}.
+    """
+    frames = []
+    for name, index in indexes.items():
+        frame = pd.DataFrame(index.window(lo, hi, axis, boreholes))
+        frame.insert(0, "Datasett", name)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["Datasett", "Borhull", "Dybde", "Kote"])
+    return pd.concat(frames, ignore_index=True).sort_values([axis, "Borhull"], ignore_index=True)
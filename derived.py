@@ -0,0 +1,192 @@
+"""
+Derived soil quantities computed over all boreholes at once.
+
+The per-borehole series dicts from build_data are flattened into one long frame
+(one row per sample), the quantities are computed as whole-column operations, and the
+result can be turned back into series dicts so the exporters in plot_pdf can plot it.
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from shared_data import SharedSeries
+
+def series_to_frame(series, keys):
+    """
+    Flatten {BH: {"Z", "depths", "elevs", <keys>...}} into a long frame:
+      Borhull | Dybde | Kote | Z | <keys>
+    Missing values (None) become NaN.
+    """
+    if isinstance(series, SharedSeries):
+        return series.frame(keys)
+    bhs = list(series)
+    lengths = np.array([len(series[bh].get("depths", [])) for bh in bhs], dtype=int)
+
+    def column(key):
+        if not bhs:
+            return np.empty(0, dtype=float)
+        return np.concatenate([
+            np.asarray(series[bh][key], dtype=float) if key in series[bh]
+            else np.full(n, np.nan)
+            for bh, n in zip(bhs, lengths)
+        ])
+
+    frame = {
+        "Borhull": np.repeat(np.array(bhs, dtype=object), lengths),
+        "Dybde": column("depths"),
+        "Kote": column("elevs"),
+        "Z": np.repeat(np.array([series[bh]["Z"] for bh in bhs], dtype=float), lengths),
+    }
+    for key in keys:
+        frame[key] = column(key)
+    return pd.DataFrame(frame)
+
+def frame_to_series(df, keys):
+    """Inverse of series_to_frame(): {BH: {"Z", "depths", "elevs", <keys>...}}, sorted by depth."""
+    out = {}
+    df = df.sort_values(["Borhull", "Dybde"], kind="stable")
+    for bh, g in df.groupby("Borhull", sort=True):
+        data = {
+            "Z": float(g["Z"].iloc[0]),
+            "depths": g["Dybde"].tolist(),
+            "elevs": g["Kote"].tolist(),
+        }
+        for key in keys:
+            data[key] = g[key].tolist()
+        out[bh] = data
+    return out
+
+def soil_indices(atterberg_series, wc_series=None, depth_tol=0.25):
+    """
+    Plasticity index Ip = wL - wP and liquidity index IL = (w - wP) / Ip for every
+    Atterberg sample in the project.
+
+    w is the water content sample nearest in depth in the same borehole, if it lies
+    within `depth_tol` metres; otherwise IL is NaN.
+    Returns: Borhull | Dybde | Kote | Z | wp | wl | water content | plasticity index | liquidity index
+    """
+    with span("derived.soil_indices") as counts:
+        df = series_to_frame(atterberg_series, ["wp", "wl"])
+        df["plasticity index"] = df["wl"] - df["wp"]
+
+        if wc_series and not df.empty:
+            wc = series_to_frame(wc_series, ["water content"])
+            wc = wc.loc[wc["water content"].notna(), ["Borhull", "Dybde", "water content"]]
+            df = pd.merge_asof(
+                df.sort_values("Dybde", kind="stable"),
+                wc.sort_values("Dybde", kind="stable"),
+                on="Dybde", by="Borhull", direction="nearest", tolerance=depth_tol,
+            )
+        else:
+            df["water content"] = np.nan
+
+        ip = df["plasticity index"].to_numpy(dtype=float)
+        w_minus_wp = (df["water content"] - df["wp"]).to_numpy(dtype=float)
+        il = np.full(ip.shape, np.nan)
+        np.divide(w_minus_wp, ip, out=il, where=ip > 0)
+        df["liquidity index"] = il
+
+        counts["rows"] = len(df)
+    return df.sort_values(["Borhull", "Dybde"], ignore_index=True)
+
+def indices_to_series(indices):
+    """Per-borehole series from soil_indices(), ready for plot_pdf and export_combined_table."""
+    return frame_to_series(indices, ["wp", "wl", "water content", "plasticity index", "liquidity index"])
+
+# --- Effective vertical stress --------------------------------------------------------
+GAMMA_W = 9.81  # kN/m³
+
+def _per_borehole(df, value, default=0.0):
+    """Broadcast a scalar or {BH: value} dict onto the rows of `df`."""
+    if isinstance(value, dict):
+        return df["Borhull"].map(value).fillna(default).to_numpy(dtype=float)
+    return np.full(len(df), float(value))
+
+def stress_profile(gamma_series, gw_depth=0.0, gamma_w=GAMMA_W):
+    """
+    Vertical stress at every unit weight sample, all boreholes in one pass.
+
+    σv is the cumulative trapezoid of ɣ over depth, starting at terrain with the
+    shallowest measured ɣ held constant up to the surface. u = γw·max(0, z - gw_depth),
+    where `gw_depth` (m below terrain) is a float or a {BH: depth} dict.
+    Returns: Borhull | Dybde | Kote | Z | unit weight | sigma_v | u | sigma_v_eff
+    """
+    with span("derived.stress_profile") as counts:
+        df = series_to_frame(gamma_series, ["unit weight"])
+        df = df[df["unit weight"].notna() & df["Dybde"].notna()]
+        df = df.sort_values(["Borhull", "Dybde"], ignore_index=True, kind="stable")
+
+        grp = df.groupby("Borhull", sort=False)
+        prev_depth = grp["Dybde"].shift(1).fillna(0.0)
+        prev_gamma = grp["unit weight"].shift(1).fillna(df["unit weight"])
+        increment = 0.5 * (df["unit weight"] + prev_gamma) * (df["Dybde"] - prev_depth)
+        df["sigma_v"] = increment.groupby(df["Borhull"], sort=False).cumsum()
+
+        gw = _per_borehole(df, gw_depth)
+        df["u"] = gamma_w * np.clip(df["Dybde"].to_numpy() - gw, 0.0, None)
+        df["sigma_v_eff"] = df["sigma_v"] - df["u"]
+        counts["rows"] = len(df)
+    return df
+
+def stress_at(frame, profile, gw_depth=0.0, gamma_w=GAMMA_W, gamma_default=None):
+    """
+    Interpolate σv onto the depths in `frame` (long frame with Borhull | Dybde) and add
+    sigma_v, u and sigma_v_eff columns.
+
+    All boreholes go through a single np.interp call: depths are shifted by a per-borehole
+    offset so every borehole occupies its own stretch of one increasing axis. Below the
+    deepest ɣ sample σv continues with the last ɣ. Boreholes without ɣ use a constant
+    `gamma_default` when given, otherwise they get NaN.
+    """
+    out = frame.copy()
+    depth = out["Dybde"].to_numpy(dtype=float)
+    sigma_v = np.full(len(out), np.nan)
+
+    if not profile.empty and len(out):
+        codes = {bh: i for i, bh in enumerate(profile["Borhull"].unique())}
+        stride = 10.0 * (max(np.nanmax(np.abs(profile["Dybde"])), np.nanmax(np.abs(depth))) + 1.0)
+
+        p_code = profile["Borhull"].map(codes).to_numpy(dtype=float)
+        xp = p_code * stride + profile["Dybde"].to_numpy(dtype=float)
+        fp = profile["sigma_v"].to_numpy(dtype=float)
+
+        f_code = out["Borhull"].map(codes).to_numpy(dtype=float)
+        has_profile = np.isfinite(f_code)
+        x = np.where(has_profile, f_code, 0.0) * stride + depth
+        sigma_v = np.where(has_profile, np.interp(x, xp, fp), np.nan)
+
+        # Above the first sample: constant first ɣ from terrain. Below the last: constant last ɣ.
+        ends = profile.groupby("Borhull", sort=False).agg(
+            d_first=("Dybde", "first"), g_first=("unit weight", "first"),
+            d_last=("Dybde", "last"), g_last=("unit weight", "last"), s_last=("sigma_v", "last"))
+        ends = ends.reindex(out["Borhull"])
+        above = depth < ends["d_first"].to_numpy()
+        below = depth > ends["d_last"].to_numpy()
+        sigma_v = np.where(above, ends["g_first"].to_numpy() * depth, sigma_v)
+        sigma_v = np.where(below, ends["s_last"].to_numpy()
+                           + ends["g_last"].to_numpy() * (depth - ends["d_last"].to_numpy()), sigma_v)
+
+    if gamma_default is not None:
+        sigma_v = np.where(np.isnan(sigma_v), gamma_default * depth, sigma_v)
+
+    gw = _per_borehole(out, gw_depth)
+    out["sigma_v"] = sigma_v
+    out["u"] = gamma_w * np.clip(depth - gw, 0.0, None)
+    out["sigma_v_eff"] = out["sigma_v"] - out["u"]
+    return out
+
+def normalised_strength(series, key, profile, gw_depth=0.0, gamma_w=GAMMA_W, gamma_default=None):
+    """
+    cu/σ'v for every `key` sample in `series` (e.g. konus "undist", enaks "strength").
+
+    Returns per-borehole series with "sigma_v_eff" and "cu/sigma_v_eff" added.
+    """
+    with span("derived.normalised_strength", key=key) as counts:
+        df = series_to_frame(series, [key])
+        df = stress_at(df, profile, gw_depth, gamma_w, gamma_default)
+        s = df["sigma_v_eff"].to_numpy(dtype=float)
+        ratio = np.full(len(df), np.nan)
+        np.divide(df[key].to_numpy(dtype=float), s, out=ratio, where=s > 0)
+        df["cu/sigma_v_eff"] = ratio
+        counts["rows"] = len(df)
+    return frame_to_series(df, [key, "sigma_v_eff", "cu/sigma_v_eff"])
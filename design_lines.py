@@ -0,0 +1,209 @@
+"""
+Design line statistics over the whole project.
+
+Works on the combined frame from build_data.combined_frame() (Borhull | Dybde | Kote | ...).
+All boreholes are treated in one pass: depth-binned percentiles via a single group-by, and
+a robust (Huber) linear fit of the value against depth or elevation solved with
+vectorised weighted sums, optionally batched over groups (e.g. per borehole or area).
+"""
+import math
+from functools import lru_cache
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+HUBER_C = 1.345
+MAD_TO_SIGMA = 1.4826
+
+def _stack(df, value_cols, axis_col, by=None):
+    """Long frame axis | value (| group) from one or more value columns, NaNs dropped."""
+    if isinstance(value_cols, str):
+        value_cols = [value_cols]
+    keep = [axis_col] + ([by] if by else [])
+    parts = [df[keep + [col]].rename(columns={col: "value"}) for col in value_cols if col in df]
+    if not parts:
+        return pd.DataFrame(columns=keep + ["value"])
+    long = pd.concat(parts, ignore_index=True)
+    long = long[np.isfinite(long[axis_col].to_numpy(dtype=float)) & np.isfinite(long["value"].to_numpy(dtype=float))]
+    return long.reset_index(drop=True)
+
+def binned_percentiles(df, value_cols, axis_col="Dybde", bin_size=1.0, percentiles=(10, 50, 90)):
+    """
+    Percentiles of the value per `bin_size` interval of `axis_col`, all boreholes pooled.
+    Returns: bin_from | bin_to | bin_mid | n | p10 | p50 | p90 ...
+    """
+    long = _stack(df, value_cols, axis_col)
+    cols = ["bin_from", "bin_to", "bin_mid", "n"] + [f"p{p:g}" for p in percentiles]
+    if long.empty:
+        return pd.DataFrame(columns=cols)
+
+    b = np.floor(long[axis_col].to_numpy(dtype=float) / bin_size).astype(np.int64)
+    grouped = long["value"].groupby(b)
+    q = grouped.quantile([p / 100.0 for p in percentiles]).unstack()
+    q.columns = [f"p{p:g}" for p in percentiles]
+
+    out = q.reset_index(names="bin")
+    out.insert(1, "n", grouped.size().to_numpy())
+    out.insert(0, "bin_from", out["bin"] * bin_size)
+    out.insert(1, "bin_to", out["bin_from"] + bin_size)
+    out.insert(2, "bin_mid", out["bin_from"] + bin_size / 2)
+    return out[cols]
+
+def robust_fit(x, y, groups=None, c=HUBER_C, iterations=50, tol=1e-9):
+    """
+    Huber IRLS fit y = a + b·x, batched over `groups` (array of labels, None = one group).
+
+    Each iteration solves every group's weighted least squares at once from bincount sums.
+    Returns a frame indexed by group: n | intercept | slope | scale | x_mean | sxx
+    (scale = MAD-based robust residual standard deviation).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if groups is None:
+        labels, g = np.array(["alle"], dtype=object), np.zeros(len(x), dtype=np.int64)
+    else:
+        labels, g = np.unique(np.asarray(groups, dtype=object), return_inverse=True)
+    k = len(labels)
+
+    def wls(w):
+        sw = np.bincount(g, w, k)
+        sx = np.bincount(g, w * x, k)
+        sy = np.bincount(g, w * y, k)
+        sxx = np.bincount(g, w * x * x, k)
+        sxy = np.bincount(g, w * x * y, k)
+        det = sw * sxx - sx * sx
+        with np.errstate(invalid="ignore", divide="ignore"):
+            b = np.where(det > 0, (sw * sxy - sx * sy) / det, 0.0)
+            a = (sy - b * sx) / sw
+        return a, b
+
+    def robust_scale(r):
+        s = pd.Series(r)
+        med = s.groupby(g).transform("median").to_numpy()
+        mad = pd.Series(np.abs(r - med)).groupby(g).median().reindex(range(k)).to_numpy()
+        return MAD_TO_SIGMA * mad
+
+    a, b = wls(np.ones_like(x))
+    scale = np.zeros(k)
+    for _ in range(iterations):
+        r = y - (a[g] + b[g] * x)
+        scale = robust_scale(r)
+        s_obs = np.where(scale[g] > 0, scale[g], 1.0)
+        u = np.abs(r) / (c * s_obs)
+        w = np.where(u <= 1.0, 1.0, 1.0 / np.maximum(u, 1e-12))
+        a_new, b_new = wls(w)
+        done = np.allclose(a_new, a, atol=tol, equal_nan=True) and np.allclose(b_new, b, atol=tol, equal_nan=True)
+        a, b = a_new, b_new
+        if done:
+            break
+
+    n = np.bincount(g, minlength=k)
+    x_mean = np.bincount(g, x, k) / np.maximum(n, 1)
+    sxx = np.bincount(g, (x - x_mean[g]) ** 2, k)
+    return pd.DataFrame({"n": n, "intercept": a, "slope": b, "scale": scale,
+                         "x_mean": x_mean, "sxx": sxx}, index=pd.Index(labels, name="gruppe"))
+
+def _t_cdf(t, df):
+    """P(T <= t) for Student's t with an integer number of degrees of freedom (closed form)."""
+    theta = math.atan(abs(t) / math.sqrt(df))
+    c2 = math.cos(theta) ** 2
+    if df % 2:
+        term = total = 1.0
+        for j in range(1, (df - 1) // 2):
+            term *= 2 * j / (2 * j + 1) * c2
+            total += term
+        a = 2 / math.pi * (theta + (math.sin(theta) * math.cos(theta) * total if df > 1 else 0.0))
+    else:
+        term = total = 1.0
+        for j in range(1, df // 2):
+            term *= (2 * j - 1) / (2 * j) * c2
+            total += term
+        a = math.sin(theta) * total
+    return 0.5 + math.copysign(a / 2, t)
+
+@lru_cache(maxsize=256)
+def t_quantile(p, df):
+    """Student-t quantile for 0.5 <= p < 1 and integer `df` >= 1, by bisection on _t_cdf."""
+    if df > 1000:  # the series gets long; two expansion terms are exact to ~1e-7 here
+        z = NormalDist().inv_cdf(p)
+        return z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+    lo, hi = 0.0, 1.0
+    while _t_cdf(hi, df) < p:
+        lo, hi = hi, 2 * hi
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        lo, hi = (mid, hi) if _t_cdf(mid, df) < p else (lo, mid)
+    return 0.5 * (lo + hi)
+
+def characteristic_factor(fractile, n):
+    """k for the characteristic line: Student-t with n - 2 degrees of freedom, None below 3 samples."""
+    if fractile is None or n < 3:
+        return None
+    return t_quantile(1.0 - fractile, int(n) - 2)
+
+def line_values(fit, x, fractile=None, kind="mean"):
+    """
+    Evaluate one fitted line (row of robust_fit) at `x`.
+
+    With `fractile` (e.g. 0.05) the lower characteristic line is returned as well:
+    fit - k·s·sqrt(1/n + (x - x̄)²/Sxx), k the Student-t quantile with n - 2 degrees of
+    freedom (the line uses two), so few samples give a wider margin than the normal
+    quantile would; kind="prediction" adds the 1 for a single-sample fractile instead of
+    the fractile of the mean. Returns (mean, characteristic or None); None also when
+    there are fewer than 3 samples.
+    """
+    x = np.asarray(x, dtype=float)
+    mean = fit["intercept"] + fit["slope"] * x
+    n = int(fit["n"])
+    kf = characteristic_factor(fractile, n)
+    if kf is None:
+        return mean, None
+    lever = (x - fit["x_mean"]) ** 2 / fit["sxx"] if fit["sxx"] > 0 else 0.0
+    var = 1.0 / n + lever + (1.0 if kind == "prediction" else 0.0)
+    return mean, mean - kf * fit["scale"] * np.sqrt(var)
+
+def design_statistics(df, value_cols, bin_size=1.0, percentiles=(10, 50, 90),
+                      fractile=0.05, kind="mean", by=None):
+    """
+    Percentiles and robust fits of `value_cols` against both depth and elevation.
+
+    Returns {"Dybde": {"bins": frame, "fit": frame}, "Kote": {...}, "fractile", "kind"} –
+    the structure the plot_pdf exporters take as `design`.
+    """
+    out = {"fractile": fractile, "kind": kind}
+    with span("design.statistics") as counts:
+        for axis_col in ("Dybde", "Kote"):
+            long = _stack(df, value_cols, axis_col, by=by)
+            out[axis_col] = {
+                "bins": binned_percentiles(df, value_cols, axis_col, bin_size, percentiles),
+                "fit": robust_fit(long[axis_col], long["value"], long[by] if by else None),
+            }
+        counts["rows"] = len(long)
+    return out
+
+def design_sheet(stats_by_name):
+    """
+    Flatten {name: design_statistics(...)} into one table for an extra Excel sheet:
+      Parameter | Akse | Type | Gruppe | ... fit or bin columns
+    """
+    frames = []
+    for name, stats in stats_by_name.items():
+        for axis_col in ("Dybde", "Kote"):
+            fit = stats[axis_col]["fit"].reset_index()
+            label = "Robust lineær tilpasning"
+            if stats.get("fractile") is not None:
+                label += f" ({stats['fractile']:.0%}-fraktil, {stats['kind']}, Student-t med n−2 frihetsgrader)"
+                fit["k"] = [characteristic_factor(stats["fractile"], n) for n in fit["n"]]
+            fit.insert(0, "Type", label)
+            bins = stats[axis_col]["bins"].copy()
+            bins.insert(0, "Type", "Persentiler")
+            for frame in (fit, bins):
+                frame.insert(0, "Akse", axis_col)
+                frame.insert(0, "Parameter", name)
+                frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["Parameter", "Akse", "Type"])
+    return pd.concat(frames, ignore_index=True)
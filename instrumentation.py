@@ -0,0 +1,141 @@
+"""
+Timing spans, diagnostics and optional cProfile capture for the report pipeline.
+
+Spans and events go to the active Recorder. `recording()` installs a fresh recorder for
+the current context (one per Streamlit session / script run); outside of it spans and
+events go to a process-wide default recorder that keeps only the last DEFAULT_KEEP of
+each, so long-running servers and workers do not grow. Events are also written to the
+"grunn" logger.
+"""
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+DEFAULT_KEEP = 1000
+LEVELS = {"info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+logger = logging.getLogger("grunn")
+
+class Recorder:
+    """Collects finished spans and diagnostic events, the last `maxlen` of each if given."""
+
+    def __init__(self, maxlen=None):
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=maxlen)
+        self.events = deque(maxlen=maxlen)
+
+    def add_span(self, rec):
+        with self._lock:
+            self.spans.append(rec)
+
+    def add_event(self, rec):
+        with self._lock:
+            self.events.append(rec)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.events.clear()
+
+    def report(self):
+        """
+        Aggregate spans per name:
+          Steg | Antall | Total (s) | Snitt (s) | Maks (s) | Rader | Punkter
+        """
+        cols = ["Steg", "Antall", "Total (s)", "Snitt (s)", "Maks (s)", "Rader", "Punkter"]
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return pd.DataFrame(columns=cols)
+
+        df = pd.DataFrame({
+            "Steg": [s["name"] for s in spans],
+            "dur": [s["duration_s"] for s in spans],
+            "rows": [s["counts"].get("rows", 0) for s in spans],
+            "points": [s["counts"].get("points", 0) for s in spans],
+        })
+        out = df.groupby("Steg", sort=False).agg(
+            **{"Antall": ("dur", "size"), "Total (s)": ("dur", "sum"), "Snitt (s)": ("dur", "mean"),
+               "Maks (s)": ("dur", "max"), "Rader": ("rows", "sum"), "Punkter": ("points", "sum")}
+        ).reset_index()
+        return out.sort_values("Total (s)", ascending=False, ignore_index=True)[cols]
+
+    def events_frame(self):
+        with self._lock:
+            events = list(self.events)
+        return pd.DataFrame(events, columns=["level", "message", "file"])
+
+_default = Recorder(maxlen=DEFAULT_KEEP)
+_active = contextvars.ContextVar("grunn_recorder", default=None)
+
+def current_recorder():
+    return _active.get() or _default
+
+@contextmanager
+def recording(recorder=None):
+    """Route spans/events of the current context into `recorder` (a new one by default)."""
+    rec = recorder if recorder is not None else Recorder()
+    token = _active.set(rec)
+    try:
+        yield rec
+    finally:
+        _active.reset(token)
+
+def start_span(name, **attrs):
+    """Open a span; finish it with `end_span`. Use `span()` where a with-block fits."""
+    return {
+        "name": name,
+        "attrs": attrs,
+        "counts": {},
+        "thread": threading.current_thread().name,
+        "start": time.perf_counter(),
+        "duration_s": None,
+    }
+
+def end_span(rec, **counts):
+    rec["duration_s"] = time.perf_counter() - rec["start"]
+    rec["counts"].update(counts)
+    current_recorder().add_span(rec)
+    return rec
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block. Yields the span's `counts` dict, e.g. counts["rows"] = len(depths)."""
+    rec = start_span(name, **attrs)
+    try:
+        yield rec["counts"]
+    finally:
+        end_span(rec)
+
+def log_event(message, level="info", file=None):
+    """Log a diagnostic line and keep it for the report."""
+    logger.log(LEVELS.get(level, logging.INFO), message)
+    current_recorder().add_event({"level": level, "message": message, "file": file})
+
+@contextmanager
+def profile(enabled=True, sort="cumulative", limit=40):
+    """
+    Optional cProfile capture. Yields a dict that gets 'text' (pstats listing) and
+    'profile' (the cProfile.Profile) when the block exits.
+    """
+    result = {}
+    if not enabled:
+        yield result
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield result
+    finally:
+        prof.disable()
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats(sort).print_stats(limit)
+        result["profile"] = prof
+        result["text"] = buf.getvalue()
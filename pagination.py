@@ -0,0 +1,127 @@
+"""
+Paginated figures for large sites: one page per group of boreholes.
+
+Boreholes are split into groups (by count, by name prefix or by a supplied area), each
+group is rendered with the normal export_*_pdf function on its own page – own colours,
+own legend, figure number with a page suffix (C2.1, C2.2, ...) – and the pages are
+rendered concurrently and assembled into one PDF.
+
+Assembling needs `pypdf`; without it the pages are rendered one after the other straight
+into a multi-page PdfPages file instead.
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.backends.backend_pdf import PdfPages
+
+from instrumentation import span, log_event
+from spatial import select_series
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # optional
+    PdfWriter = None
+
+def group_by_count(bhs, per_page=12):
+    """[(label, [bh, ...]), ...] with at most `per_page` boreholes per group, in name order."""
+    bhs = sorted(bhs)
+    per_page = max(1, int(per_page))
+    return [(str(i // per_page + 1), bhs[i:i + per_page]) for i in range(0, len(bhs), per_page)]
+
+def group_by_prefix(bhs, sep="-", parts=1):
+    """Group on the first `parts` pieces of the name split on `sep` (e.g. '06-376' -> '06')."""
+    groups = {}
+    for bh in sorted(bhs):
+        key = sep.join(str(bh).split(sep)[:parts])
+        groups.setdefault(key, []).append(bh)
+    return sorted(groups.items())
+
+def group_by_area(bhs, area_of, default="Øvrige"):
+    """Group on a supplied {BH: area} mapping; boreholes without an area go to `default`."""
+    groups = {}
+    for bh in sorted(bhs):
+        area = area_of.get(bh)
+        key = default if area is None or area != area else str(area)  # area != area: NaN
+        groups.setdefault(key, []).append(bh)
+    return sorted(groups.items())
+
+def split_groups(groups, per_page):
+    """Further split groups that are longer than `per_page` (keeps legends readable)."""
+    out = []
+    for label, bhs in groups:
+        if len(bhs) <= per_page:
+            out.append((label, bhs))
+            continue
+        for i, (_, chunk) in enumerate(group_by_count(bhs, per_page), start=1):
+            out.append((f"{label}-{i}", chunk))
+    return out
+
+def _render_page(export_fn, series_args, outfile_pdf, outfile_png, kwargs):
+    export_fn(*series_args, outfile_pdf=outfile_pdf, outfile_png=outfile_png, **kwargs)
+    return outfile_pdf, outfile_png
+
+def export_paginated(export_fn, series_args, outfile_pdf, groups, outfile_png=None,
+                     title_info=None, max_workers=None, submit=None, **kwargs):
+    """
+    Render `export_fn(*series_args, ...)` once per group and assemble one PDF.
+
+    `series_args` are the positional series dicts of the exporter, e.g. (konus, enaks).
+    Groups without data in any series are skipped. PNG previews (if `outfile_png`) are
+    written per page as <stem>_<n>.png. `submit(fn, *args)` (returning an object with
+    .result()) puts the pages on an existing pool, e.g. workers.shared_pool(), instead of
+    starting a ProcessPoolExecutor for this figure.
+    Returns [(group label, page figure number, png path or None), ...].
+    """
+    title_info = dict(title_info or {})
+    base_nr = title_info.get("figur_nr", "")
+
+    pages = []
+    for label, bhs in groups:
+        subset = tuple(select_series(series, bhs) for series in series_args)
+        if any(subset):
+            pages.append((label, subset))
+    if not pages:
+        pages = [("", series_args)]
+
+    stem_png = os.path.splitext(outfile_png)[0] if outfile_png else None
+    jobs, result = [], []
+    for n, (label, subset) in enumerate(pages, start=1):
+        page_nr = f"{base_nr}.{n}" if base_nr and len(pages) > 1 else base_nr
+        page_png = f"{stem_png}_{n}.png" if stem_png else None
+        page_kwargs = {**kwargs, "title_info": {**title_info, "figur_nr": page_nr}}
+        jobs.append((subset, page_png, page_kwargs))
+        result.append((label, page_nr, page_png))
+
+    with span("paginate", figure=base_nr) as counts:
+        counts["points"] = len(jobs)
+        if PdfWriter is None or len(jobs) == 1:
+            with PdfPages(outfile_pdf) as pdf:
+                for subset, page_png, page_kwargs in jobs:
+                    _render_page(export_fn, subset, pdf, page_png, page_kwargs)
+            return result
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page_pdfs = [os.path.join(tmpdir, f"page_{n:04d}.pdf") for n in range(len(jobs))]
+            args = [(_render_page, export_fn, subset, page_pdf, page_png, page_kwargs)
+                    for (subset, page_png, page_kwargs), page_pdf in zip(jobs, page_pdfs)]
+            if submit is not None:
+                for f in [submit(*a) for a in args]:
+                    f.result()
+            else:
+                workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    for f in [pool.submit(*a) for a in args]:
+                        f.result()
+
+            writer = PdfWriter()
+            for page_pdf in page_pdfs:
+                writer.append(page_pdf)
+            tmp_out = os.path.join(tmpdir, "assembled.pdf")
+            with open(tmp_out, "wb") as f:
+                writer.write(f)
+            shutil.move(tmp_out, outfile_pdf)
+
+    log_event(f"Saved: {outfile_pdf} ({len(jobs)} sider)")
+    return result
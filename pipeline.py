@@ -0,0 +1,422 @@
+"""
+The report pipeline without Streamlit: ingest → table → figures.
+
+`run_report()` does what the "Generate Reports" button in app.py does, for callers that are
+not a browser session (server.py, scripts). Parsing and rendering go through `submit`,
+normally workers.shared_pool() bound to a user; without it everything runs in-process.
+"""
+import contextlib
+import os
+import tempfile
+
+import pandas as pd
+
+from build_data import (build_konus_series, build_enaks_series, build_wc_series,
+    build_gamma_series, build_atterberg_series, combined_frame, export_combined_table)
+from plot_pdf import (export_sensitivity_pdf, export_curfc_pdf, export_cu_enaks_konus_pdf,
+    export_enaks_deformation_pdf, export_wc_pdf, export_gamma_pdf, export_plasticity_pdf,
+    export_liquidity_pdf, export_normalised_strength_pdf, export_section_pdf)
+from derived import soil_indices, indices_to_series, stress_profile, normalised_strength
+from design_lines import design_statistics, design_sheet
+from render_cache import file_digest, render_key, shared_cache
+from pagination import export_paginated
+from stages import Stage, run_stages
+from shared_data import SHM_DIR, share, ingest_shared
+from terrain import load_terrain
+from sections import SECTION_VARIABLES, resample
+from validation import validate
+import archive
+from instrumentation import log_event
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geovitalogo.png")
+SHEET_NAME = "Sheet 001"
+DEFAULT_RANGES = {
+    "konus_undist": 'L6:L30',
+    "konus_remould": 'M6:M30',
+    "depth": 'F6:F30',
+    "enaks_strength": 'G6:G30',
+    "enaks_deform": 'H6:H30',
+    "wc_depth": 'G12:G41',
+    "wc": 'H12:H41',
+    "gamma_depth": 'E16:E45',
+    "gamma": 'I16:I45',
+    "atterberg_depth": 'F5:F24',
+    "wp": 'N5:N24',
+    "wl": 'O5:O24'
+}
+
+BUILDERS = {
+    "konus": build_konus_series,
+    "enaks": build_enaks_series,
+    "wc": build_wc_series,
+    "gamma": build_gamma_series,
+    "atterberg": build_atterberg_series,
+}
+
+DESIGN_COLUMNS = {
+    "Sensitivitet": "Sensitivitet",
+    "Omrørt skjærstyrke": "Omrørt skjærstyrke",
+    "Direkte skjærstyrke (konus + enaks)": ["Uforstyrret skjærstyrke konus", "Skjærstyrke enaks"],
+    "Bruddtøyning": "Bruddtøyning",
+}
+
+# key, default figure number, file stem, exporter, series, series that must be non-empty, design entry
+# (a figure is also left out when all of its series are empty)
+FIGURES = [
+    ("sensitivity", "C2", "C2_sensitivity", export_sensitivity_pdf, ("konus",), ("konus",), "Sensitivitet"),
+    ("curfc", "C3", "C3_curfc", export_curfc_pdf, ("konus",), ("konus",), "Omrørt skjærstyrke"),
+    ("cu", "C4", "C4_cu_enaks_konus", export_cu_enaks_konus_pdf, ("konus", "enaks"), ("konus",),
+     "Direkte skjærstyrke (konus + enaks)"),
+    ("ef", "C5", "C5_enaks_deformation", export_enaks_deformation_pdf, ("enaks",), ("enaks",), "Bruddtøyning"),
+    ("wc", "C1", "C1_water content", export_wc_pdf, ("wc",), ("wc",), None),
+    ("gamma", "C6", "C6_unit weight", export_gamma_pdf, ("gamma",), ("gamma",), None),
+    ("ip", "C7", "C7_plasticity index", export_plasticity_pdf, ("atterberg",), ("atterberg",), None),
+    ("il", "C8", "C8_liquidity index", export_liquidity_pdf, ("atterberg",), ("atterberg",), None),
+    ("norm", "C9", "C9_normalised strength", export_normalised_strength_pdf, ("konus_norm", "enaks_norm"),
+     (), None),
+]
+
+DEFAULT_OPTIONS = {
+    "sheet_name": SHEET_NAME,
+    "ranges": DEFAULT_RANGES,
+    "design": False,
+    "design_fractile": 0.05,
+    "design_kind": "mean",
+    "design_bin": 1.0,
+    "gw_depth": 0.0,
+    "png": True,
+    "cache": True,
+    "dem_path": None,  # terrain model (ASCII grid / GeoTIFF) on this machine, see terrain.py
+    "dem_overwrite": False,
+    "sections": [],  # C11: borehole lines, each a list of names in order along the section
+    "section_variables": ["Uforstyrret skjærstyrke konus"],  # SECTION_VARIABLES labels
+    "section_axis": "Kote",
+    "section_step": 0.25,
+    "section_max_gap": 3.0,
+    "archive_project": None,  # project name: also append the combined data to the Parquet archive
+    "archive_dir": None,  # default archive.ARCHIVE_DIR
+}
+
+class _Done:
+    """Result holder with the same .result() as a workers.Job, for in-process runs."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self, timeout=None):
+        return self.value
+
+def run_inline(fn, *args, **kwargs):
+    return _Done(fn(*args, **kwargs))
+
+def folder_digest(folder):
+    """(file name, SHA-256) of every file in `folder` – what a parse stage's key depends on."""
+    return [(f, file_digest(os.path.join(folder, f))) for f in sorted(os.listdir(folder))]
+
+def shared_valid(series):
+    """A memoised SharedSeries is only reusable while its shared-memory file exists."""
+    path = getattr(series, "path", None)
+    return path is None or os.path.exists(path)
+
+def release_shared(series):
+    if hasattr(series, "unlink"):
+        series.unlink()
+
+def outputs_valid(paths):
+    return all(os.path.exists(p) for p in paths)
+
+def render_figure(export_fn, series_args, outfile_pdf, outfile_png=None, groups=None, cache=True,
+                  submit=run_inline, **kwargs):
+    """
+    Render one figure through the render cache, one page per borehole group when `groups`
+    has more than one. Returns [pdf, png previews...].
+    """
+    if groups is not None and len(groups) <= 1:
+        groups = None
+    key = None
+    if cache:
+        key = render_key(export_fn, series_args, groups, outfile_png=outfile_png, **kwargs)
+        hit = shared_cache().get(key, outfile_pdf, outfile_png)
+        if hit:
+            return hit
+    if groups is None:
+        submit(export_fn, *series_args, outfile_pdf=outfile_pdf, outfile_png=outfile_png, **kwargs).result()
+        outputs = [outfile_pdf] + ([outfile_png] if outfile_png else [])
+    else:
+        pages = export_paginated(export_fn, series_args, outfile_pdf, groups,
+                                 outfile_png=outfile_png, submit=submit, **kwargs)
+        outputs = [outfile_pdf] + [png for _, _, png in pages if png]
+    if key:
+        shared_cache().put(key, outputs, outfile_png)
+    return outputs
+
+def parse_stage(name, folder, sheet_name, ranges, terrain_lookup, shm_dir, submit=run_inline, boreholes=None):
+    """Stage parsing one upload folder on the worker pool into shared memory."""
+    return Stage(f"parse:{name}",
+                 lambda: submit(ingest_shared, BUILDERS[name], shm_dir, folder, sheet_name, ranges,
+                                terrain_lookup, boreholes).result(),
+                 params=(folder_digest(folder), sheet_name, ranges, terrain_lookup, boreholes),
+                 valid=shared_valid, release=release_shared)
+
+def parse_upload(name, path, sheet_name, ranges, terrain_lookup, shm_dir, submit=run_inline):
+    """
+    Start parsing one uploaded workbook, kept alone in its own folder, into shared memory.
+    Returns the job; its result is the file's SharedSeries.
+    """
+    return submit(ingest_shared, BUILDERS[name], shm_dir, os.path.dirname(path), sheet_name, ranges, terrain_lookup)
+
+def merge_series(parts, shm_dir, boreholes=None):
+    """One SharedSeries from per-file series (a later file wins for a repeated borehole)."""
+    merged = {bh: part[bh] for part in parts for bh in part if boreholes is None or bh in boreholes}
+    return share(merged, shm_dir)
+
+def derived_stages(parsed, shm_dir, gw_depth=0.0):
+    """
+    Stages computing Ip/IL ("atterberg") and cu/σ'v ("normalised") from the parse stages
+    present in `parsed` (names of the uploaded datasets).
+    """
+    stages = []
+    if "atterberg" in parsed:
+        inputs = ["parse:atterberg"] + (["parse:wc"] if "wc" in parsed else [])
+        stages.append(Stage("atterberg",
+                            lambda atterberg, wc=None: share(indices_to_series(soil_indices(atterberg, wc or {})), shm_dir),
+                            inputs, valid=shared_valid, release=release_shared))
+    strengths = [n for n in ("konus", "enaks") if n in parsed]
+    if "gamma" in parsed and strengths:
+        def normalised(gamma, *series):
+            given = dict(zip(strengths, series))
+            stresses = stress_profile(gamma, gw_depth=gw_depth)
+            return tuple(share(normalised_strength(given.get(name, {}), key, stresses, gw_depth=gw_depth), shm_dir)
+                         for name, key in (("konus", "undist"), ("enaks", "strength")))
+        stages.append(Stage("normalised", normalised, ["parse:gamma"] + [f"parse:{n}" for n in strengths],
+                            params=gw_depth, valid=lambda r: all(shared_valid(s) for s in r),
+                            release=lambda r: [release_shared(s) for s in r]))
+    return stages
+
+SERIES_STAGES = {name: f"parse:{name}" for name in BUILDERS}
+SERIES_STAGES["atterberg"] = "atterberg"
+
+def series_from(results, name):
+    """A named series ("konus", ..., "konus_norm", "enaks_norm") out of stage results."""
+    if name in ("konus_norm", "enaks_norm"):
+        norm = results.get("normalised")
+        return norm[name == "enaks_norm"] if norm else {}
+    return results.get(SERIES_STAGES[name], {})
+
+def series_inputs(names, stage_names):
+    """Stages a figure of `names` reads from, among those that exist."""
+    wanted = ["normalised" if n in ("konus_norm", "enaks_norm") else SERIES_STAGES[n] for n in names]
+    return [s for s in dict.fromkeys(wanted) if s in stage_names]
+
+def figure_stage(name, export_fn, names, inputs, outfile_pdf, outfile_png=None, required=(), extra=(),
+                 prepare=None, groups=None, cache=True, submit=run_inline, key_extra=None, **kwargs):
+    """
+    Stage rendering `export_fn` over the series `names`, read from the stages `inputs`
+    (+ `extra` stages whose results go to `prepare(series_args, *extra results)`, which
+    returns (series_args, extra kwargs) – e.g. design lines or a borehole selection).
+    `groups` may be a function of the series args. Whatever `prepare` and `groups` depend
+    on besides the stage inputs goes in `key_extra`.
+    Results in [] (no figure) when one of the `required` series came out empty.
+    """
+    def render(*results):
+        by_stage = dict(zip(inputs, results))
+        series_args = tuple(series_from(by_stage, n) for n in names)
+        if not all(series_from(by_stage, n) for n in required) or not any(series_args):
+            return []
+        more = {}
+        if prepare:
+            series_args, more = prepare(series_args, *results[len(inputs):])
+        return render_figure(export_fn, series_args, outfile_pdf, outfile_png,
+                             groups=groups(series_args) if callable(groups) else groups,
+                             cache=cache, submit=submit, **kwargs, **more)
+    params = (render_key(export_fn, (), None if callable(groups) else groups, outfile_png=outfile_png, **kwargs),
+              outfile_pdf, outfile_png, key_extra)
+    return Stage(name, render, list(inputs) + list(extra), params=params, valid=outputs_valid)
+
+def frame_stage(series_stages, design=None):
+    """
+    Stage combining every series into the table frame, plus design line statistics per
+    DESIGN_COLUMNS when `design` is {"bin_size", "fractile", "kind"}.
+    """
+    def frame(*results):
+        by_stage = dict(zip(series_stages, results))
+        konus, enaks, wc, gamma, atterberg = (series_from(by_stage, n)
+                                              for n in ("konus", "enaks", "wc", "gamma", "atterberg"))
+        df_all = combined_frame(konus, enaks, wc, gamma_series=gamma, atterberg_series=atterberg)
+        stats = {}
+        if design:
+            stats = {name: design_statistics(df_all, cols, **design) for name, cols in DESIGN_COLUMNS.items()}
+        return {"konus": konus, "enaks": enaks, "wc": wc, "df_all": df_all, "design": stats}
+    return Stage("frame", frame, series_stages, params=design)
+
+def table_stage(table_path):
+    """Stage exporting the Excel table (and the design line sheet) from the frame."""
+    def table(f):
+        return export_combined_table(f["konus"], f["enaks"], f["wc"], table_path,
+                                     extra_sheets={"Designlinjer": design_sheet(f["design"])} if f["design"] else None,
+                                     df_all=f["df_all"])
+    return Stage("table", table, ["frame"], params=table_path, valid=lambda p: outputs_valid([p]))
+
+def validation_stage(series_stages, files=None):
+    """
+    Stage checking the parsed datasets (validation.validate) before anything is rendered.
+    `files` is {dataset: {BH: file name}} for the file column of the anomaly table.
+    """
+    parsed = [s for s in series_stages if s.startswith("parse:")]
+    return Stage("validate",
+                 lambda *results: validate({s.split(":", 1)[1]: r for s, r in zip(parsed, results)}, files),
+                 parsed, params=files)
+
+def folder_files(folders):
+    """{dataset: {BH: file name}} for upload folders (a borehole's name is its file's stem)."""
+    return {name: {os.path.splitext(f)[0]: f for f in sorted(os.listdir(folder))}
+            for name, folder in folders.items() if folder and os.path.isdir(folder)}
+
+def archive_stage(project, archive_dir=None):
+    """Stage appending the combined frame to the Parquet archive (archive.py) as `project`."""
+    def store(f):
+        if archive.pa is None:
+            log_event("⚠️ pyarrow is not installed, the project is not archived", level="warning")
+            return {}
+        return archive.archive_project(project, f["df_all"], archive_dir or archive.ARCHIVE_DIR)
+    return Stage("archive", store, ["frame"], params=(project, archive_dir))
+
+def figure_stages(series_stages, workdir, title_info, figure_numbers=None, design=False, png=True,
+                  select=None, **kwargs):
+    """
+    One figure_stage per FIGURES entry the parsed data allows. With `design`, C2–C5 also
+    read the frame stage for their design lines; `select(series)` narrows each series
+    before rendering. Other kwargs go to figure_stage (logo_path, cache, submit, groups, ...).
+    """
+    figure_numbers = figure_numbers or {}
+    present = set(series_stages)
+
+    def prepare_for(design_name):
+        def prepare(series_args, *frame_result):
+            if select is not None:
+                series_args = tuple(select(s) for s in series_args)
+            more = {"design": frame_result[0]["design"].get(design_name)} if frame_result else {}
+            return series_args, more
+        return prepare
+
+    stages = []
+    for key, default_nr, stem, export_fn, names, required, design_name in FIGURES:
+        inputs = series_inputs(names, present)
+        if not inputs or not all(SERIES_STAGES[n] in present for n in required):
+            continue
+        use_design = bool(design_name and design)
+        stages.append(figure_stage(
+            key, export_fn, names, inputs, os.path.join(workdir, f"{stem}.pdf"),
+            os.path.join(workdir, f"{stem}.png") if png else None, required=required,
+            extra=["frame"] if use_design else (), prepare=prepare_for(design_name),
+            title_info={**title_info, "figur_nr": figure_numbers.get(key, default_nr)}, **kwargs))
+    return stages
+
+def section_stages(series_stages, workdir, title_info, lines, variables, coords=None, stations=None,
+                   axis="Kote", step=0.25, max_gap=3.0, png=True, cache=True, submit=run_inline, **kwargs):
+    """
+    C11 cross-sections: one "grid:<dataset>" stage per dataset resampling all its boreholes
+    (sections.resample), and one "section:<n>:<key>" figure stage per line and variable
+    cutting from that grid. Figure numbers are title_info["figur_nr"] (default C11),
+    with ".n" added when there is more than one section.
+    """
+    present = set(series_stages)
+    by_dataset = {}
+    for label in variables:
+        dataset, key, _ = SECTION_VARIABLES[label]
+        if SERIES_STAGES[dataset] in present:
+            by_dataset.setdefault(dataset, []).append(key)
+
+    stages = []
+    for dataset, keys in by_dataset.items():
+        stages.append(Stage(f"grid:{dataset}",
+                            lambda series, keys=keys: resample(series, keys, axis, step, max_gap),
+                            [SERIES_STAGES[dataset]], params=(keys, axis, step, max_gap)))
+
+    figures = [(n, line, label) for n, line in enumerate(lines, 1) for label in variables
+               if SECTION_VARIABLES[label][0] in by_dataset]
+    base_nr = title_info.get("figur_nr", "C11")
+    for i, (n, line, label) in enumerate(figures, 1):
+        dataset, key, axis_label = SECTION_VARIABLES[label]
+        stem = f"C11_section_{n}_{key.replace(' ', '_').replace('/', '_')}"
+        outfile_pdf = os.path.join(workdir, f"{stem}.pdf")
+        outfile_png = os.path.join(workdir, f"{stem}.png") if png else None
+        figure_title = {**title_info, "figur_nr": base_nr if len(figures) == 1 else f"{base_nr}.{i}"}
+        line_coords = {bh: coords[bh] for bh in line if coords and bh in coords}
+        line_stations = {bh: stations[bh] for bh in line if stations and bh in stations}
+
+        def render(grid, line=line, key=key, axis_label=axis_label, outfile_pdf=outfile_pdf,
+                   outfile_png=outfile_png, figure_title=figure_title, line_coords=line_coords,
+                   line_stations=line_stations):
+            section = grid.section(line, key, coords=line_coords, stations=line_stations)
+            if not section["boreholes"]:
+                return []
+            return render_figure(export_section_pdf, (section,), outfile_pdf, outfile_png, cache=cache,
+                                 submit=submit, title_info=figure_title, label=axis_label, **kwargs)
+        stages.append(Stage(f"section:{n}:{key}", render, [f"grid:{dataset}"],
+                            params=(list(line), outfile_pdf, outfile_png, figure_title, line_coords,
+                                    line_stations, cache, kwargs),
+                            valid=outputs_valid))
+    return stages
+
+def run_report(workdir, terrain_path, folders, title_info=None, figure_numbers=None, options=None,
+               submit=run_inline, logo_path=LOGO_PATH, memo=None, shm_dir=None):
+    """
+    Build the Excel table and every figure the data allows, into `workdir`.
+
+    `folders` is {"konus" | "enaks" | "wc" | "gamma" | "atterberg": folder of workbooks}.
+    `figure_numbers` overrides FIGURES' default numbers by key (e.g. {"wc": "C1"}), and
+    "section" the C11 number of the cross-sections in options["sections"].
+    The steps run as a stage graph (stages.py); with the same `memo`, `workdir` and
+    `shm_dir` as an earlier call, unchanged stages are skipped.
+    Returns {"table": xlsx path, "figures": {key: [pdf, png...]}, "files": [all outputs],
+    "anomalies": validation.validate() findings, "stages": the StageRun}.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    title_info = dict(title_info or {})
+    figure_numbers = figure_numbers or {}
+
+    terrain_df = load_terrain(terrain_path, options["dem_path"], options["dem_overwrite"])
+    terrain_lookup = dict(zip(terrain_df["BH"], terrain_df["Z"]))
+    if terrain_df.empty:
+        log_event("⚠️ Terrain table is empty", level="warning")
+
+    with contextlib.ExitStack() as stack:
+        if shm_dir is None:
+            shm_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=SHM_DIR))
+        parsed = [name for name, folder in folders.items() if name in BUILDERS and folder]
+        stages = [parse_stage(name, folders[name], options["sheet_name"], options["ranges"], terrain_lookup,
+                              shm_dir, submit) for name in parsed]
+        stages += derived_stages(parsed, shm_dir, options["gw_depth"])
+        series_stages = [s.name for s in stages]
+
+        design = None
+        if options["design"]:
+            design = {"bin_size": options["design_bin"], "fractile": options["design_fractile"],
+                      "kind": options["design_kind"]}
+        stages.append(validation_stage(series_stages, folder_files({n: folders[n] for n in parsed})))
+        stages.append(frame_stage(series_stages, design))
+        stages.append(table_stage(os.path.join(workdir, "grunnundersokelser.xlsx")))
+        if options["archive_project"]:
+            stages.append(archive_stage(options["archive_project"], options["archive_dir"]))
+        stages += figure_stages(series_stages, workdir, title_info, figure_numbers, design=bool(design),
+                                png=options["png"], cache=options["cache"], submit=submit, logo_path=logo_path)
+        if options["sections"]:
+            coords = ({bh: (x, y) for bh, x, y in zip(terrain_df["BH"], terrain_df["X"], terrain_df["Y"])
+                       if pd.notna(x) and pd.notna(y)} if {"X", "Y"} <= set(terrain_df.columns) else None)
+            stages += section_stages(series_stages, workdir,
+                                     {**title_info, "figur_nr": figure_numbers.get("section", "C11")},
+                                     options["sections"], options["section_variables"], coords=coords,
+                                     axis=options["section_axis"], step=options["section_step"],
+                                     max_gap=options["section_max_gap"], png=options["png"],
+                                     cache=options["cache"], submit=submit, logo_path=logo_path)
+
+        run = run_stages(stages, memo=memo)
+        run.raise_first_error()
+
+    figures = {key: run.results[key] for key, *_ in FIGURES if run.get(key)}
+    figures.update({name: run.results[name] for name in run.results if name.startswith("section:") and run.results[name]})
+    table = run.results["table"]
+    files = [table] + [p for outputs in figures.values() for p in outputs]
+    return {"table": table, "figures": figures, "files": files, "anomalies": run.results["validate"],
+            "stages": run}
@@ -3,12 +3,29 @@ import tempfile
 import streamlit as st
 import pandas as pd
 from openpyxl import load_workbook
-import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
-from matplotlib import patches
+from matplotlib import patches, colormaps
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection
 import itertools
+from functools import lru_cache
+import numpy as np
 from build_data import build_enaks_series, build_konus_series
 from matplotlib.ticker import MultipleLocator
+from instrumentation import span, start_span, end_span, log_event
+from design_lines import line_values
+
+@lru_cache(maxsize=8)
+def _read_logo(path, mtime_ns):
+    img = mpimg.imread(path)
+    img.flags.writeable = False
+    return img
+
+def load_logo(path):
+    """Decoded logo image, read once per process (and again if the file changes)."""
+    return _read_logo(os.path.abspath(path), os.stat(path).st_mtime_ns)
 
 def draw_page_frame_and_title_block(fig, inner_left, inner_bottom, inner_w, inner_h,
                                     rapport_nr, figur_nr, tegn, kontr, godkj, dato,
@@ -40,17 +57,17 @@ def draw_page_frame_and_title_block(fig, inner_left, inner_bottom, inner_w, inne
     r4_top = r3_top - row_h  # top of logo area
 
     for y in [r2_top, r3_top, r4_top]:
-        fig.lines.append(plt.Line2D([tb_left, tb_left + tb_width], [y, y],
+        fig.lines.append(Line2D([tb_left, tb_left + tb_width], [y, y],
                                     transform=fig.transFigure, linewidth=1.0, color="black"))
 
     v_r1 = tb_left + tb_width * (2/3)
-    fig.lines.append(plt.Line2D([v_r1, v_r1], [r2_top, r1_top],
+    fig.lines.append(Line2D([v_r1, v_r1], [r2_top, r1_top],
                                 transform=fig.transFigure, linewidth=1.0, color="black"))
     v2_1 = tb_left + tb_width/3
     v2_2 = tb_left + 2*tb_width/3
-    fig.lines.append(plt.Line2D([v2_1, v2_1], [r3_top, r2_top],
+    fig.lines.append(Line2D([v2_1, v2_1], [r3_top, r2_top],
                                 transform=fig.transFigure, linewidth=1.0, color="black"))
-    fig.lines.append(plt.Line2D([v2_2, v2_2], [r3_top, r2_top],
+    fig.lines.append(Line2D([v2_2, v2_2], [r3_top, r2_top],
                                 transform=fig.transFigure, linewidth=1.0, color="black"))
 
     def ftxt(x, y, s, ha='left', va='center', size=8, weight=None):
@@ -76,7 +93,7 @@ def draw_page_frame_and_title_block(fig, inner_left, inner_bottom, inner_w, inne
     area_h = area_top - area_bottom
     if logo_path and os.path.exists(logo_path):
         try:
-            img = mpimg.imread(logo_path)
+            img = load_logo(logo_path)
             h, w = img.shape[0], img.shape[1]
             aspect = w / h
             width_eff  = min(area_w, area_h * aspect)
@@ -96,6 +113,132 @@ def add_box_spines(ax):
     for s in ax.spines.values():
         s.set_visible(True); s.set_linewidth(1.0); s.set_edgecolor("black")
 
+def draw_design_lines(left_ax, right_ax, design, group="alle"):
+    """
+    Overlay design statistics (design_lines.design_statistics) on the depth and elevation
+    axes: percentile band + median per bin, robust fit and the characteristic line.
+    """
+    if not design:
+        return
+    handles = []
+    for ax, axis_col in ((left_ax, "Dybde"), (right_ax, "Kote")):
+        stats = design.get(axis_col)
+        if not stats:
+            continue
+        ylim = ax.get_ylim()
+        bins = stats["bins"]
+        pcols = [c for c in bins.columns if c.startswith("p")]
+        if len(bins) and pcols:
+            band = ax.fill_betweenx(bins["bin_mid"], bins[pcols[0]], bins[pcols[-1]],
+                             step="mid", color="grey", alpha=0.15, linewidth=0,
+                             label=f"{pcols[0]}–{pcols[-1]}")
+            median, = ax.plot(bins[pcols[len(pcols)//2]], bins["bin_mid"], drawstyle="steps-mid",
+                              color="grey", linewidth=1.0, linestyle=":", label=pcols[len(pcols)//2])
+            if ax is left_ax:
+                handles += [band, median]
+
+        fit = stats["fit"]
+        if group in fit.index and fit.loc[group, "n"] >= 2:
+            y = np.linspace(min(ylim), max(ylim), 60)
+            mean, char = line_values(fit.loc[group], y, design.get("fractile"), design.get("kind", "mean"))
+            if ax.get_xscale() == "log":  # C2/C3: leave out the part of a line at or below zero
+                mean = np.where(mean > 0, mean, np.nan)
+                char = np.where(char > 0, char, np.nan) if char is not None else None
+            lines = ax.plot(mean, y, color="black", linewidth=1.2, linestyle="--", label="Robust tilpasning")
+            if char is not None:
+                lines += ax.plot(char, y, color="black", linewidth=1.6,
+                                 label=f"Karakteristisk ({design['fractile']:.0%}-fraktil)")
+            if ax is left_ax:
+                handles += lines
+        ax.set_ylim(ylim)
+    if handles:
+        left_ax.legend(handles=handles, loc="lower right", fontsize=7, frameon=True)
+
+def has_values(data, key):
+    """True if data[key] is a non-empty list or array."""
+    values = data.get(key)
+    return values is not None and len(values) > 0
+
+def borehole_colors(*series):
+    """tab20 colour per borehole over the union of `series`, in name order."""
+    all_bhs = sorted(set().union(*(s.keys() for s in series)))
+    colors = colormaps["tab20"].resampled(max(1, len(all_bhs))).colors
+    return {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
+
+def profile_points(series, key, colors, marker="o", markers=None):
+    """
+    One pass over `series` for a depth + elevation profile of `key`: flat arrays of value,
+    depth and elevation (Z - depth) for all boreholes, an RGBA colour and a marker per
+    point (`markers` {bh: marker} overrides `marker`), and one legend entry
+    (label, colour, marker) per borehole with values.
+    """
+    xs, depths, counts, Z, bh_colors, bh_markers, entries = [], [], [], [], [], [], []
+    for bh, data in series.items():
+        if not has_values(data, key):
+            continue
+        x = np.asarray(data[key], dtype=float)
+        xs.append(x)
+        depths.append(np.asarray(data["depths"], dtype=float))
+        counts.append(len(x))
+        Z.append(data["Z"])
+        m = markers.get(bh, marker) if markers else marker
+        bh_colors.append(colors[bh])
+        bh_markers.append(m)
+        entries.append((f"{bh}, {data['Z']:.1f} m", colors[bh], m))
+    depth = np.concatenate(depths) if depths else np.empty(0)
+    return {
+        "x": np.concatenate(xs) if xs else np.empty(0),
+        "depth": depth,
+        "elev": np.repeat(np.asarray(Z, dtype=float), counts) - depth,
+        "color": np.repeat(to_rgba_array(bh_colors), counts, axis=0) if bh_colors else np.empty((0, 4)),
+        "marker": np.repeat(np.asarray(bh_markers, dtype=object), counts),
+        "legend": entries,
+    }
+
+def draw_profile(left_ax, right_ax, points, s=25):
+    """Scatter `points` (profile_points) on the depth and elevation axes, one collection per marker."""
+    for m in dict.fromkeys(points["marker"]):
+        idx = points["marker"] == m
+        left_ax.scatter(points["x"][idx], points["depth"][idx], c=points["color"][idx], marker=m, s=s)
+        right_ax.scatter(points["x"][idx], points["elev"][idx], c=points["color"][idx], marker=m, s=s)
+    return len(points["x"])
+
+def legend_handles(*points, marker="s", markersize=8):
+    """
+    Borehole legend (handles, labels) from profile_points, first entry per label.
+    marker=None keeps each borehole's own marker.
+    """
+    handles, labels = [], []
+    seen = set()
+    for p in points:
+        for lab, color, m in p["legend"]:
+            if lab in seen:
+                continue
+            seen.add(lab)
+            handles.append(Line2D([], [], linestyle='', marker=marker or m,
+                                  markersize=markersize, color=color))
+            labels.append(lab)
+    return handles, labels
+
+def save_figure(fig, draw_span, outfile_pdf, outfile_png=None, points=0):
+    """
+    Close the draw span, save PDF (+ optional 300 dpi PNG) with one span per format, then
+    clear the figure. Figures are plain matplotlib.figure.Figure objects (no pyplot), so
+    nothing global holds on to them and exporters can run on several threads at once.
+    """
+    end_span(draw_span, points=points)
+    name = draw_span["name"].rsplit(".", 1)[0]
+    try:
+        # outfile_pdf may also be an open PdfPages (multi-page output, see pagination.py)
+        pdf_name = os.path.basename(outfile_pdf) if isinstance(outfile_pdf, (str, os.PathLike)) else "PdfPages"
+        with span(f"{name}.savefig.pdf", file=pdf_name):
+            fig.savefig(outfile_pdf, format="pdf")
+        if outfile_png:
+            with span(f"{name}.savefig.png", file=os.path.basename(outfile_png)):
+                fig.savefig(outfile_png, dpi=300)
+    finally:
+        fig.clear()
+
 def export_curfc_pdf(
     konus_series,
     outfile_pdf,
@@ -103,10 +246,10 @@ def export_curfc_pdf(
     logo_path=None,
     title_info=None,
     depth_ylim=(0, 35),
-    margin_cm=1.0
+    margin_cm=1.0,
+    design=None
 ):
     """Export C3 – Remoulded shear strength (cur vs depth & elevation)."""
-    import matplotlib.pyplot as plt
     from plot_pdf import draw_page_frame_and_title_block, add_box_spines
 
     if title_info is None:
@@ -117,9 +260,10 @@ def export_curfc_pdf(
     kontr      = title_info.get("kontr", "")
     godkj      = title_info.get("godkj", "")
     figur_nr   = title_info.get("figur_nr", "C3")
+    draw_span = start_span("export_curfc_pdf.draw", figure=figur_nr)
 
     fig_w, fig_h = 11.69, 8.27
-    fig = plt.figure(figsize=(fig_w, fig_h))
+    fig = Figure(figsize=(fig_w, fig_h))
 
     margin_in = margin_cm / 2.54
     inner_left   = margin_in / fig_w
@@ -141,10 +285,8 @@ def export_curfc_pdf(
     left_ax = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
     right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
 
-    # Colour map per borehole (union of those series)
-    all_bhs = sorted(set(konus_series.keys()))
-    colors = plt.get_cmap("tab20").resampled(max(1, len(all_bhs))).colors
-    bh_color = {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
+    # One pass over the boreholes: points, colours and legend for both axes
+    points = profile_points(konus_series, "remould", borehole_colors(konus_series), marker='o')
 
     def setup_xaxis(ax):
         ax.set_xscale('log')
@@ -154,15 +296,9 @@ def export_curfc_pdf(
         ax.xaxis.set_label_position('top')
         ax.grid(True, which='both', linewidth=0.5, alpha=0.4)
 
-    # --- LEFT: depth vs remoulded strength ---
-    for bh, data in konus_series.items():
-        if not data.get("remould"):
-            continue
-        color = bh_color.get(bh, "tab:red")
-        left_ax.scatter(data["remould"], data["depths"],
-                        color=color, marker='o', s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
+    n_points = draw_profile(left_ax, right_ax, points)
 
+    # --- LEFT: depth vs remoulded strength ---
     left_ax.set_xlabel("Omrørt skjærstyrke (kPa)")
     left_ax.set_ylabel("Dybde (m)")
     left_ax.set_ylim(*depth_ylim)
@@ -170,32 +306,15 @@ def export_curfc_pdf(
     setup_xaxis(left_ax); add_box_spines(left_ax)
 
     # --- RIGHT: elevation vs remoulded strength ---
-    for bh, data in konus_series.items():
-        if not data.get("remould"):
-            continue
-        color = bh_color.get(bh, "tab:red")
-        right_ax.scatter(data["remould"], data["elevs"],
-                         color=color, marker='o', s=25)
-
     right_ax.set_xlabel("Omrørt skjærstyrke (kPa)")
     right_ax.set_ylabel("kote (m)")
     right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
     setup_xaxis(right_ax); add_box_spines(right_ax)
 
+    draw_design_lines(left_ax, right_ax, design)
+
     # --- Legend ---
-    handles, labels = [], []
-    seen = set()
-    for bh, data in konus_series.items():
-        if not data.get("remould"):
-            continue
-        lab = f"{bh}, {data['Z']:.1f} m"
-        if lab in seen:
-            continue
-        seen.add(lab)
-        color = bh_color.get(bh, "tab:red")
-        handles.append(plt.Line2D([], [], linestyle='', marker='s',
-                                  markersize=8, color=color))
-        labels.append(lab)
+    handles, labels = legend_handles(points)
 
     legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
     legend_h = tb_height * 0.60
@@ -211,10 +330,8 @@ def export_curfc_pdf(
                    columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
                     title = "Borhull")
 
-    fig.savefig(outfile_pdf, format="pdf")
-    if outfile_png:
-        fig.savefig(outfile_png, dpi=300)
-    plt.close(fig)
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
 
 
 def export_cu_enaks_konus_pdf(
@@ -225,10 +342,10 @@ def export_cu_enaks_konus_pdf(
     logo_path=None,
     title_info=None,
     depth_ylim=(0, 35),
-    margin_cm=1.0
+    margin_cm=1.0,
+    design=None
 ):
     """Export C4 – Konus (undisturbed cu) + Enaks strength."""
-    import matplotlib.pyplot as plt
     from plot_pdf import draw_page_frame_and_title_block, add_box_spines
 
     if title_info is None:
@@ -239,9 +356,10 @@ def export_cu_enaks_konus_pdf(
     kontr      = title_info.get("kontr", "JOG")
     godkj      = title_info.get("godkj", "AGR")
     figur_nr   = title_info.get("figur_nr", "C4")
+    draw_span = start_span("export_cu_enaks_konus_pdf.draw", figure=figur_nr)
 
     fig_w, fig_h = 11.69, 8.27
-    fig = plt.figure(figsize=(fig_w, fig_h))
+    fig = Figure(figsize=(fig_w, fig_h))
 
     margin_in = margin_cm / 2.54
     inner_left   = margin_in / fig_w
@@ -263,32 +381,20 @@ def export_cu_enaks_konus_pdf(
     left_ax = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
     right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
 
-    # Colour map per borehole (union of those series)
-    all_bhs = sorted(set(konus_series.keys()) | set(enaks_series.keys()))
-    colors = plt.get_cmap("tab20").resampled(max(1, len(all_bhs))).colors
-    bh_color = {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
+    # One pass per series: points, colours and legend for both axes
+    bh_color = borehole_colors(konus_series, enaks_series)
+    konus_points = profile_points(konus_series, "undist", bh_color, marker='^')
+    enaks_points = profile_points(enaks_series, "strength", bh_color, marker='o')
 
     def setup_xaxis(ax):
         ax.xaxis.set_ticks_position('top')
         ax.xaxis.set_label_position('top')
         ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
 
-    # --- LEFT: depth vs strength ---
-    for bh, data in konus_series.items():
-        if not data.get("undist"):
-            continue
-        color = bh_color.get(bh, "tab:blue")
-        left_ax.scatter(data["undist"], data["depths"],
-                        color=color, marker='^', s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
-
-    for bh, data in enaks_series.items():
-        if not data.get("strength"):
-            continue
-        color = bh_color.get(bh, "tab:blue")
-        left_ax.scatter(data["strength"], data["depths"],
-                        color=color, marker='o', s=25)
+    n_points = (draw_profile(left_ax, right_ax, konus_points)
+                + draw_profile(left_ax, right_ax, enaks_points))
 
+    # --- LEFT: depth vs strength ---
     left_ax.set_xlabel("Direkte skjærstyrke (kPa)")
     left_ax.set_ylabel("Dybde (m)")
     left_ax.set_ylim(*depth_ylim)
@@ -296,52 +402,15 @@ def export_cu_enaks_konus_pdf(
     setup_xaxis(left_ax); add_box_spines(left_ax)
 
     # --- RIGHT: elevation vs strength ---
-    for bh, data in konus_series.items():
-        if not data.get("undist"):
-            continue
-        color = bh_color.get(bh, "tab:blue")
-        right_ax.scatter(data["undist"], data["elevs"],
-                         color=color, marker='^', s=25)
-
-    for bh, data in enaks_series.items():
-        if not data.get("strength"):
-            continue
-        color = bh_color.get(bh, "tab:blue")
-        right_ax.scatter(data["strength"], data["elevs"],
-                         color=color, marker='o', s=25)
-
     right_ax.set_xlabel("Direkte skjærstyrke (kPa)")
     right_ax.set_ylabel("kote (m)")
     right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
     setup_xaxis(right_ax); add_box_spines(right_ax)
 
-    # --- Legend ---
-    handles, labels = [], []
-    seen = set()
+    draw_design_lines(left_ax, right_ax, design)
 
-    # Konus BHs
-    for bh, data in konus_series.items():
-        if not data.get("undist"):
-            continue
-        lab = f"{bh}, {data['Z']:.1f} m"
-        if lab in seen: continue
-        seen.add(lab)
-        color = bh_color.get(bh, "tab:blue")
-        handles.append(plt.Line2D([], [], linestyle='', marker='s',
-                                  markersize=8, color=color))
-        labels.append(lab)
-
-    # Enaks BHs
-    for bh, data in enaks_series.items():
-        if not data.get("strength"):
-            continue
-        lab = f"{bh}, {data['Z']:.1f} m"
-        if lab in seen: continue
-        seen.add(lab)
-        color = bh_color.get(bh, "tab:blue")
-        handles.append(plt.Line2D([], [], linestyle='', marker='s',
-                                  markersize=8, color=color))
-        labels.append(lab)
+    # --- Legend (konus boreholes first, then enaks) ---
+    handles, labels = legend_handles(konus_points, enaks_points)
 
     legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
     legend_h = tb_height * 0.60
@@ -360,8 +429,8 @@ def export_cu_enaks_konus_pdf(
 
       # --- Add marker explanation (● Enaks, ▲ Konus) ---
         key_handles = [
-            plt.Line2D([], [], linestyle='', marker='o', markersize=6, color='black', label='Enaks'),
-            plt.Line2D([], [], linestyle='', marker='^', markersize=6, color='black', label='Konus'),
+            Line2D([], [], linestyle='', marker='o', markersize=6, color='black', label='Enaks'),
+            Line2D([], [], linestyle='', marker='^', markersize=6, color='black', label='Konus'),
         ]
   
         fig.legend(key_handles, [h.get_label() for h in key_handles],
@@ -371,10 +440,8 @@ def export_cu_enaks_konus_pdf(
                  ncol=2, frameon=False, fontsize=8,
                  columnspacing=0.8, handletextpad=0.4)
 
-    fig.savefig(outfile_pdf, format="pdf")
-    if outfile_png:
-        fig.savefig(outfile_png, dpi=300)
-    plt.close(fig)
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
 
 
 def export_sensitivity_pdf(
@@ -385,10 +452,10 @@ def export_sensitivity_pdf(
     title_info=None,
     depth_ylim=(0, 35),
     margin_cm=1.0,
-    x_label="Sensitivitet (S = cu/cur)"
+    x_label="Sensitivitet (S = cu/cur)",
+    design=None
 ):
     """Export C2 – Sensitivity (S = cu/cur vs depth & elevation)."""
-    import matplotlib.pyplot as plt
     from plot_pdf import draw_page_frame_and_title_block, add_box_spines
 
     if title_info is None:
@@ -399,9 +466,10 @@ def export_sensitivity_pdf(
     kontr      = title_info.get("kontr", "JOG")
     godkj      = title_info.get("godkj", "AGR")
     figur_nr   = title_info.get("figur_nr", "C2")
+    draw_span = start_span("export_sensitivity_pdf.draw", figure=figur_nr)
 
     fig_w, fig_h = 11.69, 8.27
-    fig = plt.figure(figsize=(fig_w, fig_h))
+    fig = Figure(figsize=(fig_w, fig_h))
 
     margin_in = margin_cm / 2.54
     inner_left   = margin_in / fig_w
@@ -423,10 +491,8 @@ def export_sensitivity_pdf(
     left_ax  = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
     right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
 
-    # Colour map per borehole (union of those series)
-    all_bhs = sorted(set(konus_series.keys()))
-    colors = plt.get_cmap("tab20").resampled(max(1, len(all_bhs))).colors
-    bh_color = {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
+    # One pass over the boreholes: points, colours and legend for both axes
+    points = profile_points(konus_series, "sensitivity", borehole_colors(konus_series), marker='D')
 
     def setup_xaxis(ax):
         ticks = [1, 2, 5, 10, 20, 50, 100, 200, 500]
@@ -438,22 +504,8 @@ def export_sensitivity_pdf(
         ax.xaxis.set_label_position('top')
         ax.grid(True, which='both', linewidth=0.5, alpha=0.4)
 
-    # --- Plot data ---
-    for bh, data in konus_series.items():
-        sens = [s for s in data.get("sensitivity", []) if s is not None]
-        deps = data.get("depths", [])
-        elevs = data.get("elevs", [])
-        if not sens or not deps:
-            continue
-
-        color = bh_color.get(bh, "tab:blue")
-
-        # LEFT: sensitivity vs depth
-        left_ax.scatter(sens, deps, color=color, marker='D', s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
-
-        # RIGHT: sensitivity vs elevation
-        right_ax.scatter(sens, elevs, color=color, marker='D', s=25)
+    # --- Plot data: sensitivity vs depth (left) and elevation (right) ---
+    n_points = draw_profile(left_ax, right_ax, points)
 
     left_ax.set_xlabel(x_label)
     left_ax.set_ylabel("Dybde (m)")
@@ -466,15 +518,10 @@ def export_sensitivity_pdf(
     right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
     setup_xaxis(right_ax); add_box_spines(right_ax)
 
+    draw_design_lines(left_ax, right_ax, design)
+
     # --- Legend ---
-    handles, labels = [], []
-    for bh, data in konus_series.items():
-        if not data.get("sensitivity"):
-            continue
-        color = bh_color.get(bh, "tab:blue")
-        handles.append(plt.Line2D([], [], linestyle='', marker='s',
-                                  markersize=8, color=color))
-        labels.append(f"{bh}, {data['Z']:.1f} m")
+    handles, labels = legend_handles(points)
 
     legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
     legend_h = tb_height * 0.60
@@ -488,11 +535,9 @@ def export_sensitivity_pdf(
                    columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
                    title = "Borhull")
 
-    fig.savefig(outfile_pdf, format="pdf")
-    if outfile_png: 
-        fig.savefig(outfile_png, dpi=300)
-    plt.close(fig)
-    print(f"Saved: {outfile_pdf}" + (f"\nPreview: {outfile_png}" if outfile_png else "")) 
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
+    log_event(f"Saved: {outfile_pdf}" + (f"\nPreview: {outfile_png}" if outfile_png else ""))
 
 def export_enaks_deformation_pdf(
     enaks_series,
@@ -502,10 +547,10 @@ def export_enaks_deformation_pdf(
     title_info=None,
     depth_ylim=(0, 35),
     margin_cm=1.0,
-    xlim=None  # e.g., (0, 20) if you want fixed range
+    xlim=None,  # e.g., (0, 20) if you want fixed range
+    design=None
 ):
     """Export C5 – Enaks deformation at break ε_f (%)."""
-    import matplotlib.pyplot as plt
     from plot_pdf import draw_page_frame_and_title_block, add_box_spines
 
     if title_info is None:
@@ -516,9 +561,10 @@ def export_enaks_deformation_pdf(
     kontr      = title_info.get("kontr", "JOG")
     godkj      = title_info.get("godkj", "AGR")
     figur_nr   = title_info.get("figur_nr", "C5")
+    draw_span = start_span("export_enaks_deformation_pdf.draw", figure=figur_nr)
 
     fig_w, fig_h = 11.69, 8.27
-    fig = plt.figure(figsize=(fig_w, fig_h))
+    fig = Figure(figsize=(fig_w, fig_h))
 
     margin_in = margin_cm / 2.54
     inner_left   = margin_in / fig_w
@@ -540,10 +586,8 @@ def export_enaks_deformation_pdf(
     left_ax  = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
     right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
 
-    # Colour map per borehole (union of those series)
-    all_bhs = sorted(set(enaks_series.keys()))
-    colors = plt.get_cmap("tab20").resampled(max(1, len(all_bhs))).colors
-    bh_color = {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
+    # One pass over the boreholes: points, colours and legend for both axes
+    points = profile_points(enaks_series, "deform", borehole_colors(enaks_series), marker='o')
 
     def setup_xaxis(ax):
         if xlim is not None:
@@ -552,20 +596,8 @@ def export_enaks_deformation_pdf(
         ax.xaxis.set_label_position('top')
         ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
 
-    # --- Plot data ---
-    for bh, data in enaks_series.items():
-        if not data.get("deform"):
-            continue
-        color = bh_color.get(bh, "tab:orange")
-
-        # LEFT: ε_f vs depth
-        left_ax.scatter(data["deform"], data["depths"],
-                        color=color, marker="o", s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
-
-        # RIGHT: ε_f vs elevation
-        right_ax.scatter(data["deform"], data["elevs"],
-                         color=color, marker="o", s=25)
+    # --- Plot data: ε_f vs depth (left) and elevation (right) ---
+    n_points = draw_profile(left_ax, right_ax, points)
 
     left_ax.set_xlabel(r"Deformasjon ved brudd $\epsilon_f$ (%)")
     left_ax.set_ylabel("Dybde (m)")
@@ -578,15 +610,10 @@ def export_enaks_deformation_pdf(
     right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
     setup_xaxis(right_ax); add_box_spines(right_ax)
 
+    draw_design_lines(left_ax, right_ax, design)
+
     # --- Legend ---
-    handles, labels = [], []
-    for bh, data in enaks_series.items():
-        if not data.get("deform"):
-            continue
-        color = bh_color.get(bh, "tab:orange")
-        handles.append(plt.Line2D([], [], linestyle='', marker='s',
-                                  markersize=8, color=color))
-        labels.append(f"{bh}, {data['Z']:.1f} m")
+    handles, labels = legend_handles(points)
 
     legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
     legend_h = tb_height * 0.60
@@ -600,11 +627,9 @@ def export_enaks_deformation_pdf(
                    columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
                    title = "Borhull")
 
-    fig.savefig(outfile_pdf, format="pdf")
-    if outfile_png: 
-        fig.savefig(outfile_png, dpi=300)
-    plt.close(fig)
-    print(f"Saved: {outfile_pdf}" + (f"\nPreview: {outfile_png}" if outfile_png else "")) 
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
+    log_event(f"Saved: {outfile_pdf}" + (f"\nPreview: {outfile_png}" if outfile_png else ""))
 
 """plot for vanninnhold"""
 def export_wc_pdf(
@@ -618,7 +643,6 @@ def export_wc_pdf(
     margin_cm=1.0
 ):
     """Export water content vs depth & elevation)."""
-    import matplotlib.pyplot as plt
     from plot_pdf import draw_page_frame_and_title_block, add_box_spines
 
     if title_info is None:
@@ -629,9 +653,10 @@ def export_wc_pdf(
     kontr      = title_info.get("kontr", "")
     godkj      = title_info.get("godkj", "")
     figur_nr   = title_info.get("figur_nr", "C1")
+    draw_span = start_span("export_wc_pdf.draw", figure=figur_nr)
 
     fig_w, fig_h = 11.69, 8.27
-    fig = plt.figure(figsize=(fig_w, fig_h))
+    fig = Figure(figsize=(fig_w, fig_h))
 
     margin_in = margin_cm / 2.54
     inner_left   = margin_in / fig_w
@@ -653,11 +678,6 @@ def export_wc_pdf(
     left_ax = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
     right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
 
-    # Colour map per borehole (union of those series)
-    all_bhs = sorted(set(wc_series.keys()))
-    colors = plt.get_cmap("tab20").resampled(max(1, len(all_bhs))).colors
-    bh_color = {bh: colors[i % len(colors)] for i, bh in enumerate(all_bhs)}
-
     # X formatting (linear, 0–100, major ticks = 10)
     def setup_xaxis(ax):
         ax.set_xlim(*xlim)
@@ -666,45 +686,31 @@ def export_wc_pdf(
         ax.xaxis.set_label_position('top')
         ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
     
-    # Colour+marker cycling (like your script)
+    # Colour+marker cycling (like your script), one combination per borehole with values
     colors  = ['b','g','r','c','m','y','k']
     markers = ['o','x','s','^']
     color_marker_combos = itertools.cycle([(c,m) for c in colors for m in markers])
-  
-    # --- LEFT: depth vs water content ---
-    for bh, data in wc_series.items():
-        if not data.get("water content"):
-            continue
-        c, m = next(color_marker_combos)
-        left_ax.scatter(data["water content"], data["depths"],
-                        color=c, marker=m, s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
+    bh_style = {bh: next(color_marker_combos) for bh, data in wc_series.items()
+                if has_values(data, "water content")}
+    points = profile_points(wc_series, "water content", {bh: c for bh, (c, _) in bh_style.items()},
+                            markers={bh: m for bh, (_, m) in bh_style.items()})
+    n_points = draw_profile(left_ax, right_ax, points)
 
+    # --- LEFT: depth vs water content ---
     left_ax.set_xlabel("Vanninnhold (%)")
     left_ax.set_ylabel("Dybde (m)")
     left_ax.set_ylim(*depth_ylim)
     left_ax.invert_yaxis()
     setup_xaxis(left_ax); add_box_spines(left_ax)
 
-    # Reset cycle so right plot matches colours/markers
-    color_marker_combos = itertools.cycle([(c,m) for c in colors for m in markers])
-  
     # --- RIGHT: elevation vs water content ---
-    for bh, data in wc_series.items():
-        if not data.get("water content"):
-            continue
-        c, m = next(color_marker_combos)
-        right_ax.scatter(data["water content"], data["elevs"],
-                        color=c, marker=m, s=25,
-                        label=f"{bh}, {data['Z']:.1f} m")
-
     right_ax.set_xlabel("Vanninnhold (%)")
     right_ax.set_ylabel("kote (m)")
     right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
     setup_xaxis(right_ax); add_box_spines(right_ax)
 
-    # --- Legend ---
-    handles, labels = left_ax.get_legend_handles_labels()
+    # --- Legend (each borehole's own marker, at the size of the points) ---
+    handles, labels = legend_handles(points, marker=None, markersize=5)
     legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
     legend_h = tb_height * 0.60
     legend_x0 = inner_left + inner_w * 0.02
@@ -719,7 +725,353 @@ def export_wc_pdf(
                    columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
                    title = "Borhull")
 
-    fig.savefig(outfile_pdf, format="pdf")
-    if outfile_png:
-        fig.savefig(outfile_png, dpi=300)
-    plt.close(fig)
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
+
+def _export_profile_pdf(
+    name,
+    layers,
+    outfile_pdf,
+    outfile_png=None,
+    logo_path=None,
+    title_info=None,
+    default_figur_nr="",
+    x_label="",
+    xlim=None,
+    depth_ylim=(0, 35),
+    margin_cm=1.0
+):
+    """
+    Shared layout for profiles (value vs depth & elevation).
+    `layers` is a list of (series, key, marker, label); with more than one layer a
+    marker key (label per marker) is drawn above the borehole legend, as in C4.
+    """
+    if title_info is None:
+        title_info = {}
+    rapport_nr = title_info.get("rapport_nr", "")
+    dato       = title_info.get("dato", "")
+    tegn       = title_info.get("tegn", "")
+    kontr      = title_info.get("kontr", "")
+    godkj      = title_info.get("godkj", "")
+    figur_nr   = title_info.get("figur_nr", default_figur_nr)
+    draw_span = start_span(f"{name}.draw", figure=figur_nr)
+
+    fig_w, fig_h = 11.69, 8.27
+    fig = Figure(figsize=(fig_w, fig_h))
+
+    margin_in = margin_cm / 2.54
+    inner_left   = margin_in / fig_w
+    inner_right  = 1.0 - margin_in / fig_w
+    inner_bottom = margin_in / fig_h
+    inner_top    = 1.0 - margin_in / fig_h
+    inner_w      = inner_right - inner_left
+    inner_h      = inner_top - inner_bottom
+
+    tb_left, tb_bottom, tb_width, tb_height = draw_page_frame_and_title_block(
+        fig, inner_left, inner_bottom, inner_w, inner_h,
+        rapport_nr, figur_nr, tegn, kontr, godkj, dato, logo_path
+    )
+
+    charts_bottom = (tb_bottom + tb_height) + (0.3/2.54)/fig_h
+    charts_top = inner_top - 0.07
+    charts_height = max(0.05, charts_top - charts_bottom)
+
+    left_ax  = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.40, charts_height])
+    right_ax = fig.add_axes([inner_left + inner_w*0.54, charts_bottom, inner_w*0.38, charts_height])
+
+    bh_color = borehole_colors(*(series for series, _, _, _ in layers))
+    points = [profile_points(series, key, bh_color, marker=marker) for series, key, marker, _ in layers]
+
+    def setup_xaxis(ax):
+        if xlim is not None:
+            ax.set_xlim(*xlim)
+        ax.xaxis.set_ticks_position('top')
+        ax.xaxis.set_label_position('top')
+        ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
+
+    # --- Plot data ---
+    n_points = sum(draw_profile(left_ax, right_ax, p) for p in points)
+    handles, labels = legend_handles(*points)
+
+    left_ax.set_xlabel(x_label)
+    left_ax.set_ylabel("Dybde (m)")
+    left_ax.set_ylim(*depth_ylim); left_ax.invert_yaxis()
+    left_ax.yaxis.tick_left(); left_ax.yaxis.set_label_position("left")
+    setup_xaxis(left_ax); add_box_spines(left_ax)
+
+    right_ax.set_xlabel(x_label)
+    right_ax.set_ylabel("kote (m)")
+    right_ax.yaxis.tick_right(); right_ax.yaxis.set_label_position("right")
+    setup_xaxis(right_ax); add_box_spines(right_ax)
+
+    # --- Legend ---
+    legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
+    legend_h = tb_height * 0.60
+    legend_x0 = inner_left + inner_w * 0.02
+    legend_y0 = (tb_bottom + tb_height/2) - (legend_h/2)
+
+    if handles:
+        fig.legend(handles, labels, loc='upper left',
+                   bbox_to_anchor=(legend_x0, legend_y0, legend_w, legend_h),
+                   bbox_transform=fig.transFigure, ncol=4, frameon=True, fontsize=8,
+                   columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
+                   title = "Borhull")
+
+        if len(layers) > 1:
+            key_handles = [Line2D([], [], linestyle='', marker=marker, markersize=6, color='black')
+                           for _, _, marker, _ in layers]
+            fig.legend(key_handles, [label for _, _, _, label in layers],
+                       loc='upper left',
+                       bbox_to_anchor=(legend_x0, legend_y0 + legend_h + 0.01, 0.2, 0.03),
+                       bbox_transform=fig.transFigure,
+                       ncol=len(layers), frameon=False, fontsize=8,
+                       columnspacing=0.8, handletextpad=0.4)
+
+    save_figure(fig, draw_span, outfile_pdf, outfile_png,
+                points=n_points)
+
+def export_gamma_pdf(gamma_series, outfile_pdf, outfile_png=None, logo_path=None,
+                     title_info=None, xlim=None, depth_ylim=(0, 35), margin_cm=1.0):
+    """Export C6 – Unit weight ɣ (kN/m³) vs depth & elevation."""
+    _export_profile_pdf("export_gamma_pdf", [(gamma_series, "unit weight", "s", "")], outfile_pdf, outfile_png,
+                        logo_path, title_info, default_figur_nr="C6",
+                        x_label="Tyngdetetthet ɣ (kN/m³)",
+                        xlim=xlim, depth_ylim=depth_ylim, margin_cm=margin_cm)
+
+def export_plasticity_pdf(atterberg_series, outfile_pdf, outfile_png=None, logo_path=None,
+                          title_info=None, xlim=None, depth_ylim=(0, 35), margin_cm=1.0):
+    """Export C7 – Plasticity index Ip = wL - wP (%). Series from derived.indices_to_series()."""
+    _export_profile_pdf("export_plasticity_pdf", [(atterberg_series, "plasticity index", "v", "")], outfile_pdf, outfile_png,
+                        logo_path, title_info, default_figur_nr="C7",
+                        x_label=r"Plastisitetsindeks $I_p$ (%)",
+                        xlim=xlim, depth_ylim=depth_ylim, margin_cm=margin_cm)
+
+def export_liquidity_pdf(atterberg_series, outfile_pdf, outfile_png=None, logo_path=None,
+                         title_info=None, xlim=None, depth_ylim=(0, 35), margin_cm=1.0):
+    """Export C8 – Liquidity index IL = (w - wP) / Ip. Series from derived.indices_to_series()."""
+    _export_profile_pdf("export_liquidity_pdf", [(atterberg_series, "liquidity index", "D", "")], outfile_pdf, outfile_png,
+                        logo_path, title_info, default_figur_nr="C8",
+                        x_label=r"Flyteindeks $I_L$ (-)",
+                        xlim=xlim, depth_ylim=depth_ylim, margin_cm=margin_cm)
+
+def export_normalised_strength_pdf(konus_norm, enaks_norm, outfile_pdf, outfile_png=None, logo_path=None,
+                                   title_info=None, xlim=None, depth_ylim=(0, 35), margin_cm=1.0):
+    """
+    Export C9 – Normalised undrained shear strength cu/σ'v, konus (▲) and enaks (●).
+    Series from derived.normalised_strength().
+    """
+    layers = []
+    if konus_norm:
+        layers.append((konus_norm, "cu/sigma_v_eff", "^", "Konus"))
+    if enaks_norm:
+        layers.append((enaks_norm, "cu/sigma_v_eff", "o", "Enaks"))
+    _export_profile_pdf("export_normalised_strength_pdf", layers, outfile_pdf, outfile_png,
+                        logo_path, title_info, default_figur_nr="C9",
+                        x_label=r"Normalisert skjærstyrke $c_u/\sigma'_v$ (-)",
+                        xlim=xlim, depth_ylim=depth_ylim, margin_cm=margin_cm)
+
+def export_enaks_curves_pdf(
+    curves,
+    outfile_pdf,
+    outfile_png=None,
+    logo_path=None,
+    title_info=None,
+    xlim=None,
+    ylim=None,
+    margin_cm=1.0,
+    buckets=200
+):
+    """
+    Export C10 – Enaks stress–strain curves, all tests on one axes (curves.build_enaks_curves()).
+
+    Each curve is decimated to at most ~4·`buckets` points with curves.decimate_minmax
+    (peaks kept), and each borehole is drawn as one LineCollection, so hundreds of long
+    curves stay a small PDF. The failure point (max stress) of every test is marked.
+    """
+    from curves import decimate_curves
+
+    if title_info is None:
+        title_info = {}
+    rapport_nr = title_info.get("rapport_nr", "")
+    dato       = title_info.get("dato", "")
+    tegn       = title_info.get("tegn", "")
+    kontr      = title_info.get("kontr", "")
+    godkj      = title_info.get("godkj", "")
+    figur_nr   = title_info.get("figur_nr", "C10")
+    draw_span = start_span("export_enaks_curves_pdf.draw", figure=figur_nr)
+
+    fig_w, fig_h = 11.69, 8.27
+    fig = Figure(figsize=(fig_w, fig_h))
+
+    margin_in = margin_cm / 2.54
+    inner_left   = margin_in / fig_w
+    inner_right  = 1.0 - margin_in / fig_w
+    inner_bottom = margin_in / fig_h
+    inner_top    = 1.0 - margin_in / fig_h
+    inner_w      = inner_right - inner_left
+    inner_h      = inner_top - inner_bottom
+
+    tb_left, tb_bottom, tb_width, tb_height = draw_page_frame_and_title_block(
+        fig, inner_left, inner_bottom, inner_w, inner_h,
+        rapport_nr, figur_nr, tegn, kontr, godkj, dato, logo_path
+    )
+
+    charts_bottom = (tb_bottom + tb_height) + (0.3/2.54)/fig_h
+    charts_top = inner_top - 0.07
+    charts_height = max(0.05, charts_top - charts_bottom)
+    ax = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.86, charts_height])
+
+    bh_color = borehole_colors(curves)
+
+    handles, labels = [], []
+    points = 0
+    for bh, data in decimate_curves(curves, buckets).items():
+        offsets = data["offsets"]
+        if len(offsets) < 2:
+            continue
+        color = bh_color.get(bh, "tab:blue")
+        xy = np.column_stack([data["strain"], data["stress"]])
+        segments = [xy[a:b] for a, b in zip(offsets[:-1], offsets[1:]) if b - a > 1]
+        ax.add_collection(LineCollection(segments, colors=[color], linewidths=0.8))
+        peaks = [a + int(np.argmax(data["stress"][a:b])) for a, b in zip(offsets[:-1], offsets[1:]) if b > a]
+        ax.scatter(data["strain"][peaks], data["stress"][peaks], color=color, marker='o', s=14, zorder=3)
+        points += len(xy)
+        handles.append(Line2D([], [], color=color, linewidth=1.5))
+        labels.append(f"{bh}, {data['Z']:.1f} m ({len(offsets) - 1})")
+
+    ax.autoscale_view()
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+    else:
+        ax.set_xlim(left=0)
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    else:
+        ax.set_ylim(bottom=0)
+    ax.set_xlabel(r"Aksialtøyning $\epsilon$ (%)")
+    ax.set_ylabel("Spenning (kPa)")
+    ax.xaxis.set_ticks_position('top')
+    ax.xaxis.set_label_position('top')
+    ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
+    add_box_spines(ax)
+
+    # --- Legend ---
+    legend_w = (tb_left - (inner_left + inner_w * 0.02)) - inner_w * 0.02
+    legend_h = tb_height * 0.60
+    legend_x0 = inner_left + inner_w * 0.02
+    legend_y0 = (tb_bottom + tb_height/2) - (legend_h/2)
+
+    if handles:
+        fig.legend(handles, labels, loc='upper left',
+                   bbox_to_anchor=(legend_x0, legend_y0, legend_w, legend_h),
+                   bbox_transform=fig.transFigure, ncol=4, frameon=True, fontsize=8,
+                   columnspacing=0.8, handletextpad=0.6, borderaxespad=0.6,
+                   title = "Borhull (antall forsøk)")
+
+    save_figure(fig, draw_span, outfile_pdf, outfile_png, points=points)
+
+def export_section_pdf(
+    section,
+    outfile_pdf,
+    outfile_png=None,
+    logo_path=None,
+    title_info=None,
+    label=None,
+    cmap="viridis",
+    levels=12,
+    vlim=None,
+    margin_cm=1.0
+):
+    """
+    Export C11 – cross-section along an ordered line of boreholes (sections.ResampledGrid.section()).
+
+    The resampled values are contoured between neighbouring boreholes; grid points without
+    data (above the first or below the last sample, long gaps) stay masked and are left
+    blank rather than filled in. Each borehole is drawn as a vertical line with its name,
+    and the terrain (kote) or the surface (dybde) as a line on top.
+    """
+    if title_info is None:
+        title_info = {}
+    rapport_nr = title_info.get("rapport_nr", "")
+    dato       = title_info.get("dato", "")
+    tegn       = title_info.get("tegn", "")
+    kontr      = title_info.get("kontr", "")
+    godkj      = title_info.get("godkj", "")
+    figur_nr   = title_info.get("figur_nr", "C11")
+    draw_span = start_span("export_section_pdf.draw", figure=figur_nr)
+
+    fig_w, fig_h = 11.69, 8.27
+    fig = Figure(figsize=(fig_w, fig_h))
+
+    margin_in = margin_cm / 2.54
+    inner_left   = margin_in / fig_w
+    inner_right  = 1.0 - margin_in / fig_w
+    inner_bottom = margin_in / fig_h
+    inner_top    = 1.0 - margin_in / fig_h
+    inner_w      = inner_right - inner_left
+    inner_h      = inner_top - inner_bottom
+
+    tb_left, tb_bottom, tb_width, tb_height = draw_page_frame_and_title_block(
+        fig, inner_left, inner_bottom, inner_w, inner_h,
+        rapport_nr, figur_nr, tegn, kontr, godkj, dato, logo_path
+    )
+
+    charts_bottom = (tb_bottom + tb_height) + (0.3/2.54)/fig_h
+    charts_top = inner_top - 0.07
+    charts_height = max(0.05, charts_top - charts_bottom)
+    ax = fig.add_axes([inner_left + inner_w*0.06, charts_bottom, inner_w*0.80, charts_height])
+    cax = fig.add_axes([inner_left + inner_w*0.88, charts_bottom, inner_w*0.015, charts_height])
+
+    x = np.asarray(section["distance"], dtype=float)
+    y = np.asarray(section["levels"], dtype=float)
+    values = np.ma.masked_invalid(np.asarray(section["values"], dtype=float))
+    by_kote = section["axis"] == "Kote"
+    points = int(values.count())
+
+    finite = values.compressed()
+    if vlim is not None:
+        vmin, vmax = vlim
+    elif len(finite):
+        vmin, vmax = float(finite.min()), float(finite.max())
+    else:
+        vmin, vmax = 0.0, 1.0
+    if vmax <= vmin:
+        vmax = vmin + 1.0
+    bounds = np.linspace(vmin, vmax, levels + 1)
+    colormap = colormaps[cmap]
+
+    if len(x) >= 2 and points:
+        mappable = ax.contourf(x, y, values, levels=bounds, cmap=colormap, extend="both")
+    else:
+        # One borehole: nothing to contour between, show its column of values
+        xx = np.broadcast_to(x[None, :], values.shape)
+        yy = np.broadcast_to(y[:, None], values.shape)
+        mappable = ax.scatter(xx[~values.mask], yy[~values.mask], c=finite, cmap=colormap,
+                              vmin=vmin, vmax=vmax, marker='s', s=12)
+    fig.colorbar(mappable, cax=cax).set_label(label or section["key"])
+
+    top = np.asarray(section["Z"], dtype=float) if by_kote else np.zeros(len(x))
+    if len(x):
+        ax.plot(x, top, color="saddlebrown", linewidth=1.5)
+    for xi, bh, t in zip(x, section["boreholes"], top):
+        ax.axvline(xi, color="black", linewidth=0.6, alpha=0.6)
+        ax.annotate(bh, (xi, t), xytext=(0, 4), textcoords="offset points", ha="center",
+                    va="bottom", fontsize=8, rotation=90 if len(x) > 12 else 0)
+
+    if len(x) >= 2:
+        pad = 0.02 * (x[-1] - x[0]) if x[-1] > x[0] else 0.5
+        ax.set_xlim(x[0] - pad, x[-1] + pad)
+    if len(y):
+        lo, hi = float(np.min(y)), float(np.nanmax(np.concatenate([y, top])))
+        if by_kote:
+            ax.set_ylim(lo, hi + 0.08 * (hi - lo + 1))
+        else:
+            ax.set_ylim(hi, -0.08 * (hi - lo + 1))
+    ax.set_xlabel("Avstand langs snitt (m)" if section.get("measured") else "Borhull langs snitt (-)")
+    ax.set_ylabel("kote (m)" if by_kote else "Dybde (m)")
+    ax.xaxis.set_ticks_position('top')
+    ax.xaxis.set_label_position('top')
+    ax.grid(True, which='major', linewidth=0.5, alpha=0.4)
+    add_box_spines(ax)
+
+    save_figure(fig, draw_span, outfile_pdf, outfile_png, points=points)
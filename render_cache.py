@@ -0,0 +1,225 @@
+"""
+Content-addressed cache of rendered figures.
+
+The key is a SHA-256 over everything that decides what a figure looks like: the series
+arrays, the exporter (module, name and the source file it lives in), its parameters
+(depth_ylim, xlim, margin_cm, design, ...), title_info, the logo file contents and the
+page grouping. Output paths are not part of the key. Each entry is one uncompressed zip
+with the PDF first and the PNG previews after it, so a hit is a single file read. Members
+are stored as figure.pdf / figure.png / figure_<n>.png and restored under the output
+names the caller asks for, so two reports sharing an entry each get their own files.
+
+The cache directory is shared between sessions and processes: entries are written to a
+temporary name and moved into place, and eviction drops entries older than `max_age_s`
+and then the least recently used ones until the total is below `max_bytes`.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span, log_event
+
+CACHE_VERSION = "2"
+CACHE_DIR = os.environ.get("GRUNN_RENDER_CACHE", os.path.join(tempfile.gettempdir(), "grunn_render_cache"))
+OUTPUT_KWARGS = ("outfile_pdf", "outfile_png")
+MEMBER_STEM = "figure"
+
+@lru_cache(maxsize=None)
+def _file_digest(path, mtime_ns, size):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's contents ('' if it does not exist), memoised on mtime and size."""
+    if not path or not os.path.exists(path):
+        return ""
+    st = os.stat(path)
+    return _file_digest(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def _feed(h, obj):
+    """Feed a canonical byte form of `obj` into the hash."""
+    if obj is None:
+        h.update(b"N;")
+    elif isinstance(obj, (bool, int, float, str, np.number)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, Mapping):
+        h.update(f"d{len(obj)}{{".encode())
+        for k in sorted(obj, key=str):
+            _feed(h, k)
+            _feed(h, obj[k])
+        h.update(b"}")
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(repr(getattr(obj, "columns", obj.name)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, (list, tuple, np.ndarray)):
+        arr = None
+        if not (isinstance(obj, np.ndarray) and obj.dtype == object):
+            try:
+                arr = np.asarray(obj, dtype=float)  # None -> NaN
+            except (TypeError, ValueError):
+                arr = None
+        if arr is not None:
+            h.update(f"a{arr.shape}".encode())
+            h.update(np.ascontiguousarray(arr).tobytes())
+        else:
+            h.update(f"l{len(obj)}[".encode())
+            for item in obj:
+                _feed(h, item)
+            h.update(b"]")
+    else:
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+
+def params_digest(*objs):
+    """SHA-256 over `objs` in the same canonical form as the render keys."""
+    h = hashlib.sha256()
+    for obj in objs:
+        _feed(h, obj)
+    return h.hexdigest()
+
+def render_key(export_fn, series_args, groups=None, **kwargs):
+    """
+    Cache key for `export_fn(*series_args, **kwargs)`. `logo_path` is keyed on the file
+    contents, the output paths only on whether a PNG is wanted.
+    """
+    h = hashlib.sha256(f"v{CACHE_VERSION};".encode())
+    module = getattr(export_fn, "__module__", "")
+    _feed(h, f"{module}.{getattr(export_fn, '__qualname__', repr(export_fn))}")
+    code = getattr(export_fn, "__code__", None)
+    _feed(h, file_digest(code.co_filename) if code else "")
+
+    params = {k: v for k, v in kwargs.items() if k not in OUTPUT_KWARGS}
+    params["logo_path"] = file_digest(params.get("logo_path"))
+    params["png"] = bool(kwargs.get("outfile_png"))
+    _feed(h, list(series_args))
+    _feed(h, params)
+    _feed(h, groups)
+    return h.hexdigest()
+
+class RenderCache:
+    """Directory of <key>.zip entries bounded by total size and age."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=512 * 1024 ** 2, max_age_s=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.zip")
+
+    def get(self, key, outfile_pdf, outfile_png=None):
+        """
+        Restore a cached entry as `outfile_pdf` and its previews next to `outfile_png`
+        (<stem>.png, or <stem>_<n>.png per page). Returns the restored paths (PDF first) or
+        None on a miss; an entry without its PDF counts as a miss.
+        """
+        path = self._path(key)
+        png_stem = os.path.splitext(outfile_png)[0] if outfile_png else None
+        with span("render_cache.get") as counts:
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    infos = zf.infolist()
+                    if not infos or infos[0].filename != MEMBER_STEM + ".pdf":
+                        return None
+                    out = []
+                    for info in infos:
+                        if info is infos[0]:
+                            target = outfile_pdf
+                        elif png_stem and info.filename.startswith(MEMBER_STEM):
+                            target = png_stem + info.filename[len(MEMBER_STEM):]
+                        else:
+                            continue
+                        with zf.open(info) as src, open(target, "wb") as dst:
+                            dst.write(src.read())
+                        out.append(target)
+                os.utime(path)  # recently used
+            except (FileNotFoundError, zipfile.BadZipFile):
+                return None
+            counts["points"] = len(out)
+        log_event(f"Fra buffer: {os.path.basename(out[0])}")
+        return out
+
+    def put(self, key, paths, outfile_png=None):
+        """
+        Store the rendered files (PDF first, then PNGs named after `outfile_png`) under
+        `key`, then evict if needed.
+        """
+        png_stem = os.path.splitext(outfile_png)[0] if outfile_png else None
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as zf:
+                for i, p in enumerate(paths):
+                    if not (p and os.path.exists(p)):
+                        continue
+                    if i == 0:
+                        arcname = MEMBER_STEM + ".pdf"
+                    elif png_stem and p.startswith(png_stem):
+                        arcname = MEMBER_STEM + p[len(png_stem):]
+                    else:
+                        continue
+                    zf.write(p, arcname=arcname)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """[(path, size, mtime), ...] of the stored entries, oldest use first."""
+        out = []
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if e.name.endswith(".zip"):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    out.append((e.path, st.st_size, st.st_mtime))
+        return sorted(out, key=lambda e: e[2])
+
+    def evict(self):
+        """Drop entries older than max_age_s, then the least recently used above max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for path, size, mtime in entries:
+                if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return removed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+_shared = None
+
+def shared_cache():
+    """Process-wide cache in CACHE_DIR."""
+    global _shared
+    if _shared is None:
+        _shared = RenderCache()
+    return _shared
@@ -0,0 +1,166 @@
+"""
+All boreholes on one depth/elevation grid, and cross-sections cut from it.
+
+`resample()` puts every borehole and every value key of a series on the same levels
+(kote or dybde, every `step` m) in one vectorised pass: the samples of all boreholes are
+laid out on one sorted axis (borehole number × span + level), each grid point finds its
+neighbours with a single np.searchsorted, and for every key the nearest sample above and
+below that has a value is found with running max/min over the whole array at once. Values
+are interpolated linearly between two samples of the same borehole only; grid points
+above the first or below the last sample, or in a gap longer than `max_gap` m, are NaN.
+
+The result is cached (RESAMPLE_CACHE_SIZE grids, keyed on the series contents and the
+parameters), so several sections along different borehole lines cost only the cut.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from derived import series_to_frame
+from depth_index import value_keys
+from render_cache import params_digest
+from instrumentation import span
+
+RESAMPLE_CACHE_SIZE = 8
+_cache = OrderedDict()
+
+# Label: (dataset, value key, axis label)
+SECTION_VARIABLES = {
+    "Uforstyrret skjærstyrke konus": ("konus", "undist", "Uforstyrret skjærstyrke (kPa)"),
+    "Omrørt skjærstyrke": ("konus", "remould", "Omrørt skjærstyrke (kPa)"),
+    "Sensitivitet": ("konus", "sensitivity", "Sensitivitet (-)"),
+    "Skjærstyrke enaks": ("enaks", "strength", "Skjærstyrke enaks (kPa)"),
+    "Vanninnhold": ("wc", "water content", "Vanninnhold (%)"),
+    "Tyngdetetthet": ("gamma", "unit weight", "Tyngdetetthet (kN/m³)"),
+    "Plastisitetsindeks": ("atterberg", "plasticity index", "Plastisitetsindeks (%)"),
+}
+
+class ResampledGrid:
+    """
+    values[b, l, k]: key `keys[k]` of borehole `boreholes[b]` at `levels[l]` (NaN = no data).
+    `axis` is "Kote" (levels from the top down) or "Dybde".
+    """
+
+    def __init__(self, boreholes, Z, levels, axis, keys, values):
+        self.boreholes = list(boreholes)
+        self.Z = np.asarray(Z, dtype=float)
+        self.levels = levels
+        self.axis = axis
+        self.keys = list(keys)
+        self.values = values
+        self._row = {bh: i for i, bh in enumerate(self.boreholes)}
+
+    def __contains__(self, bh):
+        return bh in self._row
+
+    def column(self, bh, key):
+        return self.values[self._row[bh], :, self.keys.index(key)]
+
+    def section(self, line, key, coords=None, stations=None):
+        """
+        Cut along `line` (borehole names in order; unknown ones are left out). The distance
+        along the line is the chainage in `stations` ({bh: m}), or the path length through
+        `coords` ({bh: (x, y)}), when every borehole has one; otherwise the boreholes are
+        spaced 1 apart. Returns a dict with
+          boreholes, distance, measured, Z, levels, axis, key, values (levels × boreholes)
+        """
+        line = [bh for bh in line if bh in self._row]
+        rows = [self._row[bh] for bh in line]
+        measured = len(line) > 1 and any(m and all(bh in m for bh in line) for m in (stations, coords))
+        if measured and stations and all(bh in stations for bh in line):
+            distance = np.array([stations[bh] for bh in line], dtype=float)
+        elif measured:
+            xy = np.array([coords[bh] for bh in line], dtype=float)
+            distance = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))])
+        else:
+            distance = np.arange(len(line), dtype=float)
+        return {
+            "boreholes": line, "distance": distance, "Z": self.Z[rows], "levels": self.levels,
+            "axis": self.axis, "key": key, "measured": measured,
+            "values": self.values[rows, :, self.keys.index(key)].T,
+        }
+
+def _running_index(valid, reverse=False):
+    """Per column, the index of the last (or, with `reverse`, the next) True row at or before (after) each row."""
+    n = len(valid)
+    idx = np.arange(n)[:, None]
+    if not reverse:
+        return np.maximum.accumulate(np.where(valid, idx, -1), axis=0)
+    return np.minimum.accumulate(np.where(valid, idx, n)[::-1], axis=0)[::-1]
+
+def resample(series, keys=None, axis="Kote", step=0.25, max_gap=3.0, levels=None):
+    """
+    ResampledGrid of `series` (a series dict or SharedSeries) on a common grid: `levels`,
+    or every `step` m over the range of all samples. Cached, see RESAMPLE_CACHE_SIZE.
+    """
+    keys = list(keys) if keys is not None else value_keys(series)
+    cache_key = params_digest(series, keys, axis, step, max_gap, levels)
+    if cache_key in _cache:
+        _cache.move_to_end(cache_key)
+        return _cache[cache_key]
+
+    with span("sections.resample") as counts:
+        df = series_to_frame(series, keys)
+        df = df[np.isfinite(df[axis].to_numpy(dtype=float))]
+        names = sorted(df["Borhull"].unique())
+        code = df["Borhull"].map({bh: i for i, bh in enumerate(names)}).to_numpy(dtype=np.int64)
+        level = df[axis].to_numpy(dtype=float)
+        vals = df[keys].to_numpy(dtype=float) if keys else np.empty((len(df), 0))
+        Z = [series[bh]["Z"] for bh in names]
+
+        if levels is None:
+            if len(level):
+                lo, hi = np.floor(level.min() / step) * step, np.ceil(level.max() / step) * step
+                levels = np.arange(lo, hi + step / 2, step)
+            else:
+                levels = np.empty(0)
+        levels = np.asarray(levels, dtype=float)
+        if axis == "Kote":
+            levels = np.sort(levels)[::-1]
+
+        # One sorted axis over all boreholes: borehole number × span + level
+        base = min(level.min(), levels.min()) if len(level) and len(levels) else 0.0
+        top = max(level.max(), levels.max()) if len(level) and len(levels) else 0.0
+        span_ = (top - base) + 2 * max(max_gap, step) + 1.0
+        u = code * span_ + (level - base)
+        order = np.argsort(u, kind="stable")
+        u, code, level, vals = u[order], code[order], level[order], vals[order]
+
+        g_code = np.repeat(np.arange(len(names)), len(levels))
+        g_level = np.tile(levels, len(names))
+        g = g_code * span_ + (g_level - base)
+
+        n = len(u)
+        out = np.full((len(g), len(keys)), np.nan)
+        if n and len(g) and keys:
+            valid = np.isfinite(vals)
+            prev = _running_index(valid)                 # last sample with a value at or before row
+            nxt = _running_index(valid, reverse=True)    # next sample with a value at or after row
+            r = np.searchsorted(u, g, side="left")       # first sample at or below the grid level
+            left = prev[np.clip(r - 1, 0, n - 1)]
+            left = np.where((r - 1)[:, None] >= 0, left, -1)
+            right = nxt[np.clip(r, 0, n - 1)]
+            right = np.where((r < n)[:, None], right, n)
+
+            has_r = right < n
+            has_l = left >= 0
+            ri, li = np.clip(right, 0, n - 1), np.clip(left, 0, n - 1)
+            same_r = has_r & (code[ri] == g_code[:, None])
+            same_l = has_l & (code[li] == g_code[:, None])
+            exact = same_r & (level[ri] == g_level[:, None])
+            gap = level[ri] - level[li]
+            between = same_r & same_l & (gap <= max_gap)
+
+            col = np.arange(len(keys))[None, :]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                w = np.where(gap > 0, (g_level[:, None] - level[li]) / gap, 0.0)
+                interp = vals[li, col] + w * (vals[ri, col] - vals[li, col])
+            out = np.where(exact, vals[ri, col], np.where(between, interp, np.nan))
+        counts["rows"] = n
+        counts["points"] = int(np.isfinite(out).sum())
+
+    grid = ResampledGrid(names, Z, levels, axis, keys, out.reshape(len(names), len(levels), len(keys)))
+    _cache[cache_key] = grid
+    while len(_cache) > RESAMPLE_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return grid
@@ -0,0 +1,406 @@
+"""
+Local HTTP job API for report generation (standard library only).
+
+  POST /jobs                multipart/form-data:
+                              terrain    – terrain table (.xlsx), required
+                              konus, enaks, wc, gamma, atterberg – lab workbooks, repeatable
+                              title      – JSON title block {"rapport_nr", "dato", "tegn", "kontr", "godkj"}
+                              figures    – JSON figure numbers by key, e.g. {"wc": "C1"} (optional)
+                              options    – JSON pipeline options, only the keys in API_OPTIONS (optional)
+                            → 202 {"id", "state", ...}; 200 with the existing job if the same files,
+                              title, figures and options were submitted before (id = content hash)
+  GET  /jobs/<id>           → job status: state (queued | running | done | failed), queue position,
+                              timings, stage table and critical path, data anomalies
+                              (validation.py), output file names, error
+  GET  /jobs/<id>/result    → ZIP of all outputs (bundle.build_zip_bundle)
+  GET  /jobs/<id>/files/<name> → one output file
+  GET  /health              → worker pool and job counts
+
+Options that name paths on the server or write outside the job (dem_path, archive_dir,
+archive_project) are not accepted; a request with them, or with a value of the wrong
+type, gets 400. Finished jobs and their directories are removed after JOB_TTL_S, and the
+oldest ones once more than MAX_FINISHED_JOBS are kept.
+
+Jobs run on a small runner pool (at most `max_jobs` at a time, the rest wait in order);
+each runner sends its parsing and rendering to workers.shared_pool() under the caller's
+X-User header (or address), so HTTP clients share the same fair, bounded pool as the app.
+`make_server(pool=...)` takes any object with the pool's submit/admission_error/stats,
+e.g. an in-process one for tests.
+
+Run with  python server.py --port 8765 ; `submit_report()` is a urllib client for scripts.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+import time
+import traceback
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bundle import build_zip_bundle
+from instrumentation import logger, recording
+from pipeline import BUILDERS, run_report
+from workers import PoolBusy, shared_pool
+
+JOBS_DIR = os.environ.get("GRUNN_JOBS_DIR", os.path.join(os.getcwd(), "jobs"))
+MAX_UPLOAD_BYTES = 200 * 1024 ** 2
+JSON_FIELDS = ("title", "figures", "options")
+JOB_TTL_S = float(os.environ.get("GRUNN_JOB_TTL_H", 24 * 7)) * 3600
+MAX_FINISHED_JOBS = int(os.environ.get("GRUNN_MAX_JOBS", 200))
+
+_NUMBER = (int, float)
+# Pipeline options a client may set, with their JSON types (pipeline.DEFAULT_OPTIONS has the rest)
+API_OPTIONS = {
+    "sheet_name": str, "ranges": dict, "design": bool, "design_fractile": _NUMBER,
+    "design_kind": str, "design_bin": _NUMBER, "gw_depth": _NUMBER, "png": bool, "cache": bool,
+    "sections": list, "section_variables": list, "section_axis": str,
+    "section_step": _NUMBER, "section_max_gap": _NUMBER,
+}
+
+def parse_multipart(content_type, body):
+    """[(field name, filename or None, bytes), ...] from a multipart/form-data body."""
+    msg = BytesParser(policy=default_policy).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not msg.is_multipart():
+        raise ValueError("expected multipart/form-data")
+    parts = []
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            parts.append((name, part.get_filename(), part.get_payload(decode=True) or b""))
+    return parts
+
+def check_fields(fields):
+    """Raise ValueError unless the JSON fields have the expected shape and only API_OPTIONS."""
+    for name in ("title", "figures"):
+        value = fields.get(name, {})
+        if not isinstance(value, dict) or not all(isinstance(v, str) for v in value.values()):
+            raise ValueError(f"'{name}' must be a JSON object of strings")
+    options = fields.get("options", {})
+    if not isinstance(options, dict):
+        raise ValueError("'options' must be a JSON object")
+    for key, value in options.items():
+        if key not in API_OPTIONS:
+            raise ValueError(f"option '{key}' is not accepted by the API")
+        if not isinstance(value, API_OPTIONS[key]) or (isinstance(value, bool) and API_OPTIONS[key] is _NUMBER):
+            raise ValueError(f"option '{key}' has the wrong type")
+    ranges = options.get("ranges", {})
+    if not all(isinstance(v, str) for v in ranges.values()):
+        raise ValueError("'ranges' must map names to cell ranges such as \"L6:L19\"")
+    if not all(isinstance(v, str) for v in options.get("section_variables", [])):
+        raise ValueError("'section_variables' must be a list of names")
+    if not all(isinstance(line, list) and all(isinstance(bh, str) for bh in line)
+               for line in options.get("sections", [])):
+        raise ValueError("'sections' must be a list of borehole name lists")
+
+def job_id(files, fields):
+    """Content hash over the uploaded files (field, name, sha256) and the JSON fields."""
+    h = hashlib.sha256()
+    for field, filename, digest in sorted(files):
+        h.update(f"{field}\0{filename}\0{digest}\n".encode())
+    h.update(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode())
+    return h.hexdigest()[:32]
+
+class JobStore:
+    """
+    Jobs on disk (JOBS_DIR/<id>/{input,output,status.json}) run by a bounded runner pool.
+    Parsing and rendering go to `pool` (default workers.shared_pool()).
+    """
+
+    def __init__(self, directory=JOBS_DIR, max_jobs=2, pool=None, ttl_s=JOB_TTL_S, max_finished=MAX_FINISHED_JOBS):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pool = pool if pool is not None else shared_pool()
+        self.ttl_s = ttl_s
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._order = []  # queued job ids, oldest first
+        self._runner = ThreadPoolExecutor(max_jobs, thread_name_prefix="report-job")
+        self._load()
+        self.evict()
+
+    def _load(self):
+        """Pick up finished jobs from an earlier run; unfinished ones are marked failed."""
+        for jid in os.listdir(self.directory):
+            path = os.path.join(self.directory, jid, "status.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    status = json.load(f)
+                if status["state"] not in ("done", "failed"):
+                    status.update(state="failed", error="Server restarted before the job finished")
+                self._jobs[jid] = status
+
+    def evict(self, now=None):
+        """Remove finished jobs older than ttl_s, then the oldest beyond max_finished. Returns their ids."""
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = sorted((s.get("finished") or s["created"], jid) for jid, s in self._jobs.items()
+                              if s["state"] in ("done", "failed"))
+            expired = [jid for t, jid in finished if now - t > self.ttl_s]
+            kept = [jid for _, jid in finished if jid not in expired]
+            expired += kept[:max(0, len(kept) - self.max_finished)]
+            for jid in expired:
+                del self._jobs[jid]
+        for jid in expired:
+            shutil.rmtree(os.path.join(self.directory, jid), ignore_errors=True)
+        return expired
+
+    def _save(self, status):
+        path = os.path.join(self.directory, status["id"], "status.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(status, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def _snapshot(self, jid):
+        """Copy of a job's status with its place in the runner queue (caller holds the lock)."""
+        status = dict(self._jobs[jid])
+        status["position"] = self._order.index(jid) + 1 if jid in self._order else 0
+        return status
+
+    def get(self, jid):
+        with self._lock:
+            return self._snapshot(jid) if jid in self._jobs else None
+
+    def stats(self):
+        with self._lock:
+            states = [s["state"] for s in self._jobs.values()]
+        return {state: states.count(state) for state in ("queued", "running", "done", "failed")}
+
+    def submit(self, parts, user):
+        """Create (or find) the job for an upload. Returns (status, created)."""
+        files, fields = [], {}
+        for field, filename, data in parts:
+            if field in JSON_FIELDS:
+                fields[field] = json.loads(data.decode("utf-8") or "{}")
+            elif field == "terrain" or field in BUILDERS:
+                if not filename:
+                    raise ValueError(f"field '{field}' must be a file")
+                name = os.path.basename(filename.replace("\\", "/")).strip()
+                if name in ("", ".", ".."):
+                    raise ValueError(f"invalid file name '{filename}' in field '{field}'")
+                if any(f == field and n == name for f, n, _ in files):
+                    raise ValueError(f"file '{name}' given twice in field '{field}'")
+                files.append((field, name, data))
+            else:
+                raise ValueError(f"unknown field '{field}'")
+        if not any(field == "terrain" for field, _, _ in files):
+            raise ValueError("a terrain file is required")
+        check_fields(fields)
+        self.evict()
+
+        jid = job_id([(f, n, hashlib.sha256(d).hexdigest()) for f, n, d in files], fields)
+        with self._lock:
+            existing = self._jobs.get(jid)
+            if existing is not None and existing["state"] != "failed":
+                return self._snapshot(jid), False
+
+            job_dir = os.path.join(self.directory, jid)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            for field, filename, data in files:
+                folder = os.path.join(job_dir, "input", field)
+                os.makedirs(folder, exist_ok=True)
+                with open(os.path.join(folder, filename), "wb") as f:
+                    f.write(data)
+            os.makedirs(os.path.join(job_dir, "output"))
+            status = {"id": jid, "state": "queued", "user": user, "fields": fields,
+                      "created": time.time(), "started": None, "finished": None,
+                      "error": None, "files": [], "timings": [], "events": []}
+            self._jobs[jid] = status
+            self._order.append(jid)
+            self._save(status)
+        self._runner.submit(self._run, jid)
+        return self.get(jid), True
+
+    def _run(self, jid):
+        with self._lock:
+            self._order.remove(jid)
+            status = self._jobs[jid]
+            status.update(state="running", started=time.time())
+            self._save(status)
+        job_dir = os.path.join(self.directory, jid)
+        inputs = os.path.join(job_dir, "input")
+        pool = self.pool
+        fields = status["fields"]
+        with recording() as timings:
+            try:
+                terrain_dir = os.path.join(inputs, "terrain")
+                terrain_path = os.path.join(terrain_dir, os.listdir(terrain_dir)[0])
+                folders = {name: os.path.join(inputs, name) for name in BUILDERS
+                           if os.path.isdir(os.path.join(inputs, name))}
+                result = run_report(os.path.join(job_dir, "output"), terrain_path, folders,
+                                    title_info=fields.get("title"), figure_numbers=fields.get("figures"),
+                                    options=fields.get("options"),
+                                    submit=lambda fn, *a, **kw: pool.submit(status["user"], fn, *a, **kw))
+                stage_run = result["stages"]
+                update = {"state": "done", "files": [os.path.basename(p) for p in result["files"]],
+                          "stages": json.loads(stage_run.table().to_json(orient="records", force_ascii=False)),
+                          "critical_path": stage_run.critical_path(),
+                          "anomalies": json.loads(result["anomalies"].to_json(orient="records", force_ascii=False))}
+            except Exception as e:
+                update = {"state": "failed", "error": f"{type(e).__name__}: {e}",
+                          "traceback": traceback.format_exc()}
+        update["timings"] = json.loads(timings.report().to_json(orient="records", force_ascii=False))
+        update["events"] = timings.events_frame().to_dict(orient="records")
+        with self._lock:
+            status.update(update, finished=time.time())
+            self._save(status)
+
+    def output_path(self, jid, name=None):
+        out = os.path.join(self.directory, jid, "output")
+        return out if name is None else os.path.join(out, os.path.basename(name))
+
+    def shutdown(self):
+        self._runner.shutdown(wait=True)
+
+class JobHandler(BaseHTTPRequestHandler):
+    store = None  # set by make_server()
+
+    def _json(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, fileobj, size, content_type, filename):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(size))
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.end_headers()
+        shutil.copyfileobj(fileobj, self.wfile)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_BYTES:
+            return self._json(413, {"error": f"upload larger than {MAX_UPLOAD_BYTES} bytes"})
+        busy = self.store.pool.admission_error()
+        if busy:
+            self.send_response(503)
+            self.send_header("Retry-After", "30")
+            body = json.dumps({"error": busy}, ensure_ascii=False).encode("utf-8")
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        try:
+            parts = parse_multipart(self.headers.get("Content-Type", ""), self.rfile.read(length))
+            user = self.headers.get("X-User") or self.client_address[0]
+            status, created = self.store.submit(parts, user)
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._json(400, {"error": str(e)})
+        except PoolBusy as e:
+            return self._json(503, {"error": str(e)})
+        self._json(202 if created else 200, status)
+
+    def do_GET(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["health"]:
+            return self._json(200, {"pool": self.store.pool.stats(), "jobs": self.store.stats()})
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._json(404, {"error": "not found"})
+        status = self.store.get(parts[1])
+        if status is None:
+            return self._json(404, {"error": "unknown job"})
+        if len(parts) == 2:
+            status.pop("traceback", None)
+            return self._json(200, status)
+        if status["state"] != "done":
+            return self._json(409, {"error": f"job is {status['state']}", "state": status["state"]})
+        if parts[2:] == ["result"]:
+            paths = [self.store.output_path(parts[1], name) for name in status["files"]]
+            with build_zip_bundle(paths) as bundle:
+                size = bundle.seek(0, os.SEEK_END)
+                bundle.seek(0)
+                return self._file(bundle, size, "application/zip", f"{parts[1]}.zip")
+        if len(parts) == 4 and parts[2] == "files" and parts[3] in status["files"]:
+            path = self.store.output_path(parts[1], parts[3])
+            with open(path, "rb") as f:
+                ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                return self._file(f, os.path.getsize(path), ctype, parts[3])
+        return self._json(404, {"error": "not found"})
+
+    def log_message(self, fmt, *args):
+        logger.info(f"{self.address_string()} {fmt % args}")
+
+def make_server(host="127.0.0.1", port=8765, jobs_dir=JOBS_DIR, max_jobs=2, pool=None):
+    """ThreadingHTTPServer with its JobStore (server.store); port 0 picks a free port."""
+    store = JobStore(jobs_dir, max_jobs, pool)
+    handler = type("BoundJobHandler", (JobHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.store = store
+    return server
+
+# --- Client side, for scripts and QA ---------------------------------------------------
+
+def encode_multipart(files, fields):
+    """files: [(field, path), ...]; fields: {name: JSON-able}. Returns (content type, body)."""
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, value in fields.items():
+        chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n'
+                      f'Content-Type: application/json\r\n\r\n'.encode()
+                      + json.dumps(value, ensure_ascii=False).encode("utf-8") + b"\r\n")
+    for field, path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                      f'filename="{os.path.basename(path)}"\r\n'
+                      f'Content-Type: application/octet-stream\r\n\r\n'.encode("utf-8") + data + b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}", b"".join(chunks)
+
+def submit_report(base_url, files, title=None, figures=None, options=None, user=None,
+                  wait=True, poll_s=1.0, timeout_s=3600):
+    """
+    POST a job and (with `wait`) poll until it is done. Returns the final status dict;
+    download the result from f"{base_url}/jobs/{status['id']}/result".
+    """
+    fields = {k: v for k, v in (("title", title), ("figures", figures), ("options", options)) if v}
+    ctype, body = encode_multipart(files, fields)
+    req = urllib.request.Request(f"{base_url}/jobs", data=body, method="POST",
+                                 headers={"Content-Type": ctype, **({"X-User": user} if user else {})})
+    with urllib.request.urlopen(req) as resp:
+        status = json.load(resp)
+    deadline = time.monotonic() + timeout_s
+    while wait and status["state"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(poll_s)
+        with urllib.request.urlopen(f"{base_url}/jobs/{status['id']}") as resp:
+            status = json.load(resp)
+    return status
+
+def main():
+    ap = argparse.ArgumentParser(description="HTTP job API for the lab report pipeline")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--jobs-dir", default=JOBS_DIR)
+    ap.add_argument("--max-jobs", type=int, default=2, help="reports running at the same time")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    pool = shared_pool().start()  # workers start and warm up now, not on the first job
+    server = make_server(args.host, args.port, args.jobs_dir, args.max_jobs, pool)
+    logger.info(f"Listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.store.shutdown()
+
+if __name__ == "__main__":
+    main()
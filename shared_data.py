@@ -0,0 +1,143 @@
+"""
+Series dicts in shared memory, for handing parsed data between processes without copying.
+
+SharedSeries holds one series dict ({BH: {"Z", "depths", "elevs", <keys>...}}) as a single
+float64 matrix (one row per key, one column per sample, boreholes back to back) in a file
+under /dev/shm. It behaves like the dict it replaces – `series[bh]["depths"]`, `.items()`,
+`in`, `len` – but every value is a read-only NumPy view into the mapped file.
+
+Pickling a SharedSeries sends only the file name, the borehole names and their offsets, so
+passing it to a worker process (workers.shared_pool(), pagination) costs the same for 10 or
+10 000 samples, and every process maps the same physical pages instead of holding a copy.
+Missing values (None) are stored as NaN.
+
+The file is removed with `unlink()`; easiest is to create the series in a directory that
+is cleaned up afterwards, e.g. tempfile.TemporaryDirectory(dir=SHM_DIR).
+"""
+import os
+import tempfile
+import uuid
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+AXIS_KEYS = ("depths", "elevs")
+
+class SharedSeries(Mapping):
+    def __init__(self, path, names, z, starts, stops, keys, nrows):
+        self.path = path
+        self.names = list(names)
+        self.z = np.asarray(z, dtype=float)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.keys_ = tuple(keys)
+        self.nrows = int(nrows)
+        self._pos = {bh: i for i, bh in enumerate(self.names)}
+        self._matrix = None
+
+    @classmethod
+    def from_series(cls, series, directory=SHM_DIR):
+        """Write a series dict (or another SharedSeries) to a new shared file."""
+        names = list(series)
+        keys = list(AXIS_KEYS)
+        for bh in names:
+            for k, v in series[bh].items():
+                if k != "Z" and k not in keys and isinstance(v, (list, tuple, np.ndarray)):
+                    keys.append(k)
+
+        lengths = np.array([len(series[bh].get("depths", [])) for bh in names], dtype=np.int64)
+        stops = np.cumsum(lengths)
+        starts = stops - lengths
+        nrows = int(stops[-1]) if len(stops) else 0
+
+        path = os.path.join(directory, f"grunn_{uuid.uuid4().hex}.f64")
+        m = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(len(keys), nrows))
+        for i, bh in enumerate(names):
+            data, a, b = series[bh], starts[i], stops[i]
+            for j, k in enumerate(keys):
+                if k in data:
+                    m[j, a:b] = np.asarray(data[k], dtype=float)  # None -> NaN
+                else:
+                    m[j, a:b] = np.nan
+        m.flush()
+        del m
+        return cls(path, names, [series[bh]["Z"] for bh in names], starts, stops, keys, nrows)
+
+    def _data(self):
+        if self._matrix is None:
+            self._matrix = np.load(self.path, mmap_mode="r")
+        return self._matrix
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_matrix"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __getitem__(self, bh):
+        i = self._pos[bh]
+        a, b = self.starts[i], self.stops[i]
+        m = self._data()
+        out = {"Z": float(self.z[i])}
+        for j, k in enumerate(self.keys_):
+            out[k] = m[j, a:b]
+        return out
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, bh):
+        return bh in self._pos
+
+    def subset(self, boreholes):
+        """The same shared file seen through fewer boreholes (nothing is copied)."""
+        keep = set(boreholes)
+        idx = [i for i, bh in enumerate(self.names) if bh in keep]
+        return SharedSeries(self.path, [self.names[i] for i in idx], self.z[idx],
+                            self.starts[idx], self.stops[idx], self.keys_, self.nrows)
+
+    def frame(self, keys):
+        """Long frame Borhull | Dybde | Kote | Z | <keys>, as derived.series_to_frame()."""
+        m = self._data()
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(self.starts, self.stops)]) \
+            if self.names else np.empty(0, dtype=np.int64)
+        lengths = self.stops - self.starts
+        col = {k: j for j, k in enumerate(self.keys_)}
+        out = {
+            "Borhull": np.repeat(np.array(self.names, dtype=object), lengths),
+            "Dybde": m[col["depths"], rows],
+            "Kote": m[col["elevs"], rows],
+            "Z": np.repeat(self.z, lengths),
+        }
+        for k in keys:
+            out[k] = m[col[k], rows] if k in col else np.full(len(rows), np.nan)
+        return pd.DataFrame(out)
+
+    @property
+    def nbytes(self):
+        return len(self.keys_) * self.nrows * 8
+
+    def unlink(self):
+        """Remove the shared file. Processes that already mapped it keep their view."""
+        self._matrix = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def share(series, directory=SHM_DIR):
+    """SharedSeries for a series dict; an empty dict stays an empty dict."""
+    if not series or isinstance(series, SharedSeries):
+        return series
+    return SharedSeries.from_series(series, directory)
+
+def ingest_shared(builder, directory, *args, **kwargs):
+    """Run a build_*_series function and hand the result back as a SharedSeries (for workers)."""
+    return share(builder(*args, **kwargs), directory)
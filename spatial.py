@@ -0,0 +1,152 @@
+"""
+Spatial index over borehole coordinates.
+
+BoreholeIndex buckets the boreholes in a uniform grid (cell ids sorted once, CSR-style
+offsets per cell), so radius, nearest-k, polygon and alignment-corridor queries only look
+at the points in the cells they overlap.
+"""
+import numpy as np
+from matplotlib.path import Path
+
+def project_on_polyline(polyline, x, y):
+    """
+    Station (chainage along the polyline) and signed offset (left positive) for each point.
+    Vectorised over points × segments.
+    """
+    line = np.asarray(polyline, dtype=float)
+    p = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+    a, b = line[:-1], line[1:]
+    ab = b - a
+    seg_len = np.hypot(ab[:, 0], ab[:, 1])
+    cum = np.concatenate([[0.0], np.cumsum(seg_len)])[:-1]
+
+    ap = p[:, None, :] - a[None, :, :]
+    len2 = np.where(seg_len > 0, seg_len ** 2, 1.0)
+    t = np.clip((ap * ab[None]).sum(axis=2) / len2, 0.0, 1.0)
+    foot = a[None] + t[..., None] * ab[None]
+    dist = np.hypot(p[:, None, 0] - foot[..., 0], p[:, None, 1] - foot[..., 1])
+
+    seg = np.argmin(dist, axis=1)
+    rows = np.arange(len(p))
+    station = cum[seg] + t[rows, seg] * seg_len[seg]
+    cross = ab[seg, 0] * ap[rows, seg, 1] - ab[seg, 1] * ap[rows, seg, 0]
+    offset = np.sign(cross) * dist[rows, seg]
+    return station, offset
+
+class BoreholeIndex:
+    """Grid index over borehole X/Y. Boreholes without coordinates are left out."""
+
+    def __init__(self, names, x, y, cell_size=None):
+        names = np.asarray(names, dtype=object)
+        xy = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+        ok = np.isfinite(xy).all(axis=1)
+        self.names, self.xy = names[ok], xy[ok]
+        self._pos = {bh: i for i, bh in enumerate(self.names)}
+
+        n = len(self.xy)
+        if n == 0:
+            self.origin, self.cell, self.ncols, self.nrows = np.zeros(2), 1.0, 1, 1
+            self.order, self.offsets = np.empty(0, dtype=np.int64), np.zeros(2, dtype=np.int64)
+            return
+
+        lo, hi = self.xy.min(axis=0), self.xy.max(axis=0)
+        extent = np.maximum(hi - lo, 1e-9)
+        if cell_size is None:
+            # ~2 points per cell on an evenly spread site
+            cell_size = max(float(np.sqrt(extent[0] * extent[1] * 2.0 / n)), float(extent.max()) / 1024, 1e-6)
+        self.origin, self.cell = lo, float(cell_size)
+        ij = np.floor((self.xy - lo) / self.cell).astype(np.int64)
+        self.ncols, self.nrows = int(ij[:, 0].max()) + 1, int(ij[:, 1].max()) + 1
+
+        cell_id = ij[:, 1] * self.ncols + ij[:, 0]
+        self.order = np.argsort(cell_id, kind="stable")
+        self.offsets = np.searchsorted(cell_id[self.order], np.arange(self.ncols * self.nrows + 1))
+
+    @classmethod
+    def from_terrain(cls, terrain_df, cell_size=None):
+        """Build from build_data.read_terrain_table() output (needs X and Y columns)."""
+        if "X" not in terrain_df or "Y" not in terrain_df:
+            return cls([], [], [])
+        return cls(terrain_df["BH"].astype(str), terrain_df["X"], terrain_df["Y"], cell_size)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, bh):
+        return bh in self._pos
+
+    def coords(self, bh):
+        return tuple(self.xy[self._pos[bh]])
+
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        """Indices of points in the grid cells overlapping the box. Cells in a row are contiguous."""
+        if not len(self.xy):
+            return np.empty(0, dtype=np.int64)
+        c0, r0 = np.floor((np.array([xmin, ymin]) - self.origin) / self.cell).astype(np.int64)
+        c1, r1 = np.floor((np.array([xmax, ymax]) - self.origin) / self.cell).astype(np.int64)
+        c0, c1 = max(c0, 0), min(c1, self.ncols - 1)
+        r0, r1 = max(r0, 0), min(r1, self.nrows - 1)
+        if c0 > c1 or r0 > r1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1) * self.ncols
+        starts, stops = self.offsets[rows + c0], self.offsets[rows + c1 + 1]
+        return np.concatenate([self.order[a:b] for a, b in zip(starts, stops)])
+
+    def radius(self, x, y, r):
+        """Boreholes within distance `r` of (x, y), nearest first."""
+        idx = self._candidates(x - r, y - r, x + r, y + r)
+        d = np.hypot(self.xy[idx, 0] - x, self.xy[idx, 1] - y)
+        keep = d <= r
+        idx, d = idx[keep], d[keep]
+        return self.names[idx[np.argsort(d, kind="stable")]]
+
+    def nearest(self, x, y, k=1):
+        """The `k` boreholes nearest to (x, y), nearest first. Grows the search box until settled."""
+        k = min(int(k), len(self.xy))
+        if k <= 0:
+            return self.names[:0]
+        r = self.cell
+        while True:
+            idx = self._candidates(x - r, y - r, x + r, y + r)
+            if len(idx) >= k:
+                d = np.hypot(self.xy[idx, 0] - x, self.xy[idx, 1] - y)
+                part = np.argsort(d, kind="stable")[:k]
+                # Any point closer than the k-th must lie inside the box once d_k <= r
+                if d[part[-1]] <= r or len(idx) == len(self.xy):
+                    return self.names[idx[part]]
+            r *= 2.0
+
+    def polygon(self, vertices):
+        """Boreholes inside the polygon [(x, y), ...]."""
+        v = np.asarray(vertices, dtype=float)
+        lo, hi = v.min(axis=0), v.max(axis=0)
+        idx = self._candidates(lo[0], lo[1], hi[0], hi[1])
+        inside = Path(v).contains_points(self.xy[idx], radius=1e-9)
+        return self.names[np.sort(idx[inside])]
+
+    def corridor(self, polyline, start=None, end=None, half_width=50.0):
+        """
+        Boreholes within `half_width` of an alignment polyline, optionally only between
+        chainage `start` and `end`. Returns (names, stations, offsets) sorted by station.
+        """
+        line = np.asarray(polyline, dtype=float)
+        lo, hi = line.min(axis=0) - half_width, line.max(axis=0) + half_width
+        idx = self._candidates(lo[0], lo[1], hi[0], hi[1])
+        station, offset = project_on_polyline(line, self.xy[idx, 0], self.xy[idx, 1])
+        keep = np.abs(offset) <= half_width
+        if start is not None:
+            keep &= station >= start
+        if end is not None:
+            keep &= station <= end
+        idx, station, offset = idx[keep], station[keep], offset[keep]
+        order = np.argsort(station, kind="stable")
+        return self.names[idx[order]], station[order], offset[order]
+
+def select_series(series, boreholes):
+    """Subset a series dict to `boreholes` (None = keep all)."""
+    if boreholes is None:
+        return series
+    if hasattr(series, "subset"):  # shared_data.SharedSeries: stay in shared memory
+        return series.subset(boreholes)
+    keep = set(boreholes)
+    return {bh: data for bh, data in series.items() if bh in keep}
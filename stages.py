@@ -0,0 +1,188 @@
+"""
+Stage graph for the report pipeline.
+
+A report is a set of stages (parse konus, compute Ip/IL, export the table, render C1, ...)
+that each declare which stages they read from. `run_stages()` starts a stage as soon as
+all its inputs are done, on a small thread pool – the heavy work inside a stage is sent
+to the worker pool – so C1 renders while konus is still being parsed, instead of waiting
+for its turn in a fixed sequence.
+
+Every stage gets a key: a hash over its name, its params (everything besides the inputs
+that decides the result: file digests, ranges, title block, ...) and its inputs' keys.
+Give run_stages the same `memo` dict again and a stage whose key is unchanged is skipped,
+reusing the previous result, as long as `valid(result)` still holds (e.g. the PDF or the
+shared-memory file is still there).
+
+StageRun keeps start and finish time per stage and the critical path: the chain that ends
+with the last stage to finish, following at each stage the input that finished last.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from instrumentation import span
+from render_cache import params_digest
+
+class Stage:
+    """
+    `fn(*input results)` computes the stage. `release(old result)` is called when a memoised
+    result is replaced by a new one (e.g. to unlink a shared-memory file).
+    """
+
+    def __init__(self, name, fn, inputs=(), params=None, valid=None, release=None):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.params = params
+        self.valid = valid
+        self.release = release
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={list(self.inputs)})"
+
+def topological_order(stages):
+    """Stage names with every stage after its inputs. Raises ValueError on unknown inputs or cycles."""
+    by_name = {}
+    for s in stages:
+        if s.name in by_name:
+            raise ValueError(f"duplicate stage '{s.name}'")
+        by_name[s.name] = s
+    for s in stages:
+        missing = [i for i in s.inputs if i not in by_name]
+        if missing:
+            raise ValueError(f"stage '{s.name}' reads unknown stage(s) {missing}")
+
+    order, state = [], {}
+    for s in stages:
+        stack = [(s.name, iter(by_name[s.name].inputs))]
+        if state.get(s.name):
+            continue
+        state[s.name] = "open"
+        while stack:
+            name, deps = stack[-1]
+            dep = next(deps, None)
+            if dep is None:
+                stack.pop()
+                state[name] = "done"
+                order.append(name)
+            elif state.get(dep) == "open":
+                raise ValueError(f"stage cycle through '{dep}'")
+            elif dep not in state:
+                state[dep] = "open"
+                stack.append((dep, iter(by_name[dep].inputs)))
+    return order
+
+class StageRun:
+    """Outcome of run_stages: results, status ("done" | "skipped" | "failed" | "cancelled"), timings."""
+
+    def __init__(self, stages):
+        self.stages = {s.name: s for s in stages}
+        self.results, self.keys, self.status, self.errors = {}, {}, {}, {}
+        self.started, self.finished = {}, {}
+
+    def ok(self, name):
+        return self.status.get(name) in ("done", "skipped")
+
+    def get(self, name, default=None):
+        return self.results[name] if self.ok(name) else default
+
+    def raise_first_error(self):
+        for name, error in self.errors.items():
+            raise error
+
+    def _waited_on(self, name):
+        """The input that finished last, i.e. the one this stage actually waited for."""
+        inputs = [i for i in self.stages[name].inputs if i in self.finished]
+        return max(inputs, key=self.finished.get) if inputs else None
+
+    def critical_path(self):
+        """Stage names from the first to the last to finish along the longest wait chain."""
+        if not self.finished:
+            return []
+        name = max(self.finished, key=self.finished.get)
+        path = []
+        while name is not None:
+            path.append(name)
+            name = self._waited_on(name)
+        return path[::-1]
+
+    def table(self):
+        """Steg | Status | Start (s) | Slutt (s) | Tid (s) | Venter på | Kritisk"""
+        critical = set(self.critical_path())
+        rows = []
+        for name in self.stages:
+            start, end = self.started.get(name), self.finished.get(name)
+            rows.append({
+                "Steg": name, "Status": self.status.get(name, ""),
+                "Start (s)": start, "Slutt (s)": end,
+                "Tid (s)": end - start if start is not None and end is not None else None,
+                "Venter på": self._waited_on(name) or "", "Kritisk": name in critical,
+            })
+        df = pd.DataFrame(rows, columns=["Steg", "Status", "Start (s)", "Slutt (s)", "Tid (s)", "Venter på", "Kritisk"])
+        return df.sort_values("Start (s)", ignore_index=True)
+
+def _run_stage(stage, args):
+    with span(f"stage.{stage.name}"):
+        return stage.fn(*args)
+
+def run_stages(stages, memo=None, on_wait=None, poll_s=0.25, max_threads=8):
+    """
+    Run `stages` as soon as their inputs are done. A failed stage cancels everything that
+    reads from it; the others carry on. `on_wait(running stage names)` is called from this
+    thread while waiting (Streamlit elements may only be touched from the script thread).
+    `memo` ({name: (key, result)}) is read for skipping and updated with the new results.
+    """
+    order = topological_order(stages)
+    run = StageRun(stages)
+    pending = list(order)
+    running = {}  # future -> name
+    t0 = time.perf_counter()
+
+    with ThreadPoolExecutor(max_threads, thread_name_prefix="stage") as executor:
+        while pending or running:
+            for name in list(pending):
+                stage = run.stages[name]
+                if any(i not in run.status for i in stage.inputs):
+                    continue
+                pending.remove(name)
+                now = time.perf_counter() - t0
+                if not all(run.ok(i) for i in stage.inputs):
+                    run.status[name] = "cancelled"
+                    continue
+                key = params_digest(name, stage.params, [run.keys[i] for i in stage.inputs])
+                run.keys[name] = key
+                previous = memo.get(name) if memo is not None else None
+                if previous and previous[0] == key and (stage.valid is None or stage.valid(previous[1])):
+                    run.results[name] = previous[1]
+                    run.status[name] = "skipped"
+                    run.started[name] = run.finished[name] = now
+                    continue
+                run.started[name] = now
+                future = executor.submit(contextvars.copy_context().run, _run_stage, stage,
+                                         [run.results[i] for i in stage.inputs])
+                running[future] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, timeout=poll_s, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                run.finished[name] = time.perf_counter() - t0
+                try:
+                    run.results[name] = future.result()
+                except Exception as e:
+                    run.status[name] = "failed"
+                    run.errors[name] = e
+                    continue
+                run.status[name] = "done"
+                if memo is not None:
+                    previous = memo.get(name)
+                    memo[name] = (run.keys[name], run.results[name])
+                    stage = run.stages[name]
+                    if previous is not None and stage.release and previous[1] is not run.results[name]:
+                        stage.release(previous[1])
+            if not done and on_wait:
+                on_wait(sorted(running.values()))
+    return run
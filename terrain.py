@@ -0,0 +1,228 @@
+"""
+Terrain levels sampled from a local elevation grid (DEM).
+
+Instead of typing Z for every borehole into the terrain table, the table can give only
+BH with X/Y, and Z is read from a terrain model on disk:
+
+  - ESRI ASCII grid (.asc): converted once to a float32 .npy in DEM_CACHE_DIR (keyed on
+    the file contents, streamed row by row), which is then memory-mapped;
+  - GeoTIFF (.tif/.tiff, needs `tifffile`): memory-mapped in place when the raster is
+    stored uncompressed, otherwise converted to the same .npy cache first, one decoded
+    tile or strip at a time.
+
+DemGrid.sample() interpolates bilinearly between cell centres for all points in one
+vectorised call. Only the grid cells around the boreholes are read, so a large tile is
+never loaded into RAM. Neighbour cells with NODATA (compared in the grid's own dtype, so
+float32 grids match a NODATA value written in double precision) are left out of the
+weights; points outside the grid, or with only NODATA around them, get NaN.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from build_data import read_terrain_table
+from instrumentation import span, log_event
+from render_cache import file_digest
+
+try:
+    import tifffile
+except ImportError:  # optional, only for GeoTIFF
+    tifffile = None
+
+DEM_CACHE_DIR = os.environ.get("GRUNN_DEM_CACHE", os.path.join(tempfile.gettempdir(), "grunn_dem_cache"))
+ASCII_EXTENSIONS = (".asc", ".txt")
+TIFF_EXTENSIONS = (".tif", ".tiff")
+
+def _nodata_as(value, dtype):
+    """NODATA `value` in the grid's dtype, or None if no cell of that dtype can hold it."""
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.floating):
+        return dtype.type(value)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        if float(value).is_integer() and info.min <= value <= info.max:
+            return dtype.type(int(value))
+    return None
+
+class DemGrid:
+    """
+    A north-up raster: `data[row, col]` with row 0 at the top, the upper left corner of
+    the grid at (x0, y0) and cells of `dx` × `dy` metres.
+    """
+
+    def __init__(self, data, x0, y0, dx, dy=None, nodata=None):
+        self.data = data
+        self.x0, self.y0 = float(x0), float(y0)
+        self.dx = float(dx)
+        self.dy = float(dy if dy is not None else dx)
+        self.nodata = nodata
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def extent(self):
+        """(xmin, ymin, xmax, ymax) of the grid."""
+        nrows, ncols = self.shape
+        return self.x0, self.y0 - nrows * self.dy, self.x0 + ncols * self.dx, self.y0
+
+    def sample(self, x, y):
+        """Bilinearly interpolated elevation at each (x, y); NaN outside the grid."""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        nrows, ncols = self.shape
+        out = np.full(x.shape, np.nan)
+
+        # Position in cell-centre units, clamped to the outermost centres at the edges
+        fc = (x - self.x0) / self.dx - 0.5
+        fr = (self.y0 - y) / self.dy - 0.5
+        inside = (fc >= -0.5) & (fc <= ncols - 0.5) & (fr >= -0.5) & (fr <= nrows - 0.5)
+        if not inside.any():
+            return out
+        fc = np.clip(fc[inside], 0, ncols - 1)
+        fr = np.clip(fr[inside], 0, nrows - 1)
+        c0 = np.minimum(np.floor(fc).astype(np.int64), max(ncols - 2, 0))
+        r0 = np.minimum(np.floor(fr).astype(np.int64), max(nrows - 2, 0))
+        c1 = np.minimum(c0 + 1, ncols - 1)
+        r1 = np.minimum(r0 + 1, nrows - 1)
+        tc, tr = fc - c0, fr - r0
+
+        raw = np.stack([self.data[r0, c0], self.data[r0, c1], self.data[r1, c0], self.data[r1, c1]])
+        values = raw.astype(float)
+        weights = np.stack([(1 - tr) * (1 - tc), (1 - tr) * tc, tr * (1 - tc), tr * tc])
+        valid = np.isfinite(values)
+        nodata = _nodata_as(self.nodata, raw.dtype) if self.nodata is not None else None
+        if nodata is not None:
+            valid &= raw != nodata
+        weights = np.where(valid, weights, 0.0)
+        total = weights.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = (np.where(valid, values, 0.0) * weights).sum(axis=0) / total
+        out[inside] = np.where(total > 0, z, np.nan)
+        return out
+
+def _cache_path(path, directory):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{file_digest(path)}.npy")
+
+def _read_ascii_header(f):
+    header = {}
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        parts = line.split()
+        if len(parts) != 2 or parts[0][0].isdigit() or parts[0][0] in "+-.":
+            f.seek(pos)
+            return header
+        header[parts[0].lower()] = float(parts[1])
+
+def read_ascii_grid(path, cache_dir=DEM_CACHE_DIR):
+    """DemGrid for an ESRI ASCII grid, memory-mapped from its .npy conversion."""
+    with open(path, "r") as f:
+        h = _read_ascii_header(f)
+        nrows, ncols, cell = int(h["nrows"]), int(h["ncols"]), h["cellsize"]
+        x0 = h["xllcorner"] if "xllcorner" in h else h["xllcenter"] - cell / 2
+        yll = h["yllcorner"] if "yllcorner" in h else h["yllcenter"] - cell / 2
+        npy = _cache_path(path, cache_dir)
+        if not os.path.exists(npy):
+            with span("dem.convert", file=os.path.basename(path)) as counts:
+                tmp = f"{npy}.{os.getpid()}.tmp"
+                m = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(nrows, ncols))
+                flat = m.reshape(-1)
+                pos = 0
+                for line in f:  # rows may be wrapped over several lines
+                    vals = np.array(line.split(), dtype=np.float32)
+                    flat[pos:pos + len(vals)] = vals[:len(flat) - pos]
+                    pos += len(vals)
+                if pos < flat.size:
+                    raise ValueError(f"{os.path.basename(path)}: {pos} values, expected {flat.size}")
+                m.flush()
+                del m, flat
+                os.replace(tmp, npy)
+                counts["rows"] = nrows
+    return DemGrid(np.load(npy, mmap_mode="r"), x0, yll + nrows * cell, cell, nodata=h.get("nodata_value"))
+
+def _convert_tiff(path, npy):
+    """Decode the first band of a tiled or compressed GeoTIFF segment by segment into a float32 .npy."""
+    with tifffile.TiffFile(path) as tif, span("dem.convert", file=os.path.basename(path)) as counts:
+        page = tif.pages[0]
+        nrows, ncols = page.imagelength, page.imagewidth
+        tmp = f"{npy}.{os.getpid()}.tmp"
+        m = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(nrows, ncols))
+        for segment, (sample, _, r, c, _), shape in page.segments():
+            if sample != 0:  # planar: other bands
+                continue
+            h, w = min(shape[1], nrows - r), min(shape[2], ncols - c)
+            m[r:r + h, c:c + w] = np.nan if segment is None else segment[0, :h, :w, 0]
+        m.flush()
+        del m
+        os.replace(tmp, npy)
+        counts["rows"] = nrows
+
+def read_geotiff(path, cache_dir=DEM_CACHE_DIR):
+    """DemGrid for a single-band, north-up GeoTIFF (pixel scale + tie point tags)."""
+    if tifffile is None:
+        raise ImportError("GeoTIFF terrain models need the 'tifffile' package")
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        tags = page.tags
+        sx, sy = tags["ModelPixelScaleTag"].value[:2]
+        i, j, _, x, y, _ = tags["ModelTiepointTag"].value[:6]
+        nodata = tags["GDAL_NODATA"].value if "GDAL_NODATA" in tags else None
+        contiguous = page.is_contiguous and page.compression == 1
+    nodata = float(str(nodata).strip("\x00 ")) if nodata not in (None, "") else None
+    if contiguous:
+        data = tifffile.memmap(path, mode="r")
+    else:
+        npy = _cache_path(path, cache_dir)
+        if not os.path.exists(npy):
+            _convert_tiff(path, npy)
+        data = np.load(npy, mmap_mode="r")
+    if data.ndim == 3:  # (rows, cols, bands): first band
+        data = data[:, :, 0]
+    return DemGrid(data, x - i * sx, y + j * sy, sx, sy, nodata=nodata)
+
+def read_dem(path, cache_dir=DEM_CACHE_DIR):
+    """DemGrid for an ASCII grid or a GeoTIFF, chosen by the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TIFF_EXTENSIONS:
+        return read_geotiff(path, cache_dir)
+    if ext in ASCII_EXTENSIONS:
+        return read_ascii_grid(path, cache_dir)
+    raise ValueError(f"Unknown terrain model format '{ext}' (use .asc or .tif)")
+
+def terrain_from_dem(terrain_df, dem, overwrite=False):
+    """
+    Fill Z in a terrain table (BH | Z | X | Y, see build_data.read_terrain_table) from the
+    DEM: boreholes without Z, or all boreholes with `overwrite`. Adds "Z-kilde"
+    ("tabell" / "terrengmodell"); rows still without Z are dropped with a warning.
+    """
+    df = terrain_df.copy()
+    if "Z" not in df:
+        df["Z"] = np.nan
+    df["Z-kilde"] = np.where(df["Z"].notna(), "tabell", "")
+    if "X" not in df or "Y" not in df:
+        log_event("⚠️ Terrain table has no X/Y columns, the terrain model is not used", level="warning")
+        return df.dropna(subset=["Z"]).reset_index(drop=True)
+
+    target = (df["Z"].isna() | overwrite) & df["X"].notna() & df["Y"].notna()
+    with span("dem.sample") as counts:
+        z = dem.sample(df.loc[target, "X"].to_numpy(), df.loc[target, "Y"].to_numpy())
+        counts["rows"] = int(target.sum())
+    hit = pd.Series(np.isfinite(z), index=df.index[target])
+    df.loc[hit.index[hit], "Z"] = z[hit.to_numpy()]
+    df.loc[hit.index[hit], "Z-kilde"] = "terrengmodell"
+
+    missing = df.loc[df["Z"].isna(), "BH"].tolist()
+    if missing:
+        log_event(f"⚠️ No terrain level (table or terrain model) for {', '.join(missing)}, skipping",
+                  level="warning")
+    return df.dropna(subset=["Z"]).reset_index(drop=True)
+
+def load_terrain(path, dem_path=None, overwrite=False):
+    """The terrain table, with Z filled from the terrain model at `dem_path` when given."""
+    if not dem_path:
+        return read_terrain_table(path)
+    return terrain_from_dem(read_terrain_table(path, require_z=False), read_dem(dem_path), overwrite)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic_data import generate_project  # noqa: E402
+
+@pytest.fixture(scope="session")
+def project(tmp_path_factory):
+    """Small synthetic project (3 boreholes × 6 samples), see benchmarks/synthetic_data.py."""
+    return generate_project(str(tmp_path_factory.mktemp("project")), n_boreholes=3, n_samples=6, seed=1)
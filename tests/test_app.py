@@ -0,0 +1,101 @@
+import os
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import render_cache  # noqa: E402
+import workers  # noqa: E402
+from workers import PoolBusy  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+class InlinePool:
+    """Stand-in for workers.shared_pool(): runs jobs at once; `busy` refuses jobs outside stage threads."""
+
+    def __init__(self):
+        self.busy = False
+        self.jobs = 0
+
+    def start(self):
+        return self
+
+    def submit(self, user, fn, *args, **kwargs):
+        if self.busy and not threading.current_thread().name.startswith("stage"):
+            raise PoolBusy("opptatt i testen")
+        self.jobs += 1
+        job = Future()
+        try:
+            job.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            job.set_exception(e)
+        return job
+
+    def admission_error(self):
+        return None
+
+    def stats(self):
+        return {"running": 0, "queued": 0, "users": 0, "workers": 0}
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(workers, "_shared", pool)
+    monkeypatch.setattr(render_cache, "_shared", render_cache.RenderCache(str(tmp_path / "cache")))
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    return at, pool
+
+def _upload(at, key, paths):
+    """Upload a list of files (multi-file uploaders) or a single path."""
+    one = isinstance(paths, str)
+    files = []
+    for path in [paths] if one else paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read(), "application/octet-stream"))
+    at.file_uploader(key=key).set_value(files[0] if one else files)
+    at.run()
+
+def _konus(project):
+    folder = project["folders"]["konus"]
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+
+def test_uploads_wait_for_terrain_then_parse_and_are_forgotten_when_removed(app, project):
+    at, pool = app
+    _upload(at, "upload_konus", _konus(project))
+    uploads = at.session_state["uploads"]
+    assert [(k[0], k[1], e["state"]) for k, e in uploads.items()] == [
+        ("konus", "BH-0001.xlsm", "waiting"), ("konus", "BH-0002.xlsm", "waiting"), ("konus", "BH-0003.xlsm", "waiting")]
+    assert pool.jobs == 0
+
+    _upload(at, "upload_terrain", project["terrain"])
+    at.run()  # the status fragment collects the finished parses
+    entries = list(at.session_state["uploads"].values())
+    assert [e["state"] for e in entries] == ["done"] * 3 and pool.jobs == 3
+    series = entries[0]["series"]
+    assert list(series) == ["BH-0001"] and series["BH-0001"]["Z"] == project["terrain_lookup"]["BH-0001"]
+    assert not at.exception
+
+    _upload(at, "upload_konus", _konus(project)[:1])
+    assert [k[1] for k in at.session_state["uploads"]] == ["BH-0001.xlsm"]
+    assert not os.path.exists(entries[1]["series"].path)  # the removed file's shared series is released
+    at.run()
+    assert pool.jobs == 3  # unchanged uploads are not parsed again
+
+def test_generate_parses_uploads_left_waiting_by_a_busy_pool(app, project):
+    at, pool = app
+    pool.busy = True
+    _upload(at, "upload_terrain", project["terrain"])
+    _upload(at, "upload_konus", _konus(project))
+    entries = list(at.session_state["uploads"].values())
+    assert {e["state"] for e in entries} == {"waiting"}
+    assert entries[0]["error"] == "Serveren er opptatt: opptatt i testen"
+
+    next(b for b in at.button if b.label == "Generate Reports").click().run()
+    assert not at.exception and not at.error
+    assert pool.jobs >= 3  # upload_result parsed the waiting files in the stage threads
+    labels = [d.proto.label for d in at.get("download_button")]
+    assert "Download C2 – Sensitivity PDF" in labels
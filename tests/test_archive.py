@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+import archive  # noqa: E402
+
+def _frame(n_boreholes=40, n_samples=100, seed=0):
+    rng = np.random.default_rng(seed)
+    bh = np.repeat([f"BH-{i:03d}" for i in range(n_boreholes)], n_samples)
+    depth = np.tile(np.linspace(0.5, 30.0, n_samples), n_boreholes)
+    z = np.repeat(rng.uniform(5.0, 30.0, n_boreholes), n_samples)
+    return pd.DataFrame({
+        "Borhull": bh, "Dybde": depth, "Kote": z - depth,
+        "Uforstyrret skjærstyrke konus": rng.uniform(5, 50, len(bh)),
+        "Omrørt skjærstyrke": rng.uniform(1, 5, len(bh)), "Sensitivitet": rng.uniform(2, 20, len(bh)),
+        "Vanninnhold (%)": rng.uniform(20, 60, len(bh)),
+    })
+
+@pytest.fixture
+def archived(tmp_path):
+    frames = {f"P{i}": _frame(seed=i) for i in range(3)}
+    for project, df in frames.items():
+        archive.archive_project(project, df, str(tmp_path))
+    return str(tmp_path), frames
+
+@pytest.mark.parametrize("query", [
+    {"depth": (2.0, 3.0)},
+    {"elevation": (20.0, 25.0)},
+    {"boreholes": ["BH-007"]},
+    {"boreholes": ["BH-007"], "depth": (10.0, 12.0)},
+])
+def test_filters_prune_row_groups_and_match_pandas(archived, query):
+    archive_dir, frames = archived
+    plan = archive.scan_plan("konus", archive_dir=archive_dir, **query)
+    assert plan["row_groups_read"] < plan["row_groups"]
+
+    got = archive.read_archive("konus", archive_dir=archive_dir, **query)
+    expected = 0
+    for df in frames.values():
+        mask = np.ones(len(df), dtype=bool)
+        if "boreholes" in query:
+            mask &= df["Borhull"].isin(query["boreholes"]).to_numpy()
+        for col, key in (("Dybde", "depth"), ("Kote", "elevation")):
+            if key in query:
+                lo, hi = query[key]
+                mask &= df[col].between(lo, hi).to_numpy()
+        expected += int(mask.sum())
+    assert len(got) == expected > 0
+
+def test_project_filter_skips_other_partitions(archived):
+    archive_dir, _ = archived
+    plan = archive.scan_plan("konus", projects=["P1"], archive_dir=archive_dir)
+    assert (plan["files"], plan["files_read"]) == (3, 1)
+
+def test_scan_plan_without_filters_and_outside_the_data(archived, tmp_path):
+    archive_dir, _ = archived
+    everything = archive.scan_plan("konus", archive_dir=archive_dir)
+    assert everything["files_read"] == everything["files"] == 3
+    assert everything["row_groups_read"] == everything["row_groups"] > 3
+    assert archive.scan_plan("konus", depth=(100.0, 200.0), archive_dir=archive_dir)["row_groups_read"] == 0
+    assert archive.scan_plan("konus", archive_dir=str(tmp_path / "tomt")) == {
+        "files": 0, "files_read": 0, "row_groups": 0, "row_groups_read": 0}
+
+def test_rearchiving_replaces_every_test_type(archived):
+    archive_dir, frames = archived
+    konus_only = frames["P1"][["Borhull", "Dybde", "Kote", "Sensitivitet"]]
+    assert archive.archive_project("P1", konus_only, archive_dir) == {"konus": len(konus_only)}
+    assert "P1" not in set(archive.read_archive("wc", archive_dir=archive_dir)["prosjekt"])
+    assert (archive.read_archive("konus", projects=["P1"], archive_dir=archive_dir)["Omrørt skjærstyrke"]
+            .isna().all())
+
+@pytest.mark.parametrize("name", ["a/../../escaped", "..", "a\\b", "x=y", " "])
+def test_rejects_project_names_outside_the_archive(tmp_path, name):
+    archive_dir = tmp_path / "arkiv"
+    with pytest.raises(ValueError):
+        archive.archive_project(name, _frame(2, 5), str(archive_dir))
+    assert not os.path.exists(tmp_path / "escaped")
+    assert archive.archived_projects(str(archive_dir)) == []
@@ -0,0 +1,39 @@
+import os
+import zipfile
+
+from bundle import build_zip_bundle
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+def test_stored_vs_deflated_and_skipped_entries(tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    paths = [
+        _write(tmp_path / "C1.pdf", b"%PDF" * 1000),
+        _write(tmp_path / "C1.png", b"png" * 1000),
+        _write(tmp_path / "tabell.xlsx", b"xlsx" * 1000),
+        _write(tmp_path / "notat.csv", b"a,b\n" * 1000),
+        _write(other / "C1.pdf", b"second copy"),  # same name: the first one wins
+        str(tmp_path / "missing.pdf"),
+        None,
+    ]
+    with build_zip_bundle(paths) as bundle:
+        zf = zipfile.ZipFile(bundle)
+        types = {info.filename: info.compress_type for info in zf.infolist()}
+        assert types == {"C1.pdf": zipfile.ZIP_STORED, "C1.png": zipfile.ZIP_STORED,
+                         "tabell.xlsx": zipfile.ZIP_STORED, "notat.csv": zipfile.ZIP_DEFLATED}
+        assert zf.read("C1.pdf") == b"%PDF" * 1000
+        assert zf.getinfo("notat.csv").compress_size < zf.getinfo("notat.csv").file_size
+
+    with build_zip_bundle(paths, include_png=False) as bundle:
+        assert "C1.png" not in zipfile.ZipFile(bundle).namelist()
+
+def test_large_bundle_rolls_over_to_disk(tmp_path):
+    path = _write(tmp_path / "stor.pdf", os.urandom(64 * 1024))
+    with build_zip_bundle([path], spool_max_bytes=16 * 1024) as bundle:
+        assert bundle._rolled
+        assert bundle.tell() == 0
+        assert zipfile.ZipFile(bundle).read("stor.pdf") == (tmp_path / "stor.pdf").read_bytes()
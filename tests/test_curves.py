@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from openpyxl import Workbook
+
+from curves import build_enaks_curves, decimate_curves, decimate_minmax
+
+def _workbook(path, rows, sheet="Rådata"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def test_long_layout_collects_non_contiguous_tests(tmp_path):
+    _workbook(tmp_path / "BH1.xlsx", [
+        ["Test", "Tøyning", "Spenning", "Dybde"],
+        ["T1", 0.0, 0.0, 4.0],
+        ["T2", 0.0, 0.0, 7.5],
+        ["T1", 1.0, 20.0, None],
+        [None, None, None, None],
+        ["T2", 1.0, 30.0, None],
+        ["T1", 2.0, "tekst", None],  # skipped, not a number
+        ["T1", 3.0, 25.0, None],
+    ])
+    curves = build_enaks_curves(str(tmp_path), {"BH1": 10.0}, {"depth_col": "D"})
+    bh = curves["BH1"]
+    assert bh["labels"] == ["T1", "T2"]
+    assert list(bh["depths"]) == [4.0, 7.5] and list(bh["elevs"]) == [6.0, 2.5]
+    assert list(bh["offsets"]) == [0, 3, 5]
+    assert list(bh["strain"]) == [0.0, 1.0, 3.0, 0.0, 1.0]
+    assert list(bh["stress"]) == [0.0, 20.0, 25.0, 0.0, 30.0]
+    assert bh["strain"].dtype == np.float32
+
+def test_pairs_layout_ends_each_pair_at_its_first_empty_row(tmp_path):
+    _workbook(tmp_path / "BH2.xlsx", [
+        [5.5, None, "Prøve B", None],
+        [0.0, 0.0, 0.0, 0.0],
+        [1.0, 10.0, 1.0, 12.0],
+        [2.0, 15.0, None, None],
+        [3.0, 14.0, 3.0, 99.0],  # pair B has ended
+    ])
+    curves = build_enaks_curves(str(tmp_path), {"BH2": 20.0}, {"layout": "pairs"})
+    bh = curves["BH2"]
+    assert bh["labels"] == ["5.5", "Prøve B"]
+    assert bh["depths"][0] == 5.5 and np.isnan(bh["depths"][1])
+    assert list(bh["offsets"]) == [0, 4, 6]
+    assert list(bh["stress"]) == [0.0, 10.0, 15.0, 14.0, 0.0, 12.0]
+
+def test_files_without_the_sheet_or_terrain_level_are_skipped(tmp_path):
+    _workbook(tmp_path / "BH1.xlsx", [["Test"], ["T1", 0.0, 1.0]], sheet="Sammendrag")
+    _workbook(tmp_path / "BH2.xlsx", [["Test"], ["T1", 0.0, 1.0]])
+    _workbook(tmp_path / "BH3.xlsx", [["Test"], ["T1", 0.0, 1.0]])
+    (tmp_path / "notes.txt").write_text("ikke en arbeidsbok")
+    curves = build_enaks_curves(str(tmp_path), {"BH1": 1.0, "BH3": 3.0})
+    assert list(curves) == ["BH3"]
+
+@pytest.fixture
+def long_and_short():
+    strain = np.linspace(0.0, 10.0, 1000)
+    stress = 50 * np.sin(strain / 4.0) + np.random.default_rng(0).normal(0, 0.5, 1000)
+    short = np.arange(20, dtype=float)
+    return {"BH1": {"Z": 10.0, "labels": ["lang", "kort"], "depths": np.array([3.0, 5.0]),
+                    "elevs": np.array([7.0, 5.0]), "offsets": np.array([0, 1000, 1020]),
+                    "strain": np.concatenate([strain, short]).astype(np.float32),
+                    "stress": np.concatenate([stress, short]).astype(np.float32)}}
+
+def test_decimation_keeps_ends_and_peak(long_and_short):
+    data = long_and_short["BH1"]
+    rows = decimate_minmax(data["stress"], data["offsets"], buckets=10)
+    assert np.all(np.diff(rows) > 0)
+    long_rows = rows[rows < 1000]
+    assert len(long_rows) <= 4 * 10
+    assert {0, 999, int(np.argmax(data["stress"][:1000]))} <= set(long_rows)
+    assert list(rows[rows >= 1000]) == list(range(1000, 1020))  # shorter than 4·buckets: whole
+
+def test_decimate_curves_rebuilds_offsets(long_and_short):
+    out = decimate_curves(long_and_short, buckets=10)["BH1"]
+    offsets = out["offsets"]
+    assert offsets[0] == 0 and offsets[-1] == len(out["strain"]) == len(out["stress"])
+    assert offsets[2] - offsets[1] == 20
+    first, peak = out["stress"][:offsets[1]], long_and_short["BH1"]["stress"][:1000]
+    assert first[0] == peak[0] and first[-1] == peak[-1] and first.max() == peak.max()
+    assert list(out["stress"][offsets[1]:]) == list(range(20))
+    assert out["labels"] == ["lang", "kort"]
+    assert decimate_minmax([], [0]).size == 0
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from depth_index import DepthIndex, project_window
+
+SERIES = {
+    "BH2": {"Z": 12.0, "depths": [3.0, 1.0, 2.0], "elevs": [9.0, 11.0, 10.0], "su": [30.0, 10.0, None]},
+    "BH1": {"Z": 10.0, "depths": [1.0, 2.0, 4.0, 8.0], "elevs": [9.0, 8.0, 6.0, 2.0], "su": [1.0, 2.0, 4.0, 8.0]},
+}
+
+@pytest.fixture
+def index():
+    return DepthIndex(SERIES)
+
+def test_window_along_depth_and_elevation(index):
+    assert len(index) == 7 and index.keys == ["su"]
+    hit = index.window(1.5, 3.0, axis="Dybde")
+    assert list(hit["Dybde"]) == [2.0, 2.0, 3.0]
+    assert sorted(zip(hit["Borhull"], hit["Dybde"])) == [("BH1", 2.0), ("BH2", 2.0), ("BH2", 3.0)]
+
+    hit = index.window(10.0, 6.0, axis="Kote")  # bounds in either order
+    assert list(hit["Kote"]) == [6.0, 8.0, 9.0, 9.0, 10.0]
+    assert list(index.window(None, 2.0, axis="Dybde", boreholes=["BH2", "BH9"])["Dybde"]) == [1.0, 2.0]
+    assert list(index.window(None, None, axis="Dybde", boreholes=["BH2"], key="su")["su"]) == [10.0, 30.0]
+
+def test_nearest_sample_per_borehole(index):
+    hit = index.nearest("BH1", [0.0, 2.9, 3.1, 20.0], max_distance=1.5)
+    assert list(hit["Avstand"]) == pytest.approx([1.0, 0.9, 0.9, 12.0])
+    assert list(hit["su"][:3]) == [1.0, 2.0, 4.0] and np.isnan(hit["su"][3])
+    assert np.isnan(index.nearest("BH9", 1.0)["Dybde"]).all()
+
+def test_layers_and_project_window(index):
+    table, groups = index.layers([0.0, 2.0, 5.0], "su")
+    assert list(table["n"]) == [2, 3]  # the missing value at 2 m is not counted
+    assert list(table["median"]) == [5.5, 4.0]
+    assert sorted(groups[1]) == [2.0, 4.0, 30.0]
+
+    window = project_window({"Konus": index}, 1.0, 2.0, axis="Dybde", boreholes=["BH1"])
+    assert list(window["Datasett"].unique()) == ["Konus"] and list(window["Dybde"]) == [1.0, 2.0]
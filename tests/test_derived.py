@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from derived import GAMMA_W, stress_at, stress_profile
+
+GAMMA = {
+    "BH1": {"Z": 10.0, "depths": [3.0, 1.0, 2.0], "elevs": [7.0, 9.0, 8.0], "unit weight": [20.0, 20.0, 20.0]},
+    "BH2": {"Z": 12.0, "depths": [2.0, 4.0, 5.0], "elevs": [10.0, 8.0, 7.0], "unit weight": [18.0, 20.0, None]},
+}
+
+def test_stress_profile_integrates_unit_weight_per_borehole():
+    df = stress_profile(GAMMA, gw_depth={"BH1": 1.0, "BH2": 3.0}).set_index(["Borhull", "Dybde"])
+    assert list(df.index) == [("BH1", 1.0), ("BH1", 2.0), ("BH1", 3.0), ("BH2", 2.0), ("BH2", 4.0)]
+    assert list(df["sigma_v"]) == pytest.approx([20.0, 40.0, 60.0, 36.0, 74.0])  # shallowest ɣ up to terrain
+    assert list(df["u"]) == pytest.approx([0.0, GAMMA_W, 2 * GAMMA_W, 0.0, GAMMA_W])
+    assert list(df["sigma_v_eff"]) == pytest.approx(list(df["sigma_v"] - df["u"]))
+
+def test_stress_at_interpolates_onto_other_samples():
+    profile = stress_profile(GAMMA, gw_depth=0.0)
+    frame = pd.DataFrame({"Borhull": ["BH1", "BH2", "BH3"], "Dybde": [1.5, 3.0, 2.0]})
+    out = stress_at(frame, profile, gw_depth=0.0, gamma_default=19.0)
+    assert list(out["sigma_v"]) == pytest.approx([30.0, 55.0, 38.0])
+    assert list(out["u"]) == pytest.approx([1.5 * GAMMA_W, 3.0 * GAMMA_W, 2.0 * GAMMA_W])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.figure import Figure
+
+from design_lines import design_sheet, design_statistics, line_values, t_quantile
+from plot_pdf import draw_design_lines
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    depth = np.tile(np.arange(1.0, 11.0), 3)
+    return pd.DataFrame({"Borhull": np.repeat(["BH1", "BH2", "BH3"], 10), "Dybde": depth,
+                         "Kote": 100.0 - depth, "Su": 10 + 2 * depth + rng.normal(0, 1, depth.size)})
+
+def test_design_sheet_labels_fractile(frame):
+    sheet = design_sheet({"Su": design_statistics(frame, "Su", fractile=0.05)})
+    fit = sheet[sheet["Type"].str.startswith("Robust")]
+    assert set(fit["Type"]) == {"Robust lineær tilpasning (5%-fraktil, mean, Student-t med n−2 frihetsgrader)"}
+    assert fit["k"].tolist() == pytest.approx([t_quantile(0.95, 28)] * 2)
+
+def test_design_sheet_without_fractile(frame):
+    sheet = design_sheet({"Su": design_statistics(frame, "Su", fractile=None)})
+    assert set(sheet["Type"]) == {"Robust lineær tilpasning", "Persentiler"}
+    assert set(sheet["Akse"]) == {"Dybde", "Kote"}
+
+@pytest.mark.parametrize("p, df, expected", [(0.95, 1, 6.3138), (0.95, 3, 2.3534), (0.95, 10, 1.8125),
+                                             (0.9, 5, 1.4759), (0.975, 30, 2.0423), (0.95, 5000, 1.6452)])
+def test_t_quantile_matches_tables(p, df, expected):
+    assert t_quantile(p, df) == pytest.approx(expected, abs=1e-4)
+
+def test_characteristic_line_uses_student_t():
+    fit = pd.Series({"n": 5, "intercept": 10.0, "slope": 1.0, "scale": 2.0, "x_mean": 0.0, "sxx": 10.0})
+    mean, char = line_values(fit, [0.0], fractile=0.05)
+    assert mean[0] - char[0] == pytest.approx(t_quantile(0.95, 3) * 2.0 * np.sqrt(1 / 5))
+    assert line_values(pd.Series({**fit, "n": 2}), [0.0], fractile=0.05)[1] is None  # no degrees of freedom left
+
+def test_design_lines_on_log_axes_skip_values_below_zero(frame):
+    design = design_statistics(frame.assign(Su=5.0 - frame["Dybde"]), "Su", fractile=0.05)
+    fig = Figure()
+    left, right = fig.add_subplot(121), fig.add_subplot(122)
+    for ax, col in ((left, "Dybde"), (right, "Kote")):
+        ax.set_xscale("log")
+        ax.set_ylim(frame[col].max(), frame[col].min())
+    draw_design_lines(left, right, design)
+    lines = [line for ax in (left, right) for line in ax.get_lines()
+             if line.get_label().startswith(("Robust", "Karakteristisk"))]
+    assert len(lines) == 4
+    for line in lines:
+        x = np.asarray(line.get_xdata(), dtype=float)
+        assert np.isfinite(x).any() and not (x[np.isfinite(x)] <= 0).any()
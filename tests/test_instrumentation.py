@@ -0,0 +1,55 @@
+import logging
+import threading
+
+import instrumentation
+from instrumentation import Recorder, current_recorder, log_event, profile, recording, span
+
+def test_spans_and_events_go_to_the_active_recorder(caplog):
+    with recording() as rec:
+        with span("parse", file="a.xlsx") as counts:
+            counts["rows"] = 10
+        with span("parse"):
+            pass
+        with caplog.at_level(logging.INFO, logger="grunn"):
+            log_event("⚠️ mangler Z", level="warning", file="a.xlsx")
+    assert current_recorder() is not rec
+    report = rec.report().set_index("Steg")
+    assert report.loc["parse", "Antall"] == 2 and report.loc["parse", "Rader"] == 10
+    assert rec.events_frame().to_dict(orient="records") == [
+        {"level": "warning", "message": "⚠️ mangler Z", "file": "a.xlsx"}]
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.WARNING, "⚠️ mangler Z")]
+
+def test_recording_is_per_thread_context():
+    seen = {}
+
+    def worker():
+        with recording() as rec:
+            with span("worker"):
+                pass
+            seen["worker"] = rec
+
+    with recording() as main:
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+        with span("main"):
+            pass
+    assert [s["name"] for s in main.spans] == ["main"]
+    assert [s["name"] for s in seen["worker"].spans] == ["worker"]
+
+def test_default_recorder_is_bounded():
+    default = current_recorder()
+    assert default.spans.maxlen == default.events.maxlen == instrumentation.DEFAULT_KEEP
+    for i in range(instrumentation.DEFAULT_KEEP + 5):
+        log_event(f"hendelse {i}")
+    assert len(default.events) == instrumentation.DEFAULT_KEEP
+    assert default.events[-1]["message"] == f"hendelse {instrumentation.DEFAULT_KEEP + 4}"
+    assert Recorder().events.maxlen is None
+
+def test_profile_capture():
+    with profile() as result:
+        sum(range(1000))
+    assert "function calls" in result["text"]
+    with profile(enabled=False) as result:
+        pass
+    assert result == {}
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+import pagination
+from pagination import export_paginated, group_by_area, group_by_count, group_by_prefix, split_groups
+
+BHS = ["06-376", "06-12", "07-1", "07-2", "07-3", "A"]
+
+def test_group_by_count_and_prefix():
+    assert group_by_count(BHS, per_page=4) == [("1", ["06-12", "06-376", "07-1", "07-2"]), ("2", ["07-3", "A"])]
+    assert group_by_count(BHS, per_page=0)[0] == ("1", ["06-12"])
+    assert group_by_prefix(BHS) == [("06", ["06-12", "06-376"]), ("07", ["07-1", "07-2", "07-3"]), ("A", ["A"])]
+    assert group_by_prefix(["a.b.c", "a.b.d", "a.c"], sep=".", parts=2) == [("a.b", ["a.b.c", "a.b.d"]),
+                                                                          ("a.c", ["a.c"])]
+
+def test_group_by_area_and_split_groups():
+    groups = group_by_area(BHS, {"06-12": "Nord", "07-1": "Sør", "07-2": np.nan})
+    assert groups == [("Nord", ["06-12"]), ("Sør", ["07-1"]), ("Øvrige", ["06-376", "07-2", "07-3", "A"])]
+    assert split_groups(groups, per_page=3) == [("Nord", ["06-12"]), ("Sør", ["07-1"]),
+                                                ("Øvrige-1", ["06-376", "07-2", "07-3"]), ("Øvrige-2", ["A"])]
+
+def _export(series, outfile_pdf=None, outfile_png=None, title_info=None):
+    """Stand-in for an export_*_pdf: one page naming the figure and its boreholes."""
+    fig = Figure()
+    fig.text(0.1, 0.5, f"{title_info['figur_nr']}: {', '.join(sorted(series))}")
+    if isinstance(outfile_pdf, PdfPages):
+        outfile_pdf.savefig(fig)
+    else:
+        fig.savefig(outfile_pdf)
+    if outfile_png:
+        fig.savefig(outfile_png)
+
+SERIES = {bh: {"Z": 1.0, "depths": [1.0], "elevs": [0.0]} for bh in ["06-12", "06-376", "07-1"]}
+
+@pytest.mark.parametrize("assemble", [True, False])
+def test_export_paginated_one_page_per_group(tmp_path, monkeypatch, assemble):
+    pypdf = pytest.importorskip("pypdf")
+    if not assemble:
+        monkeypatch.setattr(pagination, "PdfWriter", None)
+    out = tmp_path / "C2.pdf"
+    groups = group_by_prefix(BHS)  # the "A" group has no data and is skipped
+    with ThreadPoolExecutor(2) as pool:
+        pages = export_paginated(_export, (SERIES,), str(out), groups, outfile_png=str(tmp_path / "C2.png"),
+                                 title_info={"figur_nr": "C2"}, submit=pool.submit)
+    assert pages == [("06", "C2.1", str(tmp_path / "C2_1.png")), ("07", "C2.2", str(tmp_path / "C2_2.png"))]
+    reader = pypdf.PdfReader(str(out))
+    assert [page.extract_text().strip() for page in reader.pages] == ["C2.1: 06-12, 06-376", "C2.2: 07-1"]
+    assert (tmp_path / "C2_1.png").exists() and (tmp_path / "C2_2.png").exists()
+
+def test_export_paginated_single_group_keeps_figure_number(tmp_path):
+    out = tmp_path / "C2.pdf"
+    pages = export_paginated(_export, (SERIES,), str(out), [("alle", list(SERIES))], title_info={"figur_nr": "C2"})
+    assert pages == [("alle", "C2", None)] and out.stat().st_size > 0
@@ -0,0 +1,48 @@
+import numpy as np
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+
+from instrumentation import recording
+from plot_pdf import borehole_colors, draw_profile, export_wc_pdf, legend_handles, profile_points
+
+SERIES = {
+    "BH2": {"Z": 12.0, "depths": [1.0, 2.0], "elevs": [11.0, 10.0], "undist": [20.0, 25.0]},
+    "BH1": {"Z": 10.0, "depths": [3.0], "elevs": [7.0], "undist": [30.0]},
+    "BH3": {"Z": 8.0, "depths": [1.0], "elevs": [7.0], "undist": []},
+}
+
+def test_profile_points_flattens_all_boreholes_in_one_pass():
+    colors = borehole_colors(SERIES, {"BH0": {}})
+    assert list(colors) == ["BH0", "BH1", "BH2", "BH3"]
+    points = profile_points(SERIES, "undist", colors, markers={"BH1": "^"})
+    assert list(points["x"]) == [20.0, 25.0, 30.0]
+    assert list(points["depth"]) == [1.0, 2.0, 3.0]
+    assert list(points["elev"]) == [11.0, 10.0, 7.0]
+    assert list(points["marker"]) == ["o", "o", "^"]
+    assert np.allclose(points["color"], [to_rgba(colors["BH2"])] * 2 + [to_rgba(colors["BH1"])])
+    assert points["legend"] == [("BH2, 12.0 m", colors["BH2"], "o"), ("BH1, 10.0 m", colors["BH1"], "^")]
+
+    empty = profile_points({}, "undist", colors)
+    assert empty["x"].size == empty["elev"].size == 0 and empty["color"].shape == (0, 4)
+
+def test_draw_profile_one_collection_per_marker_and_axis():
+    colors = borehole_colors(SERIES)
+    points = profile_points(SERIES, "undist", colors, markers={"BH1": "^"})
+    fig = Figure()
+    left, right = fig.add_subplot(121), fig.add_subplot(122)
+    assert draw_profile(left, right, points) == 3
+    assert len(left.collections) == len(right.collections) == 2
+    assert [c.get_offsets().tolist() for c in left.collections] == [[[20.0, 1.0], [25.0, 2.0]], [[30.0, 3.0]]]
+    assert [c.get_offsets().tolist() for c in right.collections] == [[[20.0, 11.0], [25.0, 10.0]], [[30.0, 7.0]]]
+
+    handles, labels = legend_handles(points, points)
+    assert labels == ["BH2, 12.0 m", "BH1, 10.0 m"]  # first entry per label only
+    assert [h.get_marker() for h in handles] == ["s", "s"]
+    assert [h.get_marker() for h in legend_handles(points, marker=None)[0]] == ["o", "^"]
+
+def test_exporter_draws_every_point(tmp_path):
+    wc = {bh: {**data, "water content": data["undist"]} for bh, data in SERIES.items()}
+    with recording() as rec:
+        export_wc_pdf(wc, str(tmp_path / "C1.pdf"), title_info={"figur_nr": "C1"})
+    assert (tmp_path / "C1.pdf").stat().st_size > 0
+    assert [s["counts"] for s in rec.spans if s["name"] == "export_wc_pdf.draw"] == [{"points": 3}]
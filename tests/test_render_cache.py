@@ -0,0 +1,45 @@
+import os
+import zipfile
+
+import pytest
+
+from render_cache import RenderCache
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+@pytest.fixture
+def cache(tmp_path):
+    return RenderCache(str(tmp_path / "cache"))
+
+def test_hit_restores_requested_names(cache, tmp_path):
+    first = tmp_path / "first"
+    first.mkdir()
+    paths = [_write(first / "C1.pdf", b"pdf"), _write(first / "C1_1.png", b"p1"), _write(first / "C1_2.png", b"p2")]
+    cache.put("k", paths, str(first / "C1.png"))
+
+    second = tmp_path / "second"
+    second.mkdir()
+    out = cache.get("k", str(second / "rapport.pdf"), str(second / "forhand.png"))
+    assert out == [str(second / "rapport.pdf"), str(second / "forhand_1.png"), str(second / "forhand_2.png")]
+    assert [open(p, "rb").read() for p in out] == [b"pdf", b"p1", b"p2"]
+    assert sorted(os.listdir(first)) == ["C1.pdf", "C1_1.png", "C1_2.png"]
+
+def test_single_png_and_pdf_only(cache, tmp_path):
+    cache.put("k", [_write(tmp_path / "a.pdf", b"pdf"), _write(tmp_path / "a.png", b"png")], str(tmp_path / "a.png"))
+    assert cache.get("k", str(tmp_path / "b.pdf"), str(tmp_path / "b.png")) == [str(tmp_path / "b.pdf"),
+                                                                                 str(tmp_path / "b.png")]
+    cache.put("p", [_write(tmp_path / "c.pdf", b"pdf")])
+    assert cache.get("p", str(tmp_path / "d.pdf")) == [str(tmp_path / "d.pdf")]
+
+def test_empty_or_broken_entry_is_a_miss(cache, tmp_path):
+    with zipfile.ZipFile(os.path.join(cache.directory, "empty.zip"), "w"):
+        pass
+    assert cache.get("empty", str(tmp_path / "x.pdf")) is None
+    cache.put("nopdf", [str(tmp_path / "missing.pdf")])
+    assert cache.get("nopdf", str(tmp_path / "x.pdf")) is None
+    _write(os.path.join(cache.directory, "bad.zip"), b"not a zip")
+    assert cache.get("bad", str(tmp_path / "x.pdf")) is None
+    assert cache.get("absent", str(tmp_path / "x.pdf")) is None
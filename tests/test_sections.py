@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from sections import resample
+
+SERIES = {
+    "BH1": {"Z": 10.0, "depths": [1.0, 2.0, 6.0], "elevs": [9.0, 8.0, 4.0], "v": [1.0, 2.0, 6.0]},
+    "BH2": {"Z": 12.0, "depths": [3.0, 4.0, 5.0], "elevs": [9.0, 8.0, 7.0], "v": [30.0, None, 50.0]},
+}
+
+def _at(grid, bh, level):
+    return grid.column(bh, "v")[np.flatnonzero(np.isclose(grid.levels, level))[0]]
+
+def test_interpolates_within_a_borehole_and_masks_long_gaps():
+    grid = resample(SERIES, ["v"], axis="Dybde", step=0.5, max_gap=3.0)
+    assert grid.levels[0] == 1.0 and grid.levels[-1] == 6.0
+    assert _at(grid, "BH1", 1.5) == pytest.approx(1.5)
+    assert _at(grid, "BH1", 2.0) == 2.0
+    assert np.isnan(_at(grid, "BH1", 4.0))  # 4 m between the samples at 2 and 6 m
+    assert _at(grid, "BH1", 6.0) == 6.0
+    assert _at(grid, "BH2", 4.0) == pytest.approx(40.0)  # over the missing value
+    assert np.isnan(_at(grid, "BH2", 2.5)) and np.isnan(_at(grid, "BH2", 5.5))  # outside the samples
+
+    wide = resample(SERIES, ["v"], axis="Dybde", step=0.5, max_gap=5.0)
+    assert _at(wide, "BH1", 4.0) == pytest.approx(4.0)
+
+def test_elevation_axis_runs_top_down_and_sections_cut_the_grid():
+    grid = resample(SERIES, ["v"], axis="Kote", step=1.0, max_gap=3.0)
+    assert list(grid.levels) == [9.0, 8.0, 7.0, 6.0, 5.0, 4.0]
+    assert _at(grid, "BH2", 8.0) == pytest.approx(40.0)
+    cut = grid.section(["BH2", "missing", "BH1"], "v", coords={"BH1": (3.0, 4.0), "BH2": (0.0, 0.0)})
+    assert cut["boreholes"] == ["BH2", "BH1"]
+    assert list(cut["distance"]) == [0.0, 5.0] and cut["measured"]
+    assert cut["values"].shape == (6, 2)
@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import zipfile
+
+import pytest
+
+import server
+from pipeline import run_inline
+
+class InlinePool:
+    """Stand-in for workers.shared_pool(): runs every job in the calling thread."""
+
+    def submit(self, user, fn, *args, **kwargs):
+        return run_inline(fn, *args, **kwargs)
+
+    def admission_error(self):
+        return None
+
+    def stats(self):
+        return {"running": 0, "queued": 0, "users": 0, "workers": 0}
+
+@pytest.fixture
+def api(tmp_path):
+    httpd = server.make_server(port=0, jobs_dir=str(tmp_path / "jobs"), pool=InlinePool())
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", httpd.store
+    httpd.shutdown()
+    httpd.server_close()
+    httpd.store.shutdown()
+
+def _files(project):
+    files = [("terrain", project["terrain"])]
+    for kind in ("konus", "wc"):
+        folder = project["folders"][kind]
+        files += [(kind, os.path.join(folder, name)) for name in sorted(os.listdir(folder))]
+    return files
+
+def _options(project):
+    return {"ranges": project["ranges"], "png": False, "cache": False}
+
+def _post(base, files, fields):
+    ctype, body = server.encode_multipart(files, fields)
+    req = urllib.request.Request(f"{base}/jobs", data=body, method="POST", headers={"Content-Type": ctype})
+    with urllib.request.urlopen(req) as resp:
+        return resp.status, json.load(resp)
+
+def test_submit_status_result_and_resubmit(api, project):
+    base, store = api
+    fields = {"title": {"rapport_nr": "T-1"}, "options": _options(project)}
+    status = server.submit_report(base, _files(project), title=fields["title"], options=fields["options"], poll_s=0.05)
+    assert status["state"] == "done", status.get("error")
+    assert "grunnundersokelser.xlsx" in status["files"]
+
+    with urllib.request.urlopen(f"{base}/jobs/{status['id']}") as resp:
+        assert json.load(resp)["state"] == "done"
+    with urllib.request.urlopen(f"{base}/jobs/{status['id']}/result") as resp:
+        names = zipfile.ZipFile(io.BytesIO(resp.read())).namelist()
+    assert sorted(names) == sorted(status["files"])
+
+    # Same files and fields: the finished job is returned, not run again
+    code, again = _post(base, _files(project), fields)
+    assert code == 200
+    assert again["id"] == status["id"] and again["started"] == status["started"]
+    assert store.stats()["done"] == 1
+
+@pytest.mark.parametrize("options", [
+    {"dem_path": "/etc/passwd"},
+    {"archive_project": "x"},
+    {"archive_dir": "/tmp"},
+    {"png": "yes"},
+    {"ranges": {"depth": 5}},
+])
+def test_rejects_options_outside_the_api(api, project, options):
+    base, store = api
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _post(base, [("terrain", project["terrain"])], {"options": options})
+    assert err.value.code == 400
+    assert store.stats() == {"queued": 0, "running": 0, "done": 0, "failed": 0}
+
+def test_finished_jobs_are_evicted(api, project):
+    base, store = api
+    status = server.submit_report(base, _files(project), options=_options(project), poll_s=0.05)
+    assert status["state"] == "done", status.get("error")
+    job_dir = os.path.join(store.directory, status["id"])
+    assert store.evict(now=status["finished"] + 1) == []
+    assert store.evict(now=status["finished"] + store.ttl_s + 1) == [status["id"]]
+    assert not os.path.exists(job_dir)
+    with pytest.raises(urllib.error.HTTPError) as err:
+        urllib.request.urlopen(f"{base}/jobs/{status['id']}")
+    assert err.value.code == 404
+
+def test_keeps_at_most_max_finished_jobs(api, project):
+    base, store = api
+    store.max_finished = 1
+    ids = [server.submit_report(base, _files(project), title={"rapport_nr": str(i)}, options=_options(project),
+                                poll_s=0.05)["id"] for i in range(2)]
+    store.evict()
+    assert store.get(ids[0]) is None and store.get(ids[1]) is not None
+
+@pytest.mark.parametrize("names", [["..", "BH1.xlsm"], ["a/.", "BH1.xlsm"], ["dir/", "BH1.xlsm"],
+                                   ["BH1.xlsm", "other/BH1.xlsm"]])
+def test_rejects_bad_and_repeated_file_names(api, names):
+    base, store = api
+    parts = [("terrain", "terreng.xlsx", b"t")] + [("konus", name, b"k") for name in names]
+    with pytest.raises(ValueError):
+        store.submit(parts, "u")
+    assert os.listdir(store.directory) == []
+
+def test_bad_file_name_is_a_400(api):
+    base, store = api
+    body = b'--b\r\nContent-Disposition: form-data; name="terrain"; filename=".."\r\n\r\nx\r\n--b--\r\n'
+    req = urllib.request.Request(f"{base}/jobs", data=body, method="POST",
+                                 headers={"Content-Type": "multipart/form-data; boundary=b"})
+    with pytest.raises(urllib.error.HTTPError) as err:
+        urllib.request.urlopen(req)
+    assert err.value.code == 400
+    assert os.listdir(store.directory) == []
@@ -0,0 +1,48 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived import series_to_frame
+from shared_data import SharedSeries, ingest_shared, share
+from spatial import select_series
+
+SERIES = {
+    "BH1": {"Z": 10.0, "depths": [1.0, 2.0], "elevs": [9.0, 8.0], "undist": [20.0, None], "rows": [6, 7]},
+    "BH2": {"Z": 12.0, "depths": [3.0], "elevs": [9.0], "remould": [4.0], "rows": [6]},
+    "BH3": {"Z": 8.0, "depths": [], "elevs": []},
+}
+
+def test_round_trip_through_pickle(tmp_path):
+    shared = share(SERIES, tmp_path)
+    assert isinstance(shared, SharedSeries) and list(shared) == ["BH1", "BH2", "BH3"] and "BH2" in shared
+    assert shared.keys_ == ("depths", "elevs", "undist", "rows", "remould")
+    assert shared.nbytes == 5 * 3 * 8
+
+    copy = pickle.loads(pickle.dumps(shared))
+    assert copy._matrix is None and len(pickle.dumps(shared)) < 1000
+    bh1 = copy["BH1"]
+    assert bh1["Z"] == 10.0 and list(bh1["depths"]) == [1.0, 2.0] and list(bh1["rows"]) == [6.0, 7.0]
+    assert bh1["undist"][0] == 20.0 and np.isnan(bh1["undist"][1]) and np.isnan(bh1["remould"]).all()
+    assert not bh1["depths"].flags.writeable
+    assert len(copy["BH3"]["depths"]) == 0
+
+def test_frame_matches_series_to_frame(tmp_path):
+    shared = share(SERIES, tmp_path)
+    pd.testing.assert_frame_equal(series_to_frame(shared, ["undist", "remould", "missing"]),
+                                  series_to_frame(SERIES, ["undist", "remould", "missing"]))
+    sub = select_series(shared, ["BH2"])
+    assert isinstance(sub, SharedSeries) and sub.path == shared.path and list(sub) == ["BH2"]
+    assert sub.frame(["remould"])["remould"].tolist() == [4.0]
+
+def test_unlink_and_empty_series(tmp_path):
+    shared = ingest_shared(lambda: SERIES, tmp_path)
+    mapped = shared["BH1"]["depths"]
+    shared.unlink()
+    assert not os.path.exists(shared.path) and list(mapped) == [1.0, 2.0]  # existing views survive
+    shared.unlink()  # twice is fine
+    with pytest.raises(FileNotFoundError):
+        shared["BH1"]
+    assert share({}, tmp_path) == {} and os.listdir(tmp_path) == []
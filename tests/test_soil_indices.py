@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from openpyxl import Workbook
+
+from build_data import build_atterberg_series, build_gamma_series
+from derived import indices_to_series, soil_indices
+
+ATTERBERG = {
+    "BH1": {"Z": 10.0, "depths": [2.0, 1.0, 4.0], "elevs": [8.0, 9.0, 6.0],
+            "wp": [20.0, 18.0, 30.0], "wl": [40.0, 35.0, 30.0]},
+    "BH2": {"Z": 12.0, "depths": [1.0], "elevs": [11.0], "wp": [15.0], "wl": [30.0]},
+}
+WC = {
+    "BH1": {"Z": 10.0, "depths": [1.1, 2.5, 4.0], "elevs": [8.9, 7.5, 6.0], "water content": [26.5, 50.0, 35.0]},
+    "BH3": {"Z": 9.0, "depths": [1.0], "elevs": [8.0], "water content": [99.0]},
+}
+
+def test_nearest_water_content_within_tolerance_and_same_borehole():
+    df = soil_indices(ATTERBERG, WC, depth_tol=0.25)
+    assert list(zip(df["Borhull"], df["Dybde"])) == [("BH1", 1.0), ("BH1", 2.0), ("BH1", 4.0), ("BH2", 1.0)]
+    assert list(df["plasticity index"]) == pytest.approx([17.0, 20.0, 0.0, 15.0])
+    w = df["water content"].to_numpy()
+    assert w[0] == 26.5 and np.isnan(w[1]) and w[2] == 35.0  # 2.5 m is 0.5 m off
+    assert np.isnan(w[3])  # BH3 at 1.0 m must not leak into BH2
+    il = df["liquidity index"].to_numpy()
+    assert il[0] == pytest.approx((26.5 - 18.0) / 17.0)
+    assert np.isnan(il[1]) and np.isnan(il[2]) and np.isnan(il[3])  # no w, Ip = 0, no w
+
+def test_without_water_content_and_back_to_series():
+    df = soil_indices(ATTERBERG, depth_tol=0.25)
+    assert df["water content"].isna().all() and df["liquidity index"].isna().all()
+    series = indices_to_series(soil_indices(ATTERBERG, WC, depth_tol=1.0))
+    assert series["BH1"]["depths"] == [1.0, 2.0, 4.0]
+    assert series["BH1"]["water content"][1] == 50.0  # wider tolerance reaches 2.5 m
+
+def _sheet(path, columns, sheet="Data"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet
+    for col, values in columns.items():
+        for i, v in enumerate(values):
+            ws[f"{col}{6 + i}"] = v
+    wb.save(path)
+
+def test_gamma_and_atterberg_workbooks(tmp_path):
+    _sheet(tmp_path / "BH1.xlsx", {"A": [1.5, 2.5, None, 4.5], "B": [19.5, None, 20.0, 21.0],
+                                   "C": [20.5, 22.5, None, None], "D": [35.5, None, None, None]})
+    _sheet(tmp_path / "BH2.xlsx", {"A": [1.5]}, sheet="Annet")
+    _sheet(tmp_path / "BH9.xlsx", {"A": [1.5], "B": [19.0]})
+    (tmp_path / "~$BH1.xlsx").write_bytes(b"")
+    terrain = {"BH1": 10.0, "BH2": 8.0}
+
+    gamma = build_gamma_series(tmp_path, "Data", {"gamma_depth": "A6:A9", "gamma": "B6:B9"}, terrain)
+    assert list(gamma) == ["BH1"]  # BH2 lacks the sheet, BH9 lacks terrain
+    assert gamma["BH1"] == {"Z": 10.0, "depths": [1.5, 2.5, 4.5], "elevs": [8.5, 7.5, 5.5],
+                            "unit weight": [19.5, None, 21.0], "rows": [6, 7, 9]}
+
+    ranges = {"atterberg_depth": "A6:A9", "wp": "C6:C9", "wl": "D6:D9"}
+    atterberg = build_atterberg_series(tmp_path, "Data", ranges, terrain)
+    assert atterberg["BH1"]["wp"] == [20.5, 22.5, None] and atterberg["BH1"]["wl"] == [35.5, None, None]
+    assert atterberg["BH1"]["rows"] == [6, 7, 9]
+    assert build_atterberg_series(tmp_path, "Data", ranges, terrain, boreholes={"BH2"}) == {}
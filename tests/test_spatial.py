@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.path import Path
+
+from spatial import BoreholeIndex, project_on_polyline, select_series
+
+@pytest.fixture
+def site():
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(0.0, 1000.0, size=(300, 2))
+    names = np.array([f"BH{i}" for i in range(len(xy))], dtype=object)
+    return names, xy, BoreholeIndex(names, xy[:, 0], xy[:, 1])
+
+def test_project_on_polyline_station_and_signed_offset():
+    station, offset = project_on_polyline([(0, 0), (100, 0), (100, 100)], [50, 50, 110, -10], [10, -20, 60, 0])
+    assert list(station) == pytest.approx([50.0, 50.0, 160.0, 0.0])
+    assert list(offset) == pytest.approx([10.0, -20.0, -10.0, 0.0])  # left of travel is positive
+
+def test_radius_and_nearest_match_brute_force(site):
+    names, xy, index = site
+    d = np.hypot(xy[:, 0] - 400.0, xy[:, 1] - 600.0)
+    assert list(index.radius(400.0, 600.0, 120.0)) == list(names[np.argsort(d)][np.sort(d) <= 120.0])
+    assert list(index.nearest(400.0, 600.0, k=7)) == list(names[np.argsort(d)[:7]])
+    assert list(index.nearest(-5000.0, -5000.0, k=1)) == [names[np.argmin(np.hypot(*(xy + 5000.0).T))]]
+    assert len(index.nearest(0.0, 0.0, k=1000)) == len(names)
+
+def test_polygon_matches_brute_force(site):
+    names, xy, index = site
+    triangle = [(100.0, 100.0), (900.0, 200.0), (300.0, 800.0)]
+    expected = names[Path(triangle).contains_points(xy)]
+    assert list(index.polygon(triangle)) == list(expected)
+
+def test_corridor_between_chainages(site):
+    names, xy, index = site
+    line = [(0.0, 500.0), (500.0, 500.0), (1000.0, 900.0)]
+    found, station, offset = index.corridor(line, start=200.0, end=900.0, half_width=40.0)
+    all_station, all_offset = project_on_polyline(line, xy[:, 0], xy[:, 1])
+    keep = (np.abs(all_offset) <= 40.0) & (all_station >= 200.0) & (all_station <= 900.0)
+    assert set(found) == set(names[keep]) and len(found) > 0
+    assert list(station) == sorted(station) and (np.abs(offset) <= 40.0).all()
+
+def test_missing_coordinates_and_terrain_without_xy():
+    index = BoreholeIndex(["A", "B", "C"], [0.0, np.nan, 10.0], [0.0, 5.0, 0.0])
+    assert len(index) == 2 and "B" not in index and index.coords("C") == (10.0, 0.0)
+    empty = BoreholeIndex.from_terrain(pd.DataFrame({"BH": ["A"], "Z": [1.0]}))
+    assert len(empty) == 0 and list(empty.radius(0.0, 0.0, 1e6)) == [] and list(empty.nearest(0.0, 0.0)) == []
+
+def test_select_series():
+    series = {"A": {"Z": 1.0}, "B": {"Z": 2.0}}
+    assert select_series(series, None) is series
+    assert select_series(series, ["B", "X"]) == {"B": {"Z": 2.0}}
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from stages import Stage, run_stages, topological_order
+
+def _sleep_then(value, seconds):
+    def fn(*_):
+        time.sleep(seconds)
+        return value
+    return fn
+
+def test_stage_starts_when_inputs_are_done_and_critical_path():
+    stages = [
+        Stage("fast", _sleep_then(1, 0.02)),
+        Stage("slow", _sleep_then(2, 0.3)),
+        Stage("sum", lambda a, b: a + b, ["fast", "slow"]),
+        Stage("early", lambda a: a * 10, ["fast"]),
+    ]
+    run = run_stages(stages, poll_s=0.01)
+    assert run.results == {"fast": 1, "slow": 2, "sum": 3, "early": 10}
+    assert set(run.status.values()) == {"done"}
+    assert run.finished["early"] < run.finished["slow"]  # did not wait for the slow branch
+    assert run.critical_path() == ["slow", "sum"]
+    table = run.table()
+    assert table.loc[table["Steg"] == "sum", "Venter på"].item() == "slow"
+    assert set(table.loc[table["Kritisk"], "Steg"]) == {"slow", "sum"}
+
+def test_failed_stage_cancels_its_readers_only():
+    def boom():
+        raise RuntimeError("bad sheet")
+    stages = [
+        Stage("parse", boom),
+        Stage("figure", lambda x: x, ["parse"]),
+        Stage("page", lambda x: x, ["figure"]),
+        Stage("other", lambda: "ok"),
+    ]
+    run = run_stages(stages, poll_s=0.01)
+    assert run.status == {"parse": "failed", "figure": "cancelled", "page": "cancelled", "other": "done"}
+    assert isinstance(run.errors["parse"], RuntimeError)
+    assert run.get("figure") is None and run.get("other") == "ok"
+    with pytest.raises(RuntimeError):
+        run.raise_first_error()
+
+def test_unchanged_stages_are_skipped_with_the_memo():
+    calls, released = [], []
+
+    def stages(param, valid=lambda r: True):
+        return [
+            Stage("parse", lambda: calls.append("parse") or ["parsed", param], params=param,
+                  release=released.append),
+            Stage("render", lambda p: calls.append("render") or p + ["rendered"], ["parse"], valid=valid),
+        ]
+    memo = {}
+    first = run_stages(stages("a"), memo=memo, poll_s=0.01)
+    again = run_stages(stages("a"), memo=memo, poll_s=0.01)
+    assert calls == ["parse", "render"]
+    assert again.status == {"parse": "skipped", "render": "skipped"}
+    assert again.results == first.results
+
+    run_stages(stages("a", valid=lambda r: False), memo=memo, poll_s=0.01)  # e.g. the PDF was deleted
+    assert calls == ["parse", "render", "render"]
+
+    changed = run_stages(stages("b"), memo=memo, poll_s=0.01)
+    assert changed.status == {"parse": "done", "render": "done"}
+    assert released == [["parsed", "a"]]
+    assert memo["render"][1] == ["parsed", "b", "rendered"]
+
+def test_topological_order_rejects_unknown_inputs_and_cycles():
+    assert topological_order([Stage("b", None, ["a"]), Stage("a", None)]) == ["a", "b"]
+    with pytest.raises(ValueError, match="unknown"):
+        topological_order([Stage("b", None, ["a"])])
+    with pytest.raises(ValueError, match="cycle"):
+        topological_order([Stage("a", None, ["b"]), Stage("b", None, ["a"])])
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from terrain import DemGrid, read_dem
+
+NODATA = -3.40282e+38  # as written by GDAL for float32 grids
+
+def _grid(data, nodata=None):
+    return DemGrid(np.asarray(data), x0=0.0, y0=len(data), dx=1.0, nodata=nodata)
+
+def test_bilinear_between_cell_centres_and_clamped_at_the_edges():
+    grid = _grid(np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]], dtype=np.float32))
+    z = grid.sample([0.5, 1.0, 1.5, 0.1, 2.9, 3.0, -0.1, 1.0], [2.5, 2.5, 1.5, 2.9, 0.1, 1.5, 1.5, 3.1])
+    assert z[:6] == pytest.approx([1.0, 1.5, 5.0, 1.0, 9.0, 6.0])
+    assert np.isnan(z[6:]).all()  # outside the grid
+    assert grid.extent() == (0.0, 0.0, 3.0, 3.0)
+
+@pytest.mark.parametrize("dtype, nodata", [(np.float32, NODATA), (np.float64, NODATA), (np.int16, -9999)])
+def test_nodata_cells_are_left_out(dtype, nodata):
+    data = np.array([[10, 20, 30], [40, 50, nodata], [70, nodata, nodata]], dtype=dtype)
+    grid = _grid(data, nodata=nodata)
+    z = grid.sample([0.5, 2.0, 2.5], [2.5, 2.0, 0.5])
+    assert z[:2] == pytest.approx([10.0, 100.0 / 3.0])  # around (2, 2): 20, 30, 50 and a NODATA cell
+    assert np.isnan(z[2])  # on a NODATA cell centre
+
+def test_nan_cells_are_left_out():
+    grid = _grid(np.array([[1.0, np.nan], [3.0, 4.0]]))
+    assert grid.sample([1.0], [1.0]) == pytest.approx([8.0 / 3.0])
+
+def test_ascii_grid_with_float32_nodata(tmp_path):
+    path = tmp_path / "dem.asc"
+    path.write_text("ncols 3\nnrows 2\nxllcorner 100\nyllcorner 200\ncellsize 2\n"
+                    f"NODATA_value {NODATA}\n1 2 {NODATA}\n4 5 6\n")
+    grid = read_dem(str(path), cache_dir=str(tmp_path / "cache"))
+    assert grid.data.dtype == np.float32 and grid.extent() == (100.0, 200.0, 106.0, 204.0)
+    assert grid.sample([105.0, 101.0], [203.0, 201.0]) == pytest.approx([np.nan, 4.0], nan_ok=True)
+    assert read_dem(str(path), cache_dir=str(tmp_path / "cache")).sample([104.0], [202.0]) == pytest.approx([13.0 / 3.0])
+
+@pytest.mark.parametrize("layout", [{"tile": (32, 32)}, {"rowsperstrip": 7}])
+def test_compressed_geotiff_is_converted_segment_by_segment(tmp_path, layout):
+    tifffile = pytest.importorskip("tifffile")
+    data = np.random.default_rng(0).normal(50.0, 5.0, (50, 70)).astype(np.float32)
+    path = str(tmp_path / "dem.tif")
+    tifffile.imwrite(path, data, compression="zlib", **layout,
+                     extratags=[(33550, 12, 3, (2.0, 2.0, 0.0)), (33922, 12, 6, (0, 0, 0, 1000.0, 5000.0, 0))])
+    grid = read_dem(path, cache_dir=str(tmp_path / "cache"))
+    assert np.array_equal(np.asarray(grid.data), data)
+    assert grid.sample([1001.0], [4999.0]) == pytest.approx([data[0, 0]])
@@ -0,0 +1,55 @@
+import numpy as np
+
+from validation import ANOMALY_COLUMNS, summary, validate
+
+def _series(bh, depths, **values):
+    return {bh: {"Z": 10.0, "depths": depths, "elevs": [10.0 - d for d in depths],
+                 "rows": list(range(6, 6 + len(depths))), **values}}
+
+def _rules(found):
+    return set(zip(found["Borhull"], found["Rad"], found["Regel"], found["Kolonne"]))
+
+def test_range_order_duplicate_and_consistency_rules():
+    konus = _series("BH1", [1.0, 1.5, 1.2, 2.0, 2.0], undist=[20.0, 20000.0, 22.0, 25.0, 26.0],
+                    remould=[5.0, 5.0, 30.0, 6.0, 6.0])
+    atterberg = _series("BH2", [1.0, 2.0], wp=[20.0, 40.0], wl=[35.0, 38.0])
+    found = validate({"konus": konus, "atterberg": atterberg}, files={"konus": {"BH1": "BH1_konus.xlsm"}})
+    assert list(found.columns) == ANOMALY_COLUMNS
+    assert _rules(found) == {
+        ("BH1", 7, "range", "undist"),
+        ("BH1", 8, "monotonic", "Dybde"),
+        ("BH1", 8, "consistency", "remould"),
+        ("BH1", 9, "duplicate", "Dybde"),
+        ("BH1", 10, "duplicate", "Dybde"),
+        ("BH2", 7, "consistency", "wl"),
+    }
+    assert "feil enhet" in found.loc[found["Regel"] == "range", "Melding"].item()
+    assert set(found.loc[found["Borhull"] == "BH1", "Fil"]) == {"BH1_konus.xlsm"}
+    assert list(found["Alvorlighet"]) == sorted(found["Alvorlighet"], key=["feil", "advarsel"].index)
+    assert summary(found).set_index("Fil").loc["BH1_konus.xlsm", "Feil"] == 3
+
+def test_konus_against_enaks_at_the_same_depth():
+    konus = _series("BH1", [2.0, 4.0], undist=[20.0, 20.0])
+    enaks = _series("BH1", [2.1, 4.05, 6.0], strength=[25.0, 90.0, 500.0])
+    found = validate({"konus": konus, "enaks": enaks})
+    assert _rules(found) == {("BH1", 7, "consistency", "strength")}
+    assert found["Melding"].item().startswith("Enaks/konus = 4.5")
+
+def test_outlier_against_samples_in_the_same_depth_bin():
+    depths = list(np.linspace(2.0, 3.8, 10))
+    wc = _series("BH1", depths, **{"water content": [30.0, 31.0, 29.0, 30.5, 29.5, 30.0, 31.0, 29.0, 30.0, 150.0]})
+    found = validate({"wc": wc})
+    assert _rules(found) == {("BH1", 15, "outlier", "water content")}
+    assert found["Avvik (z)"].item() > 3.5
+
+def test_clean_data_has_no_findings():
+    found = validate({"konus": _series("BH1", [1.0, 2.0], undist=[20.0, 25.0], remould=[4.0, 5.0]), "wc": {}})
+    assert found.empty and list(found.columns) == ANOMALY_COLUMNS
+    assert summary(found).empty
+
+def test_negative_or_sub_unity_sensitivity_is_a_range_finding():
+    konus = _series("BH1", [1.0, 2.0, 3.0], undist=[20.0, 25.0, 30.0], remould=[4.0, 5.0, 6.0],
+                    sensitivity=[5.0, -5.0, 0.5])
+    found = validate({"konus": konus})
+    assert _rules(found) == {("BH1", 7, "range", "sensitivity"), ("BH1", 8, "range", "sensitivity")}
+    assert set(found["Melding"]) == {"Under 1"}
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+import plot_pdf
+import warmup
+from instrumentation import current_recorder
+
+@pytest.fixture(autouse=True)
+def clean_warmup():
+    warmup.WARMUP.clear()
+    yield
+    warmup.WARMUP.clear()
+
+def test_warm_up_records_steps_and_stats():
+    before = len(current_recorder().spans)
+    stats = warmup.warm_up()
+    assert stats is warmup.WARMUP and stats["error"] is None and stats["pid"] == os.getpid()
+    expected = {"import", "fonts", "mathtext", "render"} | ({"logo"} if os.path.exists(warmup.LOGO_PATH) else set())
+    assert set(stats["steps"]) == expected and stats["warmup_s"] >= 0
+    assert len(current_recorder().spans) == before  # warm-up spans stay out of the default recorder
+
+    copy = warmup.warmup_stats()
+    assert copy == stats and copy is not warmup.WARMUP
+
+def test_warm_up_records_errors_instead_of_raising(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("ingen font")
+
+    monkeypatch.setattr(plot_pdf, "draw_page_frame_and_title_block", broken)
+    stats = warmup.warm_up(logo_path=None)
+    assert stats["error"] == "RuntimeError: ingen font"
+    assert "render" not in stats["steps"] and "logo" not in stats["steps"] and "import" in stats["steps"]
@@ -0,0 +1,56 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import workers
+from workers import PoolBusy, WorkerPool
+
+@pytest.fixture
+def queued_pool():
+    """A pool whose workers never start, so submitted jobs stay in the queues."""
+    pool = WorkerPool(max_workers=1, max_queue=8, min_free_bytes=0)
+    pool._start = lambda: None
+    yield pool
+    pool.shutdown()
+
+def test_round_robin_over_users(queued_pool):
+    jobs = {name: queued_pool.submit(name[0], os.getpid) for name in ("A1", "A2", "A3", "B1", "C1")}
+    assert {name: job.position() for name, job in jobs.items()} == {"A1": 1, "B1": 2, "C1": 3, "A2": 4, "A3": 5}
+    order = [queued_pool._next_job() for _ in jobs]
+    assert order == [jobs[name] for name in ("A1", "B1", "C1", "A2", "A3")]
+
+def test_admission_queue_full_memory_low_and_closed(queued_pool, monkeypatch):
+    queued_pool.max_queue = 2
+    queued_pool.submit("a", os.getpid)
+    waiting = queued_pool.submit("b", os.getpid)
+    with pytest.raises(PoolBusy, match="Køen er full"):
+        queued_pool.submit("c", os.getpid)
+
+    queued_pool.max_queue = 10
+    queued_pool.min_free_bytes = 1024
+    monkeypatch.setattr(workers, "available_memory", lambda: 0)
+    assert "minne" in queued_pool.admission_error()
+    with pytest.raises(PoolBusy):
+        queued_pool.submit("c", os.getpid)
+
+    monkeypatch.setattr(workers, "available_memory", lambda: None)  # unknown: admitted
+    assert queued_pool.admission_error() is None
+    queued_pool.shutdown()
+    assert waiting.future.cancelled()
+    with pytest.raises(PoolBusy, match="stengt"):
+        queued_pool.submit("a", os.getpid)
+
+def test_worker_crash_is_recovered():
+    pool = WorkerPool(max_workers=1, min_free_bytes=0)
+    try:
+        pid = pool.submit("a", os.getpid).result(timeout=120)
+        assert pid != os.getpid()
+        with pytest.raises(BrokenProcessPool):
+            pool.submit("a", os._exit, 1).result(timeout=120)
+        with pytest.raises(ValueError):
+            pool.submit("b", int, "not a number").result(timeout=120)
+        assert pool.submit("a", os.getpid).result(timeout=120) not in (pid, os.getpid())
+        assert pool.stats()["running"] == 0
+    finally:
+        pool.shutdown()
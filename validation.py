@@ -0,0 +1,177 @@
+"""
+Rule checks over all ingested lab data at once, before anything is plotted.
+
+`validate()` flattens each dataset to one long frame (derived.series_to_frame) and runs
+every rule as a whole-column operation, so checking a project costs about as much as
+building the table:
+
+  - range:       values outside VALUE_LIMITS (wrong units show up here, e.g. Pa for kPa),
+                 depths outside DEPTH_LIMITS;
+  - monotonic:   depth decreasing from one sheet row to the next within a file;
+  - duplicate:   the same depth twice in one borehole and dataset (breaks the table merge);
+  - consistency: remoulded ≥ undisturbed konus strength, wP ≥ wL, and konus vs enaks
+                 strength more than CROSS_RATIO apart at the same depth;
+  - outlier:     robust z-score (median/MAD of log values in OUTLIER_BIN m depth bins
+                 across all boreholes) above OUTLIER_Z.
+
+The result is one row per finding, with file and sheet row (the builders keep the row of
+each sample in "rows"), see ANOMALY_COLUMNS.
+"""
+import numpy as np
+import pandas as pd
+
+from derived import series_to_frame
+from instrumentation import span
+
+# (dataset, key): (lower, upper, unit); None = no limit on that side
+VALUE_LIMITS = {
+    ("konus", "undist"): (0.5, 400.0, "kPa"),
+    ("konus", "remould"): (0.05, 200.0, "kPa"),
+    ("konus", "sensitivity"): (1.0, 300.0, ""),
+    ("enaks", "strength"): (0.5, 1000.0, "kPa"),
+    ("enaks", "deform"): (0.1, 30.0, "%"),
+    ("wc", "water content"): (1.0, 300.0, "%"),
+    ("gamma", "unit weight"): (10.0, 25.0, "kN/m³"),
+    ("atterberg", "wp"): (1.0, 150.0, "%"),
+    ("atterberg", "wl"): (5.0, 300.0, "%"),
+}
+DEPTH_LIMITS = (0.0, 200.0)
+CROSS_TOLERANCE = 0.15  # m between konus and enaks samples compared
+CROSS_RATIO = 3.0
+OUTLIER_BIN = 2.0
+OUTLIER_Z = 3.5
+OUTLIER_MIN_COUNT = 8
+
+ANOMALY_COLUMNS = ["Fil", "Datasett", "Borhull", "Rad", "Dybde", "Kolonne", "Verdi",
+                   "Regel", "Alvorlighet", "Avvik (z)", "Melding"]
+SEVERITY_ORDER = {"feil": 0, "advarsel": 1}
+
+def _findings(df, mask, dataset, column, rule, severity, message, score=None):
+    """Anomaly rows for the rows of `df` where `mask` holds (`message` may be one per row)."""
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return None
+    hit = df[mask]
+    return pd.DataFrame({
+        "Fil": hit["Fil"].to_numpy(), "Datasett": dataset, "Borhull": hit["Borhull"].to_numpy(),
+        "Rad": hit["rows"].to_numpy(), "Dybde": hit["Dybde"].to_numpy(), "Kolonne": column,
+        "Verdi": hit[column].to_numpy(dtype=float), "Regel": rule, "Alvorlighet": severity,
+        "Avvik (z)": score[mask] if score is not None else np.nan,
+        "Melding": message if isinstance(message, str) else np.asarray(message)[mask],
+    })
+
+def _frame(series, dataset, keys, files):
+    df = series_to_frame(series, list(keys) + ["rows"])
+    names = (files or {}).get(dataset, {})
+    df["Fil"] = df["Borhull"].map(names).fillna(df["Borhull"])
+    return df
+
+def _outlier_scores(df, key):
+    """Modified z-score of log(value) against all samples in the same depth bin."""
+    x = df[key].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = pd.Series(np.where(x > 0, np.log(x), np.nan), index=df.index)
+    groups = v.groupby(np.floor(df["Dybde"].to_numpy(dtype=float) / OUTLIER_BIN))
+    med = groups.transform("median")
+    mad = (v - med).abs().groupby(np.floor(df["Dybde"].to_numpy(dtype=float) / OUTLIER_BIN)).transform("median")
+    count = groups.transform("count")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = 0.6745 * (v - med) / mad
+    z[(mad <= 0) | (count < OUTLIER_MIN_COUNT)] = np.nan
+    return z.to_numpy()
+
+def check_dataset(series, dataset, files=None):
+    """Range, monotonic, duplicate and outlier findings within one dataset."""
+    keys = [k for (d, k) in VALUE_LIMITS if d == dataset]
+    df = _frame(series, dataset, keys, files)
+    if df.empty:
+        return []
+    found = []
+    depth = df["Dybde"].to_numpy(dtype=float)
+    lo, hi = DEPTH_LIMITS
+    found.append(_findings(df, (depth < lo) | (depth > hi), dataset, "Dybde", "range", "feil",
+                           f"Dybde utenfor {lo:g}–{hi:g} m"))
+
+    # Sheet order within a borehole: depth should only increase
+    same_bh = df["Borhull"].eq(df["Borhull"].shift()).to_numpy()
+    step = np.diff(depth, prepend=np.nan)
+    found.append(_findings(df, same_bh & (step < 0), dataset, "Dybde", "monotonic", "advarsel",
+                           "Dybden avtar fra raden over"))
+    found.append(_findings(df, df.duplicated(["Borhull", "Dybde"], keep=False).to_numpy(), dataset, "Dybde",
+                           "duplicate", "feil", "Samme dybde flere ganger i borhullet"))
+
+    for key in keys:
+        lo, hi, unit = VALUE_LIMITS[(dataset, key)]
+        x = df[key].to_numpy(dtype=float)
+        below = x < lo if lo is not None else np.zeros(len(x), dtype=bool)
+        above = x > hi if hi is not None else np.zeros(len(x), dtype=bool)
+        if lo is not None:
+            found.append(_findings(df, below, dataset, key, "range", "feil", f"Under {lo:g} {unit}".rstrip()))
+        if hi is not None:
+            found.append(_findings(df, above, dataset, key, "range", "feil",
+                                   f"Over {hi:g} {unit}".rstrip() + (" (feil enhet?)" if unit == "kPa" else "")))
+        z = _outlier_scores(df, key)
+        with np.errstate(invalid="ignore"):
+            outlier = (np.abs(z) > OUTLIER_Z) & ~below & ~above
+        found.append(_findings(df, outlier, dataset, key, "outlier", "advarsel",
+                               f"Skiller seg ut fra andre prøver i samme dybde (±{OUTLIER_BIN / 2:g} m)",
+                               score=np.round(z, 1)))
+
+    if dataset == "konus":
+        with np.errstate(invalid="ignore"):
+            bad = df["remould"].to_numpy(dtype=float) > df["undist"].to_numpy(dtype=float)
+        found.append(_findings(df, bad, dataset, "remould", "consistency", "advarsel",
+                               "Omrørt skjærstyrke er større enn uforstyrret"))
+    if dataset == "atterberg":
+        with np.errstate(invalid="ignore"):
+            bad = df["wp"].to_numpy(dtype=float) >= df["wl"].to_numpy(dtype=float)
+        found.append(_findings(df, bad, dataset, "wl", "consistency", "feil",
+                               "Flytegrensen er ikke større enn plastisitetsgrensen"))
+    return [f for f in found if f is not None]
+
+def check_konus_enaks(konus, enaks, files=None):
+    """Konus and enaks strength at (nearly) the same depth that differ by more than CROSS_RATIO."""
+    k = _frame(konus, "konus", ["undist"], files).dropna(subset=["undist"])
+    e = _frame(enaks, "enaks", ["strength"], files).dropna(subset=["strength"])
+    if k.empty or e.empty:
+        return []
+    pairs = pd.merge_asof(e.sort_values("Dybde"), k[["Borhull", "Dybde", "undist"]].sort_values("Dybde"),
+                          on="Dybde", by="Borhull", direction="nearest", tolerance=CROSS_TOLERANCE)
+    ratio = (pairs["strength"] / pairs["undist"]).to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bad = (ratio > CROSS_RATIO) | (ratio < 1 / CROSS_RATIO)
+    message = [f"Enaks/konus = {r:.1f} (konus {u:g} kPa)" for r, u in zip(ratio, pairs["undist"])]
+    found = _findings(pairs, bad, "enaks", "strength", "consistency", "advarsel", message)
+    return [found] if found is not None else []
+
+def validate(datasets, files=None):
+    """
+    All findings for `datasets` ({"konus" | "enaks" | "wc" | "gamma" | "atterberg": series}),
+    as a frame with ANOMALY_COLUMNS sorted by severity, file and row. `files` maps
+    {dataset: {BH: file name}}; without it the borehole name is shown as the file.
+    """
+    with span("validate") as counts:
+        found = []
+        for dataset, series in datasets.items():
+            if series:
+                found += check_dataset(series, dataset, files)
+        if datasets.get("konus") and datasets.get("enaks"):
+            found += check_konus_enaks(datasets["konus"], datasets["enaks"], files)
+        counts["rows"] = sum(len(s) for s in datasets.values() if s)
+        if not found:
+            return pd.DataFrame(columns=ANOMALY_COLUMNS)
+        df = pd.concat(found, ignore_index=True)[ANOMALY_COLUMNS]
+        df["Rad"] = df["Rad"].astype("Int64")
+        df = df.sort_values(["Alvorlighet", "Fil", "Rad"], key=lambda c: c.map(SEVERITY_ORDER)
+                            if c.name == "Alvorlighet" else c, ignore_index=True)
+        counts["points"] = len(df)
+    return df
+
+def summary(anomalies):
+    """Counts per file: Fil | Feil | Advarsler."""
+    if anomalies.empty:
+        return pd.DataFrame(columns=["Fil", "Feil", "Advarsler"])
+    counts = pd.crosstab(anomalies["Fil"], anomalies["Alvorlighet"])
+    return pd.DataFrame({"Fil": counts.index,
+                         "Feil": counts.get("feil", pd.Series(0, index=counts.index)).to_numpy(),
+                         "Advarsler": counts.get("advarsel", pd.Series(0, index=counts.index)).to_numpy()})
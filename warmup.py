@@ -0,0 +1,89 @@
+"""
+Warm-up for rendering worker processes.
+
+A fresh process pays for the plot_pdf imports, the matplotlib font cache, mathtext parsing
+of the ε_f label, loading fonts into the PDF backend and decoding the logo on its first
+figure. `warm_up()` is the initializer of the shared worker pool: it does those once and
+renders one small page (frame, title block, logo and a mathtext label) to PDF and a
+low-dpi PNG in memory, so the first real figure does not pay for them. It is kept short
+because the pool starts its workers when the app or server starts (WorkerPool.start()),
+and a failure is only recorded: an exception in a pool initializer would break the pool.
+
+The time spent is kept in WARMUP and can be fetched from a worker with `warmup_stats()`.
+"""
+import io
+import os
+import time
+
+WARMUP = {}
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geovitalogo.png")
+WARMUP_DPI = 50
+
+def _process_start_time():
+    """Wall-clock start of this process from /proc (Linux), else None."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/stat") as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return btime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+def _render_page(logo_path):
+    """One small page with the title block and a mathtext label, to PDF and PNG in memory."""
+    import plot_pdf
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(11.69, 8.27))
+    plot_pdf.draw_page_frame_and_title_block(fig, 0.03, 0.03, 0.94, 0.94, "", "", "", "", "", "", logo_path)
+    ax = fig.add_axes([0.1, 0.4, 0.5, 0.5])
+    ax.scatter([1.0, 2.0], [2.0, 5.0], marker="o", s=25)
+    ax.set_xlabel(r"Deformasjon ved brudd $\epsilon_f$ (%)")
+    ax.invert_yaxis()
+    try:
+        fig.savefig(io.BytesIO(), format="pdf")
+        fig.savefig(io.BytesIO(), format="png", dpi=WARMUP_DPI)
+    finally:
+        fig.clear()
+
+def warm_up(logo_path=LOGO_PATH):
+    """Pool initializer: imports, fonts, mathtext, logo and one small render. Never raises."""
+    started = time.time()
+    proc_start = _process_start_time()
+    steps = {}
+    error = None
+
+    def step(name, fn):
+        t = time.perf_counter()
+        fn()
+        steps[name] = time.perf_counter() - t
+
+    try:
+        from instrumentation import recording
+        with recording():  # keep warm-up spans out of the worker's default recorder
+            step("import", lambda: __import__("plot_pdf"))
+            import plot_pdf
+            from matplotlib import font_manager
+            from matplotlib.mathtext import MathTextParser
+
+            step("fonts", lambda: font_manager.findfont(font_manager.FontProperties()))
+            step("mathtext", lambda: MathTextParser("path").parse(r"$\epsilon_f$", 72))
+            if logo_path and os.path.exists(logo_path):
+                step("logo", lambda: plot_pdf.load_logo(logo_path))
+            step("render", lambda: _render_page(logo_path))
+    except Exception as e:  # a failing initializer would break the whole pool
+        error = f"{type(e).__name__}: {e}"
+
+    WARMUP.update({
+        "pid": os.getpid(),
+        "startup_s": started - proc_start if proc_start else None,
+        "warmup_s": time.time() - started,
+        "steps": steps,
+        "error": error,
+    })
+    return WARMUP
+
+def warmup_stats():
+    """WARMUP of the process this runs in (submit it to the pool to ask a worker)."""
+    return dict(WARMUP)
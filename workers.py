@@ -0,0 +1,315 @@
+"""
+Process-wide bounded worker pool for parsing and rendering.
+
+All sessions share one pool of worker processes. Jobs wait in one queue per user and are
+handed to the workers round-robin over the users, so one engineer submitting twenty
+figures does not hold up a colleague's single report. A job's place in that order is
+available from `Job.position()` for display.
+
+Admission control: `submit()` raises PoolBusy when the queue is full or when the free
+memory on the machine is below `min_free_bytes`; queued jobs are also held back while
+memory is low (backpressure), as long as at least one job is still running.
+
+`start()` creates the worker processes right away (the app and server call it when they
+start), so their start-up and warm-up happen before the first job instead of during it.
+
+Spans and events recorded inside a worker are returned with the result and added to the
+caller's recorder, so the timing report looks the same as for in-process work.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from instrumentation import recording, current_recorder, log_event
+from warmup import warm_up
+
+class PoolBusy(RuntimeError):
+    """The job was not admitted: queue full or too little free memory."""
+
+def available_memory():
+    """Free memory in bytes (psutil if installed, else /proc/meminfo), None if unknown."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+@contextmanager
+def _app_main_hidden():
+    """
+    A spawned process first re-runs the parent's __main__ file. Under Streamlit that is the
+    app script (installed as a plain module without a loader), which would run the whole
+    page, and start another pool, in every worker. The workers only need importable
+    modules, so such a __main__ is swapped for an empty one while they are spawned.
+    """
+    main = sys.modules.get("__main__")
+    if main is None or getattr(main, "__loader__", None) is not None or not getattr(main, "__file__", None):
+        yield
+        return
+    placeholder = sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        if sys.modules.get("__main__") is placeholder:
+            sys.modules["__main__"] = main
+
+def _run_recorded(fn, args, kwargs):
+    with recording() as rec:
+        result = fn(*args, **kwargs)
+    return result, rec.spans, rec.events
+
+class Job:
+    """A queued call. `result()` blocks and re-raises the worker's exception."""
+
+    def __init__(self, pool, user, fn, args, kwargs):
+        self.user = user
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.requeued = 0
+        self._pool = pool
+        self._merged = False
+
+    def position(self):
+        """1-based place in the queue, 0 once the job is running or finished."""
+        return self._pool.position(self)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        result, spans, events = self.future.result(timeout)
+        if not self._merged:
+            rec = current_recorder()
+            for s in spans:
+                rec.add_span(s)
+            for e in events:
+                rec.add_event(e)
+            self._merged = True
+        return result
+
+class WorkerPool:
+    MAX_REQUEUES = 3  # times a job goes back in line because the executor was found broken
+
+    def __init__(self, max_workers=None, max_queue=64, min_free_bytes=512 * 1024 ** 2,
+                 initializer=None, initargs=()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.min_free_bytes = min_free_bytes
+        self.initializer, self.initargs = initializer, initargs
+        self._queues = OrderedDict()  # user -> deque of jobs; first key is served next
+        self._running = 0
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._closed = False
+
+    def _new_executor(self):
+        # spawn: the app server is multi-threaded, forking it is not safe
+        executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=self.initializer, initargs=self.initargs)
+        # The executor spawns a process per submit while none is idle: one no-op each starts them all now
+        with _app_main_hidden():
+            for _ in range(self.max_workers):
+                executor.submit(os.getpid)
+        return executor
+
+    def _start(self):
+        if self._thread is None:
+            self._executor = self._new_executor()
+            self._thread = threading.Thread(target=self._dispatch_loop, name="worker-dispatch", daemon=True)
+            self._thread.start()
+
+    def start(self):
+        """Start the worker processes (and their warm-up) now instead of on the first submit()."""
+        with self._cond:
+            if not self._closed:
+                self._start()
+        return self
+
+    def _memory_low(self):
+        free = available_memory()
+        return free is not None and free < self.min_free_bytes
+
+    def queued(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def stats(self):
+        with self._cond:
+            return {"running": self._running, "queued": self.queued(), "users": len(self._queues),
+                    "workers": self.max_workers}
+
+    def _refusal(self):
+        if self._closed:
+            return "Arbeiderpoolen er stengt"
+        if self.queued() >= self.max_queue:
+            return f"Køen er full ({self.max_queue} jobber), prøv igjen om litt"
+        if self._memory_low():
+            return "For lite ledig minne på serveren, prøv igjen om litt"
+        return None
+
+    def admission_error(self):
+        """Why a new job would be refused right now, or None. For checking before a run starts."""
+        with self._cond:
+            return self._refusal()
+
+    def submit(self, user, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` for `user`. Raises PoolBusy if not admitted."""
+        with self._cond:
+            refusal = self._refusal()
+            if refusal:
+                raise PoolBusy(refusal)
+            job = Job(self, user, fn, args, kwargs)
+            self._queues.setdefault(user, deque()).append(job)
+            self._start()
+            self._cond.notify_all()
+        return job
+
+    def position(self, job):
+        """Place of `job` when the queues are served round-robin from the current user on."""
+        with self._cond:
+            q = self._queues.get(job.user)
+            if not q or job not in q:
+                return 0
+            i = q.index(job)
+            users = list(self._queues)
+            u = users.index(job.user)
+            ahead = i
+            for j, other in enumerate(users):
+                if other != job.user:
+                    ahead += min(len(self._queues[other]), i + (1 if j < u else 0))
+            return ahead + 1
+
+    def _next_job(self):
+        user, q = next(iter(self._queues.items()))
+        job = q.popleft()
+        if q:
+            self._queues.move_to_end(user)
+        else:
+            del self._queues[user]
+        return job
+
+    def _can_dispatch(self):
+        if not self._queues or self._running >= self.max_workers:
+            return False
+        return self._running == 0 or not self._memory_low()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._can_dispatch():
+                    self._cond.wait(timeout=0.5)
+                if self._closed:
+                    return
+                job = self._next_job()
+                self._running += 1
+                executor = self._executor
+            try:
+                fut = executor.submit(_run_recorded, job.fn, job.args, job.kwargs)
+            except BrokenProcessPool as e:
+                # A worker died earlier; this job never started, so it goes back first in line
+                log_event(f"⚠️ Arbeiderprosess krasjet, starter poolen på nytt: {e}", level="warning")
+                self._restart(executor)
+                if job.requeued < self.MAX_REQUEUES:
+                    self._requeue(job)
+                else:
+                    self._finished(job, None, e)
+                continue
+            except Exception as e:  # e.g. RuntimeError when the executor or interpreter shuts down
+                self._finished(job, None, e)
+                continue
+            fut.add_done_callback(lambda f, job=job: self._finished(job, f))
+
+    def _restart(self, broken):
+        """Replace a broken executor with a new one and shut the old one down."""
+        executor = self._new_executor()
+        with self._cond:
+            if self._closed:
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                self._executor = executor
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _requeue(self, job):
+        """Put a job that never started back at the head of the queue."""
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+            if self._closed:
+                job.future.cancel()
+                return
+            job.requeued += 1
+            self._queues.setdefault(job.user, deque()).appendleft(job)
+            self._queues.move_to_end(job.user, last=False)
+
+    def _finished(self, job, fut, error=None):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+        if error is None and fut.cancelled():
+            job.future.cancel()
+            return
+        if error is None:
+            error = fut.exception()
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(fut.result())
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            pending = [job for q in self._queues.values() for job in q]
+            self._queues.clear()
+            self._cond.notify_all()
+        for job in pending:
+            job.future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_pool():
+    """
+    The process-wide pool. Sized from GRUNN_WORKERS (default: CPU count), GRUNN_MAX_QUEUE
+    (default 64 jobs) and GRUNN_MIN_FREE_MB (default 512). Every worker runs
+    warmup.warm_up() when it starts; call `.start()` on it at start-up to have that done
+    before the first job.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = WorkerPool(
+                max_workers=int(os.environ.get("GRUNN_WORKERS", 0)) or None,
+                max_queue=int(os.environ.get("GRUNN_MAX_QUEUE", 64)),
+                min_free_bytes=int(os.environ.get("GRUNN_MIN_FREE_MB", 512)) * 1024 ** 2,
+                initializer=warm_up,
+            )
+        return _shared
+
+def wait_all(jobs, on_wait=None, poll_s=0.25):
+    """
+    Block until all jobs are done, calling `on_wait(position)` while any is still queued
+    (position of the last one in line). Returns the results in order.
+    """
+    while not all(job.done() for job in jobs):
+        if on_wait is not None:
+            on_wait(max(job.position() for job in jobs))
+        time.sleep(poll_s)
+    return [job.result() for job in jobs]